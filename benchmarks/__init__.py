@@ -0,0 +1,2 @@
+# -*- coding: utf-8 -*-
+"""基准测试：本地模拟服务（fake_server）与测试脚本（bench）。"""
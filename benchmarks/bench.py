@@ -0,0 +1,227 @@
+# -*- coding: utf-8 -*-
+"""
+基准测试：对 HaihuishouAPI 各接口方法和 GrabOrderTool 的「抢单→报价」完整流程计时，
+输出 p50 / p95 / p99 延迟与吞吐量，并写入 JSON 文件，便于前后对比。
+
+在项目根目录执行：
+    python -m benchmarks.bench                           # 启动内置模拟服务并测试全部用例
+    python -m benchmarks.bench --latency 20 --jitter 5 --compete 0.3 -n 500 -c 16
+    python -m benchmarks.bench --base http://127.0.0.1:18080  # 使用已启动的模拟服务
+    python -m benchmarks.bench --compare benchmarks/results/baseline.json
+"""
+
+import argparse
+import itertools
+import json
+import os
+import platform
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional
+
+from haihuishou.api import HaihuishouAPI
+from haihuishou.grab_tool import GrabCondition, GrabOrderTool
+from haihuishou.orders import ORDER_LIST
+
+from .fake_server import FakeHaihuishouServer
+
+_RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "results")
+
+
+def percentile(sorted_values: List[float], pct: float) -> float:
+    """最近秩法取百分位，sorted_values 须已排序。"""
+    if not sorted_values:
+        return 0.0
+    k = max(0, min(len(sorted_values) - 1, int(round(pct / 100.0 * len(sorted_values) + 0.5)) - 1))
+    return sorted_values[k]
+
+
+def run_case(fn: Callable[[int], Any], iterations: int, concurrency: int) -> Dict[str, Any]:
+    """以 concurrency 个线程共执行 fn(i) iterations 次，统计每次耗时；抛异常计为出错。"""
+    latencies: List[float] = []
+    errors = 0
+    lock = threading.Lock()
+    counter = itertools.count()
+
+    def _worker() -> None:
+        nonlocal errors
+        while True:
+            i = next(counter)
+            if i >= iterations:
+                return
+            t0 = time.perf_counter()
+            try:
+                fn(i)
+                ok = True
+            except Exception:
+                ok = False
+            ms = (time.perf_counter() - t0) * 1000
+            with lock:
+                if ok:
+                    latencies.append(ms)
+                else:
+                    errors += 1
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=max(1, concurrency)) as pool:
+        for _ in range(max(1, concurrency)):
+            pool.submit(_worker)
+    elapsed = time.perf_counter() - started
+    latencies.sort()
+    return {
+        "count": len(latencies),
+        "errors": errors,
+        "p50_ms": round(percentile(latencies, 50), 3),
+        "p95_ms": round(percentile(latencies, 95), 3),
+        "p99_ms": round(percentile(latencies, 99), 3),
+        "mean_ms": round(sum(latencies) / len(latencies), 3) if latencies else 0.0,
+        "max_ms": round(latencies[-1], 3) if latencies else 0.0,
+        "throughput_rps": round((len(latencies) + errors) / elapsed, 1) if elapsed > 0 else 0.0,
+    }
+
+
+def build_cases(api: HaihuishouAPI, tool: GrabOrderTool) -> Dict[str, Callable[[int], Any]]:
+    """用例名 -> fn(i)。grab_order / grab_and_quote 每次用新的 recordId，list_grab_quote 抢列表里的第一单。"""
+    cond = GrabCondition.for_task(page_size=20)
+    record_ids = itertools.count(10 ** 8)  # 模拟服务把未知 recordId 当作新的待抢订单
+
+    def _grab(i: int) -> None:
+        rid = next(record_ids)
+        api.grab_order(rid, rid + 5000000)
+
+    def _quote(i: int) -> None:
+        api.submit_quotation(100000 + i, 5100000 + i, "10", remark="bench")
+
+    def _update(i: int) -> None:
+        api.update_quotation(100000 + i, 5100000 + i, "11", remark="bench")
+
+    def _cycle(i: int) -> None:
+        rid = next(record_ids)
+        res = tool.grab_and_quote(rid, rid + 5000000, "10", remark="bench")
+        if res["error"] and res["subCode"] != 200:
+            raise RuntimeError(res["error"])
+
+    def _list_and_grab(i: int) -> None:
+        rows = ORDER_LIST.rows(tool.step4_order_list(cond))
+        for rec in ORDER_LIST.records(rows[:1], keep_raw=False):
+            tool.grab_and_quote(rec.record_id, rec.order_id, "10", remark="bench")
+
+    return {
+        "login": lambda i: api.login("bench", "bench"),
+        "query_user_info": lambda i: api.query_user_info(),
+        "get_manufacturer_list": lambda i: api.get_manufacturer_list(),
+        "get_sys_category": lambda i: api.get_sys_category(),
+        "get_sys_brand": lambda i: api.get_sys_brand(100001),
+        "get_hsd_order_list": lambda i: api.get_hsd_order_list(page_size=20),
+        "get_hsd_order_list_100": lambda i: api.get_hsd_order_list(page_size=100),
+        "grab_order": _grab,
+        "submit_quotation": _quote,
+        "update_quotation": _update,
+        "grab_and_quote": _cycle,
+        "list_grab_quote": _list_and_grab,
+    }
+
+
+def compare(current: Dict[str, Any], baseline: Dict[str, Any]) -> None:
+    """打印与基线结果的对比（p50 / p99 / 吞吐量的变化百分比）。"""
+    print("\n与基线对比（正数表示变慢 / 吞吐下降）:")
+    print("%-24s %10s %10s %12s" % ("用例", "p50", "p99", "吞吐量"))
+    for name, cur in current["results"].items():
+        base = baseline.get("results", {}).get(name)
+        if not base:
+            continue
+
+        def _delta(key: str, invert: bool = False) -> str:
+            if not base.get(key):
+                return "-"
+            d = (cur[key] - base[key]) / base[key] * 100
+            return "%+.1f%%" % (-d if invert else d)
+
+        print("%-24s %10s %10s %12s" % (name, _delta("p50_ms"), _delta("p99_ms"), _delta("throughput_rps", invert=True)))
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="嗨回收客户端基准测试")
+    parser.add_argument("--base", default="", help="已启动的模拟服务地址；不传则启动内置模拟服务")
+    parser.add_argument("-n", "--iterations", type=int, default=200, help="每个用例执行次数")
+    parser.add_argument("-c", "--concurrency", type=int, default=8, help="并发线程数")
+    parser.add_argument("--cases", default="", help="只跑指定用例，逗号分隔")
+    parser.add_argument("--latency", type=float, default=5.0, help="内置模拟服务的延迟（毫秒）")
+    parser.add_argument("--jitter", type=float, default=2.0, help="内置模拟服务的延迟抖动（± 毫秒）")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="内置模拟服务返回 HTTP 500 的概率")
+    parser.add_argument("--compete", type=float, default=0.2, help="抢单时订单已被其他报价师抢走的概率")
+    parser.add_argument("--output", default="", help="结果 JSON 路径，默认 benchmarks/results/bench-<时间>.json")
+    parser.add_argument("--compare", default="", help="与之前的结果 JSON 对比")
+    args = parser.parse_args()
+
+    server: Optional[FakeHaihuishouServer] = None
+    base = args.base.rstrip("/")
+    if not base:
+        server = FakeHaihuishouServer(
+            latency_ms=args.latency,
+            jitter_ms=args.jitter,
+            error_rate=args.error_rate,
+            compete_rate=args.compete,
+            seed=1,
+        ).start()
+        base = server.base_url
+
+    api = HaihuishouAPI(base_hsd=base, base_main=base, base_wap=base)
+    api.login("bench", "bench")
+    tool = GrabOrderTool(api=api)
+    cases = build_cases(api, tool)
+    if args.cases:
+        wanted = [x.strip() for x in args.cases.split(",") if x.strip()]
+        unknown = [x for x in wanted if x not in cases]
+        if unknown:
+            print("未知用例: %s（可选: %s）" % (", ".join(unknown), ", ".join(cases)), file=sys.stderr)
+            return 1
+        cases = {k: cases[k] for k in wanted}
+
+    report: Dict[str, Any] = {
+        "meta": {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "base": args.base or "builtin",
+            "iterations": args.iterations,
+            "concurrency": args.concurrency,
+            "latency_ms": args.latency if server else None,
+            "jitter_ms": args.jitter if server else None,
+            "error_rate": args.error_rate if server else None,
+            "compete_rate": args.compete if server else None,
+        },
+        "results": {},
+    }
+    print("%-24s %8s %6s %9s %9s %9s %10s" % ("用例", "次数", "出错", "p50(ms)", "p95(ms)", "p99(ms)", "吞吐(次/s)"))
+    try:
+        tool.warm_up()
+        for name, fn in cases.items():
+            res = run_case(fn, args.iterations, args.concurrency)
+            report["results"][name] = res
+            print(
+                "%-24s %8d %6d %9.2f %9.2f %9.2f %10.1f"
+                % (name, res["count"], res["errors"], res["p50_ms"], res["p95_ms"], res["p99_ms"], res["throughput_rps"])
+            )
+    finally:
+        api.fire_path().stop_keepalive()
+        api.close()
+        if server is not None:
+            server.stop()
+
+    output = args.output or os.path.join(_RESULTS_DIR, "bench-%s.json" % time.strftime("%Y%m%d-%H%M%S"))
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print("\n结果已写入 %s" % output)
+
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as f:
+            compare(report, json.load(f))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,227 @@
+# -*- coding: utf-8 -*-
+"""
+本地模拟的嗨回收接口，用于基准测试（不访问真实服务）。
+实现 checklogin、queryuserinfo、syscategory 三个接口、gethsdorderlist、hsdgraborder、hsdquotation、hsdupdatequotation，
+可配置响应延迟、抖动、出错率与「其他报价师」抢先的概率。
+
+单独启动：python -m benchmarks.fake_server --port 18080 --latency 20 --jitter 5 --compete 0.2
+"""
+
+import argparse
+import itertools
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, Optional
+
+# 订单状态：10 未被下单，20 已被抢（我方），21 已被其他报价师抢走，30 已报价
+_OPEN, _OURS, _TAKEN, _QUOTED = "10", "20", "21", "30"
+
+_BRANDS = [("100007", "Apple"), ("100011", "HUAWEI"), ("100010", "小米"), ("100016", "OPPO")]
+_MANUFACTURERS = ["华为", "小米", "OPPO", "荣耀"]
+
+
+class FakeHaihuishouServer:
+    """
+    模拟服务端。latency_ms ± jitter_ms 为每个请求的处理延迟；error_rate 为返回 HTTP 500 的概率；
+    compete_rate 为抢单时订单已被其他报价师抢走（subCode=200）的概率；orders 为待抢订单数（被抢后自动补充）。
+    """
+
+    def __init__(
+        self,
+        host: str = "127.0.0.1",
+        port: int = 0,
+        latency_ms: float = 0.0,
+        jitter_ms: float = 0.0,
+        error_rate: float = 0.0,
+        compete_rate: float = 0.0,
+        orders: int = 200,
+        seed: Optional[int] = None,
+    ):
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.error_rate = error_rate
+        self.compete_rate = compete_rate
+        self.random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._ids = itertools.count(100000)
+        self._orders: Dict[int, Dict[str, Any]] = {}
+        self._open: Dict[int, None] = {}  # 未被下单的 recordId（保持插入顺序）
+        self.requests = 0
+        for _ in range(orders):
+            self._new_order()
+        self._httpd = ThreadingHTTPServer((host, port), self._handler())
+        self._httpd.daemon_threads = True
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def base_url(self) -> str:
+        host, port = self._httpd.server_address[:2]
+        return "http://%s:%d" % (host, port)
+
+    def start(self) -> "FakeHaihuishouServer":
+        self._thread = threading.Thread(target=self._httpd.serve_forever, name="fake-haihuishou", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+    def __enter__(self) -> "FakeHaihuishouServer":
+        return self.start()
+
+    def __exit__(self, *exc: Any) -> None:
+        self.stop()
+
+    # ------------------------- 订单数据 -------------------------
+
+    def _new_order(self, record_id: Optional[int] = None) -> Dict[str, Any]:
+        rid = record_id if record_id is not None else next(self._ids)
+        brand_id, brand_name = self.random.choice(_BRANDS)
+        order = {
+            "recordId": rid,
+            "orderId": rid + 5000000,
+            "orderNo": "HS%d" % rid,
+            "apprizeAmount": self.random.randint(50, 5000),
+            "brandId": brand_id,
+            "brandName": brand_name,
+            "catId": "100001",
+            "catName": "手机",
+            "modelName": "%s X%d" % (brand_name, rid % 100),
+            "subOrderSourceName": self.random.choice(_MANUFACTURERS),
+            "countdown": 300,
+            "orderState": _OPEN,
+        }
+        self._orders[rid] = order
+        self._open[rid] = None
+        return order
+
+    def _close(self, rid: int, state: str) -> None:
+        self._orders[rid]["orderState"] = state
+        self._open.pop(rid, None)
+        self._new_order()  # 补充一单，待抢数量保持不变
+
+    # ------------------------- 接口 -------------------------
+
+    def handle(self, path: str, body: Dict[str, Any], token: str) -> Dict[str, Any]:
+        name = path.rsplit("/", 1)[-1]
+        if name == "checklogin":
+            return {"code": 1, "success": True, "data": {"token": "fake-%d" % self.random.randint(1, 10 ** 9), "userId": "10001"}}
+        if name == "queryuserinfo":
+            return {"code": 1, "success": True, "data": {"userId": body.get("userId"), "userName": "bench"}}
+        if name == "getmanufacturerdata":
+            return {"code": 1, "data": {"manufacturerList": [{"text": m, "value": m} for m in _MANUFACTURERS]}}
+        if name == "getsyscategory":
+            return {"code": 1, "data": {"catList": [{"catId": 100001, "catName": "手机"}, {"catId": 100002, "catName": "平板"}]}}
+        if name == "getsysbrand":
+            return {"code": 1, "data": {"brandList": [{"key": k, "value": v} for k, v in _BRANDS]}}
+        if not token:
+            return {"code": 401, "message": "请先登录"}
+        if name == "gethsdorderlist":
+            return self._order_list(body)
+        if name == "hsdgraborder":
+            return self._grab(int(body.get("recordId") or 0))
+        if name in ("hsdquotation", "hsdupdatequotation"):
+            with self._lock:
+                order = self._orders.get(int(body.get("recordId") or 0))
+                if order is not None:
+                    order["orderState"] = _QUOTED
+                    order["actualPrice"] = body.get("actualPrice")
+            return {"code": 1, "data": {"subCode": 100, "subMessage": "报价成功"}}
+        return {"code": 0, "message": "unknown api: %s" % path}
+
+    def _order_list(self, body: Dict[str, Any]) -> Dict[str, Any]:
+        page_size = max(1, int(body.get("pageSize") or 20))
+        page_index = max(1, int(body.get("pageIndex") or 1))
+        with self._lock:
+            open_ids = list(self._open)
+            start = (page_index - 1) * page_size
+            rows = [dict(self._orders[rid]) for rid in open_ids[start:start + page_size]]
+        return {"code": 1, "data": {"pageCount": len(open_ids), "result": {"orderList": rows}}}
+
+    def _grab(self, rid: int) -> Dict[str, Any]:
+        with self._lock:
+            order = self._orders.get(rid)
+            if order is None:
+                # 未出现在列表里的 recordId 视为新的待抢订单，便于压测直接构造 id
+                order = self._new_order(rid)
+            if order["orderState"] == _OPEN and self.random.random() < self.compete_rate:
+                self._close(rid, _TAKEN)
+            if order["orderState"] != _OPEN:
+                return {"code": 1, "data": {"subCode": 200, "subMessage": "已被其他报价师抢单"}}
+            self._close(rid, _OURS)
+        return {"code": 1, "data": {"subCode": 100, "subMessage": "抢单成功"}}
+
+    def _handler(self) -> type:
+        server = self
+
+        class _Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+            disable_nagle_algorithm = True  # 否则小响应会被 Nagle 算法额外延迟约 40ms
+
+            def log_message(self, *args: Any) -> None:
+                pass
+
+            def _reply(self, status: int, out: Dict[str, Any]) -> None:
+                data = json.dumps(out, ensure_ascii=False).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json;charset=UTF-8")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def do_POST(self) -> None:
+                length = int(self.headers.get("Content-Length") or 0)
+                raw = self.rfile.read(length) if length else b""
+                with server._lock:
+                    server.requests += 1
+                    delay = server.latency_ms + server.random.uniform(-server.jitter_ms, server.jitter_ms)
+                    failed = server.random.random() < server.error_rate
+                if delay > 0:
+                    time.sleep(delay / 1000.0)
+                if failed:
+                    self._reply(500, {"code": 0, "message": "模拟服务端错误"})
+                    return
+                try:
+                    body = json.loads(raw) if raw else {}
+                except ValueError:
+                    self._reply(400, {"code": 0, "message": "请求体不是 JSON"})
+                    return
+                self._reply(200, server.handle(self.path, body, self.headers.get("token") or ""))
+
+        return _Handler
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="本地模拟嗨回收接口")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=18080)
+    parser.add_argument("--latency", type=float, default=0.0, help="每个请求的延迟（毫秒）")
+    parser.add_argument("--jitter", type=float, default=0.0, help="延迟抖动（± 毫秒）")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="返回 HTTP 500 的概率")
+    parser.add_argument("--compete", type=float, default=0.0, help="抢单时订单已被其他报价师抢走的概率")
+    parser.add_argument("--orders", type=int, default=200, help="待抢订单数")
+    args = parser.parse_args()
+    server = FakeHaihuishouServer(
+        host=args.host,
+        port=args.port,
+        latency_ms=args.latency,
+        jitter_ms=args.jitter,
+        error_rate=args.error_rate,
+        compete_rate=args.compete,
+        orders=args.orders,
+    )
+    print("模拟服务已启动: %s" % server.base_url, flush=True)
+    try:
+        server._httpd.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server._httpd.server_close()
+
+
+if __name__ == "__main__":
+    main()
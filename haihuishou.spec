@@ -20,8 +20,24 @@ a = Analysis(
         'requests',
         'haihuishou',
         'haihuishou.app_ui',
+        'haihuishou.server',
         'haihuishou.api',
+        'haihuishou.resilience',
+        'haihuishou.credentials',
+        'haihuishou.metrics',
+        'haihuishou.tracing',
+        'haihuishou.coalesce',
+        'haihuishou.history',
         'haihuishou.grab_tool',
+        'haihuishou.scheduler',
+        'haihuishou.matching',
+        'haihuishou.refdata',
+        'haihuishou.orders',
+        'haihuishou.order_feed',
+        'haihuishou.pacing',
+        'haihuishou.multi_account',
+        'haihuishou.async_api',
+        'haihuishou.async_grab_tool',
         'haihuishou.__init__',
     ],
     hookspath=[],
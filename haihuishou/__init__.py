@@ -1,7 +1,29 @@
 # -*- coding: utf-8 -*-
 """嗨回收抢单工具。"""
 
-from .api import HaihuishouAPI, md5_password
-from .grab_tool import GrabCondition, GrabOrderTool
+from .api import AuthExpiredError, ClientRegistry, HaihuishouAPI, md5_password
+from .async_api import AsyncHaihuishouAPI
+from .async_grab_tool import AsyncGrabOrderTool
+from .credentials import CredentialCache
+from .grab_tool import GrabCondition, GrabOrderTool, GrabPriority, QuotePricer
+from .history import HistoryStore
+from .multi_account import MultiAccountEngine
+from .resilience import CircuitOpenError, UpstreamTimeoutError
 
-__all__ = ["HaihuishouAPI", "md5_password", "GrabCondition", "GrabOrderTool"]
+__all__ = [
+    "AuthExpiredError",
+    "UpstreamTimeoutError",
+    "CircuitOpenError",
+    "ClientRegistry",
+    "CredentialCache",
+    "HaihuishouAPI",
+    "md5_password",
+    "GrabCondition",
+    "GrabOrderTool",
+    "GrabPriority",
+    "QuotePricer",
+    "HistoryStore",
+    "AsyncHaihuishouAPI",
+    "AsyncGrabOrderTool",
+    "MultiAccountEngine",
+]
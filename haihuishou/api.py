@@ -7,8 +7,31 @@
 import hashlib
 import json
 import os
+import threading
+import time
+from collections import OrderedDict, deque
 import requests
-from typing import Any, Dict, List, Optional
+from requests.adapters import HTTPAdapter
+from typing import TYPE_CHECKING, Any, Callable, Deque, Dict, List, Optional, Set, Tuple
+
+from .coalesce import SingleFlight, list_cache_ttl_from_env
+from .metrics import METRICS, MetricsRegistry
+from .orders import OrderListStream
+from .resilience import (
+    BREAKERS,
+    BreakerRegistry,
+    CircuitBreaker,
+    CircuitOpenError,
+    NON_IDEMPOTENT,
+    TimeoutBudgets,
+    UpstreamTimeoutError,
+    critical,
+    is_critical,
+)
+from .tracing import CallTrace, Tracer, activate, connection_ms, emit, install, record_response
+
+if TYPE_CHECKING:
+    from .credentials import CredentialCache
 
 # 关闭 SSL 校验时不再打印 InsecureRequestWarning
 requests.packages.urllib3.disable_warnings(requests.packages.urllib3.exceptions.InsecureRequestWarning)
@@ -19,19 +42,105 @@ def _ssl_verify() -> bool:
     v = os.environ.get("HAIHUISHOU_SSL_VERIFY", "0").strip().lower()
     return v in ("1", "true", "yes")
 
+
+def _pool_size() -> int:
+    """每个域名保持的长连接数上限，默认 20，可用 HAIHUISHOU_POOL_SIZE 调整。"""
+    try:
+        return max(1, int(os.environ.get("HAIHUISHOU_POOL_SIZE", "20")))
+    except ValueError:
+        return 20
+
+def data_dir() -> str:
+    """本地数据目录（定时任务、缓存等），默认 ~/.haihuishou，可用 HAIHUISHOU_HOME 指定。"""
+    path = os.environ.get("HAIHUISHOU_HOME", "").strip() or os.path.join(os.path.expanduser("~"), ".haihuishou")
+    os.makedirs(path, exist_ok=True)
+    return path
+
 # 基础域名
 HSD_API = "https://hsdapi.haihuishou.com"
 HAIHUISHOU_API = "https://haihuishou.com"
 WAP_API = "https://wap.haihuishou.com"
 
+_BASE_HEADERS = {
+    "Content-Type": "application/json",
+    "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36",
+}
+
 
 def md5_password(password: str) -> str:
     """将明文密码转为接口要求的 MD5 字符串（32 位小写）。"""
     return hashlib.md5(password.encode("utf-8")).hexdigest()
 
 
+def make_adapter(pool_size: Optional[int] = None) -> HTTPAdapter:
+    """
+    创建 keep-alive 连接池。pool_connections 为缓存的域名连接池个数（hsd/main/wap 三个域名），
+    pool_maxsize 为每个域名可复用的连接数，多线程并发时超出部分会临时新建连接。
+    """
+    size = pool_size or _pool_size()
+    adapter = HTTPAdapter(pool_connections=4, pool_maxsize=size, max_retries=0)
+    install(adapter)  # 追踪时可记录 dns / connect / tls 耗时
+    return adapter
+
+
+def _is_auth_failure(status: int, data: Any) -> bool:
+    """
+    HTTP 401/403，或业务码为 401/403。
+    不看错误信息文字：“订单已失效”之类的业务错误不能当成 token 失效去重新登录、重发请求。
+    """
+    if status in (401, 403):
+        return True
+    if not isinstance(data, dict):
+        return False
+    return data.get("code") in (401, 403, "401", "403")
+
+
+def _json_body(r: requests.Response, trace: Optional[CallTrace] = None) -> Any:
+    """
+    解析响应 JSON：空响应为 {}；HTTP 出错且响应不是 JSON 时为 {}（交给 raise_for_status）。
+    传入 trace 时记录 decode 耗时。
+    """
+    t0 = time.perf_counter() if trace is not None else 0.0
+    try:
+        if not r.content.strip():
+            return {}
+        try:
+            return r.json()
+        except ValueError:
+            if r.status_code >= 400:
+                return {}
+            raise
+    finally:
+        if trace is not None:
+            trace.add("decode", time.perf_counter() - t0)
+
+
+def _endpoint_name(url: str) -> str:
+    """指标里的接口名：URL 最后一段路径（如 gethsdorderlist）。"""
+    return url.rsplit("/", 1)[-1]
+
+
+class AuthExpiredError(RuntimeError):
+    """
+    token 已失效且没有可用于重新登录的凭据；
+    或抢单 / 报价 / 修改报价遇到 token 失效——已重新登录，但请求不自动重发，由调用方决定是否重试。
+    """
+
+
 class HaihuishouAPI:
-    """嗨回收 API 客户端，支持登录与 token 鉴权。"""
+    """
+    嗨回收 API 客户端，支持登录与 token 鉴权。
+    每个客户端持有一个 requests.Session（keep-alive 连接池），可在多线程间共享；
+    传入 adapter 时多个客户端共用同一个连接池（见 ClientRegistry）。
+    传入 credentials（CredentialCache）时登录结果会落盘；需要 token 的接口遇到 token 失效时
+    自动重新登录一次并重试（多线程同时失效只登录一次）。
+    传入 tracer（见 tracing.py）时每次调用按 dns / connect / tls / wait / read / decode 分阶段计时。
+    order_lists 合并同一客户端上条件相同的并发列表查询（见 GrabOrderTool.step4_order_list），
+    list_cache_ttl 为列表微缓存秒数，默认取 HAIHUISHOU_LIST_CACHE_MS。
+    每个接口有各自的连接 / 读取超时（budgets，默认 TimeoutBudgets.from_env(timeout)，timeout 用于未单独设置的接口），
+    并受当前线程的截止时间约束（见 resilience.time_limit）；超时抛 UpstreamTimeoutError。
+    breakers 为各接口的熔断器（默认全局 BREAKERS），熔断中的接口直接抛 CircuitOpenError。
+    """
 
     def __init__(
         self,
@@ -40,28 +149,223 @@ class HaihuishouAPI:
         base_wap: str = WAP_API,
         timeout: int = 15,
         verify: Optional[bool] = None,
+        pool_size: Optional[int] = None,
+        adapter: Optional[HTTPAdapter] = None,
+        credentials: Optional["CredentialCache"] = None,
+        metrics: Optional[MetricsRegistry] = None,
+        tracer: Optional[Tracer] = None,
+        list_cache_ttl: Optional[float] = None,
+        budgets: Optional[TimeoutBudgets] = None,
+        breakers: Optional[BreakerRegistry] = None,
     ):
         self.base_hsd = base_hsd.rstrip("/")
         self.base_main = base_main.rstrip("/")
         self.base_wap = base_wap.rstrip("/")
         self.timeout = timeout
+        self.budgets = budgets or TimeoutBudgets.from_env(timeout)
+        self.breakers = breakers if breakers is not None else BREAKERS
         self.verify = verify if verify is not None else _ssl_verify()
         self._token: Optional[str] = None
         self._user_id: Optional[str] = None
+        # 保护 token/userId 的成对更新；读取时取一次快照即可
+        self._lock = threading.Lock()
+        self._owns_adapter = adapter is None
+        self._adapter = adapter or make_adapter(pool_size)
+        self._session = requests.Session()
+        self._session.mount("https://", self._adapter)
+        self._session.mount("http://", self._adapter)
+        self._fire_path: Optional["GrabFirePath"] = None
+        self.credentials = credentials
+        # 每个接口的耗时、状态码与 subCode 计数，默认写入全局 METRICS
+        self.metrics = metrics if metrics is not None else METRICS
+        self.tracer = tracer
+        ttl = list_cache_ttl if list_cache_ttl is not None else list_cache_ttl_from_env()
+        self.order_lists = SingleFlight(ttl, name="gethsdorderlist", metrics=self.metrics)
+        # 重新登录用的参数 (login_name, pwd_md5, client, login_type, device_name)
+        self._login_args: Optional[Tuple[str, str, str, int, str]] = None
+        self._relogin_lock = threading.Lock()
+        # 已确认失效的 token，ClientRegistry 不会再用它们覆盖新 token
+        self._expired: Set[str] = set()
+        # ClientRegistry.get 给未登记 token 的临时客户端：只用于一次请求，不启动连接预热线程
+        self.request_scoped = False
 
     def _headers(self, with_token: bool = False) -> Dict[str, str]:
-        h = {
-            "Content-Type": "application/json",
-            "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36",
-        }
-        if with_token and self._token:
-            h["token"] = self._token
+        h = dict(_BASE_HEADERS)
+        token = self._token
+        if with_token and token:
+            h["token"] = token
         return h
 
+    def _guard(self, endpoint: str) -> Tuple[Tuple[float, float], Optional[CircuitBreaker]]:
+        """本次请求的 (连接, 读取) 超时与熔断器；截止时间已到或熔断中时记一次 rejected 并抛错，不发请求。"""
+        try:
+            timeout = self.budgets.timeout(endpoint)
+            breaker = self.breakers.get(endpoint)
+            if breaker is not None and not is_critical():
+                breaker.before()
+        except UpstreamTimeoutError:
+            self.metrics.observe_rejected(endpoint, "deadline")
+            raise
+        except CircuitOpenError:
+            self.metrics.observe_rejected(endpoint, "circuit_open")
+            raise
+        return timeout, breaker
+
+    def _send_guarded(
+        self, endpoint: str, send: Callable[[Tuple[float, float]], requests.Response]
+    ) -> requests.Response:
+        """
+        经过超时预算与熔断器调用 send(timeout) 发出请求，记录耗时与状态码。
+        超时（含连接超时）记为 "timeout" 并抛 UpstreamTimeoutError；超时、连接失败与 5xx 计入熔断器的连续失败。
+        """
+        timeout, breaker = self._guard(endpoint)
+        t0 = time.perf_counter()
+        try:
+            r = send(timeout)
+        except requests.Timeout as e:
+            self.metrics.observe_request(endpoint, time.perf_counter() - t0, "timeout")
+            if breaker is not None:
+                breaker.failure()
+            if isinstance(e, requests.ConnectTimeout):
+                raise UpstreamTimeoutError(endpoint, "connect", timeout[0]) from e
+            raise UpstreamTimeoutError(endpoint, "read", timeout[1]) from e
+        except requests.RequestException:
+            self.metrics.observe_request(endpoint, time.perf_counter() - t0, "error")
+            if breaker is not None:
+                breaker.failure()
+            raise
+        self.metrics.observe_request(endpoint, time.perf_counter() - t0, r.status_code)
+        if breaker is not None:
+            if r.status_code >= 500:
+                breaker.failure()
+            else:
+                breaker.success()
+        return r
+
+    def _post(
+        self,
+        url: str,
+        payload: Any,
+        with_token: bool = False,
+        stream: bool = False,
+        trace: Optional[CallTrace] = None,
+    ) -> requests.Response:
+        """
+        所有接口统一从这里发出，复用连接池并记录耗时与状态码（超时与熔断见 _send_guarded）。
+        stream=True 时不预读响应体（调用方负责读完或关闭），耗时只算到收到响应头。
+        trace 为当前调用的追踪记录（见 _post_json），为 None 时不追踪。
+        """
+
+        def _send(timeout: Tuple[float, float]) -> requests.Response:
+            t0 = time.perf_counter()
+            conn_before = connection_ms(trace) if trace is not None else 0.0
+            r = self._session.post(
+                url,
+                json=payload,
+                headers=self._headers(with_token),
+                timeout=timeout,
+                verify=self.verify,
+                stream=stream or trace is not None,
+            )
+            if trace is not None:
+                record_response(trace, r, t0, conn_before, read_body=not stream)
+            return r
+
+        return self._send_guarded(_endpoint_name(url), _send)
+
+    def _post_json(self, url: str, payload: Any, with_token: bool = True) -> Dict[str, Any]:
+        """
+        发送请求并解析 JSON（空响应为 {}，非 JSON 抛 ValueError）。
+        with_token 时 token 失效会调用 relogin 后重试一次；无法重新登录时抛 AuthExpiredError。
+        抢单、报价等非幂等接口（resilience.NON_IDEMPOTENT）重新登录后不重发，直接抛 AuthExpiredError。
+        """
+        tracer = self.tracer
+        if tracer is None:
+            return self._request_json(url, payload, with_token, None)
+        trace = CallTrace(_endpoint_name(url), payload.get("recordId") if isinstance(payload, dict) else None)
+        prev = activate(trace)
+        try:
+            data = self._request_json(url, payload, with_token, trace)
+            trace.finish()
+            return data
+        except Exception as e:
+            trace.finish(error=e)
+            raise
+        finally:
+            activate(prev)
+            emit(tracer, trace)
+
+    def _request_json(self, url: str, payload: Any, with_token: bool, trace: Optional[CallTrace]) -> Dict[str, Any]:
+        token = self._token
+        r = self._post(url, payload, with_token=with_token, trace=trace)
+        data = _json_body(r, trace)
+        if with_token and _is_auth_failure(r.status_code, data):
+            if not self.relogin(token):
+                raise AuthExpiredError((isinstance(data, dict) and data.get("message")) or "token 已失效，请重新登录")
+            endpoint = _endpoint_name(url)
+            if endpoint in NON_IDEMPOTENT:
+                raise AuthExpiredError("%s token 已失效，已重新登录，请求未重发" % endpoint)
+            r = self._post(url, payload, with_token=True, trace=trace)
+            data = _json_body(r, trace)
+        r.raise_for_status()
+        if isinstance(data, dict) and isinstance(data.get("data"), dict) and "subCode" in data["data"]:
+            self.metrics.observe_sub_code(_endpoint_name(url), data["data"]["subCode"])
+        return data
+
+    def relogin(self, stale_token: Optional[str]) -> bool:
+        """
+        token 失效后重新取得 token（单飞：多个线程同时失效时只有第一个真正登录，其余直接用新 token）。
+        依次尝试：其他线程已刷新 → 凭据缓存里其他进程写入的新 token → 用本进程登录时的凭据重新登录
+        （本进程没登录过时用缓存里的密码，仅 HAIHUISHOU_SAVE_PASSWORD 开启时才有）。没有凭据可用时返回 False。
+        """
+        with self._relogin_lock:
+            if self._token and self._token != stale_token:
+                return True
+            if stale_token:
+                self._expired.add(stale_token)
+            args = self._login_args
+            cache = self.credentials
+            if cache is not None:
+                entry = cache.get(args[0]) if args else (cache.find_user(self._user_id) if self._user_id else None)
+                if entry:
+                    token = entry.get("token")
+                    if token and token != stale_token and token not in self._expired:
+                        self.set_token(token, entry.get("userId"))
+                        return True
+                    if args is None and entry.get("pwd") and entry.get("loginName"):
+                        args = (
+                            entry["loginName"],
+                            entry["pwd"],
+                            entry.get("client") or "001001002",
+                            int(entry.get("loginType") or 1),
+                            entry.get("deviceName") or "",
+                        )
+            if args is None:
+                return False
+            try:
+                self.login(*args)
+            except Exception:
+                return False
+            return True
+
+    def is_expired(self, token: Optional[str]) -> bool:
+        return token in self._expired
+
+    def adopt(self, other: "HaihuishouAPI") -> None:
+        """接管另一个客户端的登录结果（token、userId 与重新登录用的凭据）。"""
+        with self._relogin_lock:
+            if other._login_args is not None:
+                self._login_args = other._login_args
+            self._expired.update(other._expired)
+            if self._token and self._token != other.token:
+                self._expired.add(self._token)
+            self.set_token(other.token, other.user_id)
+
     def set_token(self, token: str, user_id: Optional[str] = None) -> None:
-        self._token = token
-        if user_id is not None:
-            self._user_id = user_id
+        with self._lock:
+            self._token = token
+            if user_id is not None:
+                self._user_id = user_id
 
     @property
     def token(self) -> Optional[str]:
@@ -71,6 +375,26 @@ class HaihuishouAPI:
     def user_id(self) -> Optional[str]:
         return self._user_id
 
+    def fire_path(self) -> "GrabFirePath":
+        """该客户端的抢单快速通道（首次调用时创建，随客户端共享）。"""
+        with self._lock:
+            if self._fire_path is None:
+                self._fire_path = GrabFirePath(self)
+            return self._fire_path
+
+    def close(self) -> None:
+        """关闭会话；共用的连接池由 ClientRegistry 负责关闭。"""
+        if self._fire_path is not None:
+            self._fire_path.stop_keepalive()
+        if self._owns_adapter:
+            self._session.close()
+
+    def __enter__(self) -> "HaihuishouAPI":
+        return self
+
+    def __exit__(self, *exc: Any) -> None:
+        self.close()
+
     # ------------------------- 1. 登录 -------------------------
 
     def login(
@@ -80,12 +404,21 @@ class HaihuishouAPI:
         client: str = "001001002",
         login_type: int = 1,
         device_name: str = "",
+        use_cache: bool = False,
     ) -> Dict[str, Any]:
         """
         登录获取 token 和用户信息。
         login_pwd 可为明文（内部会做 MD5）或已是 32 位小写 MD5 字符串。
+        use_cache=True 且凭据缓存里有该账号（密码一致）的 token 时直接复用，不发登录请求；
+        token 实际已失效时由接口调用处自动重新登录。
         """
         pwd = login_pwd if len(login_pwd) == 32 and all(c in "0123456789abcdef" for c in login_pwd) else md5_password(login_pwd)
+        self._login_args = (login_name, pwd, client, login_type, device_name)
+        if use_cache and self.credentials is not None:
+            entry = self.credentials.lookup(login_name, pwd)
+            if entry and entry.get("token") and entry.get("userId"):
+                self.set_token(entry["token"], entry["userId"])
+                return dict(entry.get("info") or {}, token=entry["token"], userId=entry["userId"])
         url = f"{self.base_hsd}/api/login/checklogin"
         payload = {
             "client": client,
@@ -94,16 +427,15 @@ class HaihuishouAPI:
             "loginPwd": pwd,
             "loginType": login_type,
         }
-        r = requests.post(
-            url, json=payload, headers=self._headers(with_token=False), timeout=self.timeout, verify=self.verify
-        )
-        r.raise_for_status()
-        data = r.json()
+        data = self._post_json(url, payload, with_token=False)
         if data.get("code") != 1 or not data.get("success"):
             raise RuntimeError(data.get("message", "登录失败"))
         info = data.get("data", {})
-        self._token = info.get("token")
-        self._user_id = info.get("userId")
+        with self._lock:
+            self._token = info.get("token")
+            self._user_id = info.get("userId")
+        if self.credentials is not None:
+            self.credentials.put(login_name, pwd, info, client=client, login_type=login_type, device_name=device_name)
         return info
 
     def query_user_info(self, user_id: Optional[str] = None) -> Dict[str, Any]:
@@ -117,15 +449,7 @@ class HaihuishouAPI:
         if not self._token:
             raise ValueError("查询用户信息需要 token，请先登录")
         url = f"{self.base_hsd}/api/user/queryuserinfo"
-        r = requests.post(
-            url,
-            json={"userId": uid},
-            headers=self._headers(with_token=True),
-            timeout=self.timeout,
-            verify=self.verify,
-        )
-        r.raise_for_status()
-        data = r.json()
+        data = self._post_json(url, {"userId": uid})
         if data.get("code") != 1 or not data.get("success"):
             raise RuntimeError(data.get("message", "获取用户信息失败"))
         return data.get("data", {})
@@ -135,11 +459,7 @@ class HaihuishouAPI:
     def get_manufacturer_list(self) -> List[Dict[str, str]]:
         """获取厂商列表。"""
         url = f"{self.base_hsd}/api/syscategory/getmanufacturerdata"
-        r = requests.post(
-            url, json={}, headers=self._headers(with_token=False), timeout=self.timeout, verify=self.verify
-        )
-        r.raise_for_status()
-        data = r.json()
+        data = self._post_json(url, {}, with_token=False)
         if data.get("code") != 1:
             raise RuntimeError(data.get("message", "获取厂商列表失败"))
         return data.get("data", {}).get("manufacturerList", [])
@@ -147,11 +467,7 @@ class HaihuishouAPI:
     def get_sys_category(self) -> List[Dict[str, Any]]:
         """获取电子产品类型（如手机、平板、笔记本）。"""
         url = f"{self.base_hsd}/api/syscategory/getsyscategory"
-        r = requests.post(
-            url, json={}, headers=self._headers(with_token=False), timeout=self.timeout, verify=self.verify
-        )
-        r.raise_for_status()
-        data = r.json()
+        data = self._post_json(url, {}, with_token=False)
         if data.get("code") != 1:
             raise RuntimeError(data.get("message", "获取分类失败"))
         return data.get("data", {}).get("catList", [])
@@ -159,15 +475,7 @@ class HaihuishouAPI:
     def get_sys_brand(self, cat_id: int) -> List[Dict[str, str]]:
         """根据电子产品类型（catId）查询该类型下的品牌。"""
         url = f"{self.base_hsd}/api/syscategory/getsysbrand"
-        r = requests.post(
-            url,
-            json={"catId": cat_id},
-            headers=self._headers(with_token=False),
-            timeout=self.timeout,
-            verify=self.verify,
-        )
-        r.raise_for_status()
-        data = r.json()
+        data = self._post_json(url, {"catId": cat_id}, with_token=False)
         if data.get("code") != 1:
             raise RuntimeError(data.get("message", "获取品牌列表失败"))
         return data.get("data", {}).get("brandList", [])
@@ -192,12 +500,101 @@ class HaihuishouAPI:
         subOrderSourceNames：厂商名称列表（如 华为、OPPO、小米、荣耀）
         orderState：默认 "10" 表示未被下单的。
         """
+        url = f"{self.base_hsd}/api/orderquery/gethsdorderlist"
+        payload = self._order_list_payload(
+            page_index, page_size, order_state, category_brands, min_price, max_price, sub_order_source_names, user_id
+        )
+        try:
+            data = self._post_json(url, payload)
+        except (ValueError, json.JSONDecodeError):
+            raise RuntimeError("订单列表接口返回非 JSON，请确认已登录且 token 有效")
+        if data.get("code") is not None and data.get("code") != 1:
+            raise RuntimeError(data.get("message", "查询订单列表失败"))
+        inner = data.get("data", data)
+        if isinstance(inner, dict) and "list" not in inner:
+            for key in ("list", "results", "records", "orderList"):
+                if key in data and data[key] is not None:
+                    inner = {**inner, "list": data[key]}
+                    break
+        return inner
+
+    def stream_hsd_order_list(
+        self,
+        page_index: int = 1,
+        page_size: int = 100,
+        order_state: str = "10",
+        category_brands: Optional[List[Dict[str, Any]]] = None,
+        min_price: Optional[str] = None,
+        max_price: Optional[str] = None,
+        sub_order_source_names: Optional[List[str]] = None,
+        user_id: Optional[str] = None,
+        chunk_size: int = 8192,
+    ) -> OrderListStream:
+        """
+        同 get_hsd_order_list，但边下载边解析：迭代返回值即逐条得到订单行，内存只保留当前一条。
+        迭代结束后 .total 为列表总数；业务码不为 1 时在迭代结束时抛 RuntimeError。
+        token 失效时先重新登录再抛错（已边读边返回，无法原样重试），下一次查询使用新 token。
+        """
+        url = f"{self.base_hsd}/api/orderquery/gethsdorderlist"
+        payload = self._order_list_payload(
+            page_index, page_size, order_state, category_brands, min_price, max_price, sub_order_source_names, user_id
+        )
+        token = self._token
+        tracer = self.tracer
+        trace = CallTrace(_endpoint_name(url)) if tracer is not None else None
+        prev = activate(trace) if trace is not None else None
+        r: Optional[requests.Response] = None
+        try:
+            r = self._post(url, payload, with_token=True, stream=True, trace=trace)
+            if r.status_code in (401, 403):
+                self.relogin(token)
+            r.raise_for_status()
+        except Exception as e:
+            if trace is not None:
+                activate(prev)
+                trace.finish(error=e)
+                emit(tracer, trace)
+            if r is not None:
+                r.close()
+            raise
+        if trace is not None:
+            activate(prev)
+
+        def _check(envelope: Dict[str, Any]) -> None:
+            if envelope.get("code") is not None and envelope.get("code") != 1:
+                if _is_auth_failure(200, envelope):
+                    self.relogin(token)
+                raise RuntimeError(envelope.get("message", "查询订单列表失败"))
+
+        on_close = r.close
+        if trace is not None:
+            headers_at = time.perf_counter()
+
+            def on_close() -> None:
+                # 边读边解析：read 为收到响应头到读完的时间，含逐条解析以及调用方处理每条订单的时间
+                r.close()
+                trace.add("read", time.perf_counter() - headers_at)
+                trace.finish()
+                emit(tracer, trace)
+
+        return OrderListStream(r.iter_content(chunk_size), check=_check, on_close=on_close)
+
+    def _order_list_payload(
+        self,
+        page_index: int,
+        page_size: int,
+        order_state: str,
+        category_brands: Optional[List[Dict[str, Any]]],
+        min_price: Optional[str],
+        max_price: Optional[str],
+        sub_order_source_names: Optional[List[str]],
+        user_id: Optional[str],
+    ) -> Dict[str, Any]:
         uid = user_id or self._user_id
         if not uid:
             raise ValueError("查询订单列表需要 userId，请先登录")
         if not self._token:
             raise ValueError("查询订单列表需要 token（请求头），请先登录")
-        url = f"{self.base_hsd}/api/orderquery/gethsdorderlist"
         payload = {
             "pageIndex": page_index,
             "pageSize": page_size,
@@ -210,41 +607,12 @@ class HaihuishouAPI:
             payload["minPrice"] = min_price
         if max_price is not None:
             payload["maxPrice"] = max_price
-        headers = self._headers(with_token=True)
-        r = requests.post(
-            url,
-            json=payload,
-            headers=headers,
-            timeout=self.timeout,
-            verify=self.verify,
-        )
-        r.raise_for_status()
-        try:
-            data = r.json() if r.text.strip() else {}
-        except (ValueError, json.JSONDecodeError):
-            raise RuntimeError("订单列表接口返回非 JSON，请确认已登录且 token 有效")
-        if data.get("code") is not None and data.get("code") != 1:
-            raise RuntimeError(data.get("message", "查询订单列表失败"))
-        inner = data.get("data", data)
-        if isinstance(inner, dict) and "list" not in inner:
-            for key in ("list", "results", "records", "orderList"):
-                if key in data and data[key] is not None:
-                    inner = {**inner, "list": data[key]}
-                    break
-        return inner
+        return payload
 
     def grab_order_query(self, **body: Any) -> Dict[str, Any]:
         """抢单查询接口（wap 域），需要 token。"""
         url = f"{self.base_wap}/api/miniProgram/hd/order/grabOrderQuery"
-        r = requests.post(
-            url,
-            json=body or {},
-            headers=self._headers(with_token=True),
-            timeout=self.timeout,
-            verify=self.verify,
-        )
-        r.raise_for_status()
-        return r.json()
+        return self._post_json(url, body or {})
 
     # ------------------------- 4.5 抢单（需要 token，成功后再报价） -------------------------
 
@@ -266,15 +634,7 @@ class HaihuishouAPI:
             "orderId": int(order_id),
             "userId": uid,
         }
-        r = requests.post(
-            url,
-            json=payload,
-            headers=self._headers(with_token=True),
-            timeout=self.timeout,
-            verify=self.verify,
-        )
-        r.raise_for_status()
-        return r.json() if r.text.strip() else {}
+        return self._post_json(url, payload)
 
     # ------------------------- 5. 报价提交（需要 token） -------------------------
 
@@ -300,15 +660,7 @@ class HaihuishouAPI:
             "remark": remark,
             "userId": uid,
         }
-        r = requests.post(
-            url,
-            json=payload,
-            headers=self._headers(with_token=True),
-            timeout=self.timeout,
-            verify=self.verify,
-        )
-        r.raise_for_status()
-        data = r.json()
+        data = self._post_json(url, payload)
         if data.get("code") != 1:
             raise RuntimeError(data.get("message", data.get("data", {}).get("subMessage", "报价失败")))
         return data.get("data", {})
@@ -335,16 +687,305 @@ class HaihuishouAPI:
             "recordId": int(record_id),
             "userId": uid,
         }
-        r = requests.post(
-            url,
-            json=payload,
-            headers=self._headers(with_token=True),
-            timeout=self.timeout,
-            verify=self.verify,
-        )
-        r.raise_for_status()
-        data = r.json() if r.text.strip() else {}
+        data = self._post_json(url, payload)
         resp_data = data.get("data") or {}
         if data.get("code") != 1 or resp_data.get("subCode") != 100:
             raise RuntimeError(resp_data.get("subMessage", data.get("message", "修改报价失败")))
         return resp_data
+
+
+class GrabFirePath:
+    """
+    抢单快速通道：请求头与 JSON 报文模板按 token/userId 预先生成，直接走连接池发送（跳过 Session 的逐次
+    参数合并与 json 序列化，代理与证书设置在创建时解析一次）；抢单返回 subCode=100 后立即发出报价。
+    start_keepalive() 定时预热连接，空闲后第一次抢单不必重新 TCP+TLS 握手。
+    每次 fire 的耗时记录在 timings（最近 1000 条）：grabMs 为发出到抢单返回，quoteMs 为发出到报价返回。
+    """
+
+    # 预热连接用的请求（无需 token、数据量小）
+    KEEPALIVE_PATH = "/api/syscategory/getsyscategory"
+
+    def __init__(self, api: HaihuishouAPI, keepalive_interval: float = 15.0, connections: int = 4):
+        self.api = api
+        self.keepalive_interval = keepalive_interval
+        self.connections = connections
+        self.timings: Deque[Dict[str, Any]] = deque(maxlen=1000)
+        self._key: Optional[Tuple[Optional[str], Optional[str]]] = None
+        self._lock = threading.Lock()
+        self._keepalive_stop = threading.Event()
+        self._keepalive_thread: Optional[threading.Thread] = None
+        self._last_used = time.monotonic()
+        self._ping = self._prepare(api.base_hsd + self.KEEPALIVE_PATH, dict(_BASE_HEADERS))
+        # 直接走连接池会跳过 Session 的环境设置：代理（HTTPS_PROXY / NO_PROXY）与证书（REQUESTS_CA_BUNDLE）
+        # 按 hsd 域名解析一次，与普通请求一致
+        env = api._session.merge_environment_settings(api.base_hsd, {}, None, api.verify, None)
+        self._proxies = env["proxies"]
+        self._verify = env["verify"]
+        self._cert = env["cert"]
+
+    def _prepare(self, url: str, headers: Dict[str, str]) -> requests.PreparedRequest:
+        p = requests.PreparedRequest()
+        p.prepare(method="POST", url=url, headers=headers, data=b"{}")
+        return p
+
+    def _templates(self) -> Tuple[requests.PreparedRequest, requests.PreparedRequest, str, str]:
+        """按当前 token/userId 取（必要时重建）抢单、报价请求模板与报文模板。"""
+        key = (self.api.token, self.api.user_id)
+        if key != self._key:
+            with self._lock:
+                if key != self._key:
+                    token, uid = key
+                    if not token:
+                        raise ValueError("抢单需要 token，请先登录")
+                    if not uid:
+                        raise ValueError("抢单需要 userId，请先登录或传入 user_id")
+                    headers = dict(_BASE_HEADERS)
+                    headers["token"] = token
+                    base = self.api.base_hsd
+                    uid_json = json.dumps(uid)
+                    self._grab_req = self._prepare(base + "/api/orderoper/hsdgraborder", headers)
+                    self._quote_req = self._prepare(base + "/api/orderoper/hsdquotation", headers)
+                    self._grab_tpl = '{"recordId": %d, "orderId": %d, "userId": ' + uid_json + "}"
+                    self._quote_tpl = (
+                        '{"recordId": %d, "orderId": %d, "quoteResult": %d, "actualPrice": %s, "remark": %s, "userId": '
+                        + uid_json
+                        + "}"
+                    )
+                    self._key = key
+        return self._grab_req, self._quote_req, self._grab_tpl, self._quote_tpl
+
+    def _send(
+        self, template: requests.PreparedRequest, body: bytes, trace: Optional[CallTrace] = None
+    ) -> requests.Response:
+        p = template.copy()
+        p.body = body
+        p.headers["Content-Length"] = str(len(body))
+
+        def _send(timeout: Tuple[float, float]) -> requests.Response:
+            t0 = time.perf_counter()
+            conn_before = connection_ms(trace) if trace is not None else 0.0
+            r = self.api._adapter.send(
+                p, stream=trace is not None, timeout=timeout, verify=self._verify, cert=self._cert, proxies=self._proxies
+            )
+            if trace is not None:
+                record_response(trace, r, t0, conn_before, read_body=True)
+            return r
+
+        return self.api._send_guarded(_endpoint_name(p.url), _send)
+
+    def _call(self, template: requests.PreparedRequest, body: bytes, record_id: int) -> Tuple[requests.Response, Any]:
+        """发送并解析 JSON；客户端设置了 tracer 时按阶段计时。"""
+        tracer = self.api.tracer
+        if tracer is None:
+            r = self._send(template, body)
+            return r, _json_body(r)
+        trace = CallTrace(_endpoint_name(template.url), record_id)
+        prev = activate(trace)
+        try:
+            r = self._send(template, body, trace)
+            data = _json_body(r, trace)
+            trace.finish()
+            return r, data
+        except Exception as e:
+            trace.finish(error=e)
+            raise
+        finally:
+            activate(prev)
+            emit(tracer, trace)
+
+    def _raise_auth_expired(self, endpoint: str, template: requests.PreparedRequest, data: Any) -> None:
+        if not self.api.relogin(template.headers.get("token")):
+            raise AuthExpiredError((isinstance(data, dict) and data.get("message")) or "token 已失效，请重新登录")
+        raise AuthExpiredError("%s token 已失效，已重新登录，请求未重发" % endpoint)
+
+    def fire(
+        self,
+        record_id: Any,
+        order_id: Any,
+        actual_price: Any,
+        remark: str = "",
+        quote_result: int = 1,
+    ) -> Dict[str, Any]:
+        """
+        抢单并在 subCode=100 时立即报价，不抛业务异常。
+        返回 {"recordId", "orderId", "grabbed", "quoted", "subCode", "grabMs", "quoteMs", "error"}。
+        """
+        self._last_used = time.monotonic()
+        out: Dict[str, Any] = {
+            "recordId": record_id,
+            "orderId": order_id,
+            "grabbed": False,
+            "quoted": False,
+            "subCode": None,
+            "grabMs": None,
+            "quoteMs": None,
+            "error": None,
+        }
+        t0 = time.perf_counter()
+        try:
+            grab_req, quote_req, grab_tpl, quote_tpl = self._templates()
+            rid, oid = int(record_id), int(order_id)
+            quote_body = (quote_tpl % (rid, oid, quote_result, json.dumps(str(actual_price)), json.dumps(remark))).encode("utf-8")
+            r, body = self._call(grab_req, (grab_tpl % (rid, oid)).encode("utf-8"), rid)
+            if _is_auth_failure(r.status_code, body):
+                # token 失效：重新登录供下一次使用，抢单不重发（服务端可能已处理）
+                self._raise_auth_expired("hsdgraborder", grab_req, body)
+            out["grabMs"] = round((time.perf_counter() - t0) * 1000, 1)
+            r.raise_for_status()
+            resp_data = body.get("data") or {}
+            sub_code = resp_data.get("subCode")
+            out["subCode"] = sub_code
+            self.api.metrics.observe_sub_code("hsdgraborder", sub_code)
+            if sub_code == 200:
+                out["error"] = "recordId=%s 抢单失败: %s" % (record_id, (resp_data.get("subMessage") or "已被抢"))
+            elif sub_code != 100:
+                out["error"] = "recordId=%s 抢单异常 subCode=%s" % (record_id, sub_code)
+            else:
+                out["grabbed"] = True
+                # 抢到的单不能丢：报价不受截止时间与熔断限制
+                with critical():
+                    r, data = self._call(quote_req, quote_body, rid)
+                    out["quoteMs"] = round((time.perf_counter() - t0) * 1000, 1)
+                    if _is_auth_failure(r.status_code, data):
+                        # 抢单后 token 恰好失效：同样不重发报价，grabbed=True 交给调用方补报
+                        self._raise_auth_expired("hsdquotation", quote_req, data)
+                r.raise_for_status()
+                if "subCode" in (data.get("data") or {}):
+                    self.api.metrics.observe_sub_code("hsdquotation", data["data"]["subCode"])
+                if data.get("code") != 1:
+                    raise RuntimeError(data.get("message", (data.get("data") or {}).get("subMessage", "报价失败")))
+                out["quoted"] = True
+        except Exception as e:
+            out["error"] = "recordId=%s: %s" % (record_id, str(e))
+        self.timings.append(out)
+        return out
+
+    def warm(self, connections: Optional[int] = None) -> None:
+        """并发发出 connections 个轻量请求，让连接池里保持这么多条已握手的连接。"""
+        n = max(1, connections or self.connections)
+
+        def _ping() -> None:
+            try:
+                self._send(self._ping, b"{}").close()
+            except Exception:
+                pass
+
+        threads = [threading.Thread(target=_ping, daemon=True) for _ in range(n - 1)]
+        for t in threads:
+            t.start()
+        _ping()
+        for t in threads:
+            t.join(self.api.timeout)
+
+    def start_keepalive(self, max_idle: float = 600.0) -> None:
+        """后台定时预热连接；超过 max_idle 秒没有 fire / start_keepalive 调用时自动停止。临时客户端不预热。"""
+        if self.api.request_scoped:
+            return
+        self._last_used = time.monotonic()
+        with self._lock:
+            if self._keepalive_thread is not None and self._keepalive_thread.is_alive():
+                return
+            self._keepalive_stop.clear()
+            self._keepalive_thread = threading.Thread(
+                target=self._keepalive_loop, args=(max_idle,), name="haihuishou-keepalive", daemon=True
+            )
+            self._keepalive_thread.start()
+
+    def stop_keepalive(self) -> None:
+        self._keepalive_stop.set()
+
+    def _keepalive_loop(self, max_idle: float) -> None:
+        while not self._keepalive_stop.is_set():
+            if time.monotonic() - self._last_used > max_idle:
+                return
+            self.warm()
+            if self._keepalive_stop.wait(self.keepalive_interval):
+                return
+
+
+class ClientRegistry:
+    """
+    应用级客户端登记表：同一 userId 复用同一个 HaihuishouAPI，所有客户端共用一个连接池。
+    Web UI 每个请求从这里取客户端，避免每次重新握手。
+    api_kwargs 传给每个新客户端（如 credentials=CredentialCache()，token 失效时按 userId 找凭据重新登录）。
+    """
+
+    def __init__(self, pool_size: Optional[int] = None, max_clients: int = 256, **api_kwargs: Any):
+        self._adapter = make_adapter(pool_size)
+        self._api_kwargs = api_kwargs
+        self._max_clients = max_clients
+        self._clients: "OrderedDict[str, HaihuishouAPI]" = OrderedDict()
+        self._anonymous: Optional[HaihuishouAPI] = None
+        self._lock = threading.Lock()
+
+    def new_client(self) -> HaihuishouAPI:
+        """新建一个共用连接池的客户端（未登录，用于登录等会改写 token 的场景）。"""
+        return HaihuishouAPI(adapter=self._adapter, **self._api_kwargs)
+
+    def anonymous(self) -> HaihuishouAPI:
+        """无需 token 的接口（厂商、分类、品牌）共用一个客户端。"""
+        with self._lock:
+            if self._anonymous is None:
+                self._anonymous = self.new_client()
+            return self._anonymous
+
+    def get(self, token: Optional[str], user_id: Optional[str]) -> HaihuishouAPI:
+        """
+        按 userId 取共享客户端。请求里的 token 不会改写共享客户端的 token（只有登录后的 register 会），
+        否则过期、伪造或其他账号的 token 会让该账号的定时任务与实时推送一直失败：
+        token 与客户端一致，或是客户端已替换掉的旧 token（页面会话里的 token，客户端已自动重新登录）时返回共享客户端；
+        其他 token、以及该 userId 还没有登记过客户端时，返回一个只用于本次请求、不登记的客户端。
+        只有 register（登录成功后）会登记客户端。
+        """
+        if not token or not user_id:
+            return self.anonymous()
+        key = str(user_id)
+        with self._lock:
+            api = self._clients.get(key)
+            if api is not None:
+                self._clients.move_to_end(key)
+                if api.token == token or api.is_expired(token):
+                    return api
+        api = self.new_client()
+        api.set_token(token, key)
+        api.request_scoped = True
+        return api
+
+    def register(self, api: HaihuishouAPI) -> HaihuishouAPI:
+        """登录成功后登记客户端（连同重新登录用的凭据），返回该 userId 对应的共享客户端。"""
+        if not api.token or not api.user_id:
+            return self.anonymous()
+        key = str(api.user_id)
+        with self._lock:
+            shared = self._clients.get(key)
+            if shared is None:
+                self._clients[key] = api
+                evicted = self._evict()
+            else:
+                self._clients.move_to_end(key)
+        if shared is None:
+            for old in evicted:
+                old.close()
+            return api
+        if shared is not api:
+            shared.adopt(api)
+        return shared
+
+    def _evict(self) -> List[HaihuishouAPI]:
+        """超出 max_clients 时移出最久未用的客户端（调用方持有锁），由调用方在锁外关闭（停止抢单连接预热）。"""
+        evicted = []
+        while len(self._clients) > self._max_clients:
+            evicted.append(self._clients.popitem(last=False)[1])
+        return evicted
+
+    def close(self) -> None:
+        """关闭全部客户端（停止各自的抢单连接预热线程）与共用的连接池。"""
+        with self._lock:
+            apis = list(self._clients.values())
+            if self._anonymous is not None:
+                apis.append(self._anonymous)
+            self._clients.clear()
+            self._anonymous = None
+        for api in apis:
+            api.close()
+        self._adapter.close()
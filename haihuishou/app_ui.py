@@ -4,14 +4,28 @@
 启动后浏览器访问 http://127.0.0.1:5050
 """
 
+import json
 import os
 import sys
-from typing import Any, Dict
-
-from flask import Flask, jsonify, render_template, request, session
-
-from .api import HaihuishouAPI
-from .grab_tool import GrabCondition, GrabOrderTool
+import threading
+import time
+from typing import Any, Dict, Optional, Tuple
+
+from flask import Flask, Response, jsonify, render_template, request, session
+
+from .api import ClientRegistry, HaihuishouAPI
+from .credentials import CredentialCache
+from .metrics import METRICS
+from .grab_tool import DRAIN_MAX_GRABS, DRAIN_WORKERS, GrabCondition, GrabOrderTool, GrabPriority, QuotePricer
+from .history import HistoryStore, history_from_env
+from .order_feed import OrderFeedHub
+from .orders import ORDER_LIST, SeenOrderIndex
+from .pacing import AccountLimiter
+from .refdata import ReferenceDataCache
+from .resilience import BREAKERS, task_deadline_from_env
+from .scheduler import TaskScheduler
+from .server import stream_limit
+from .tracing import trace_sink_from_env
 
 # 打包成 exe 时模板在 sys._MEIPASS 下
 _base_dir = getattr(sys, "_MEIPASS", os.path.dirname(os.path.abspath(__file__)))
@@ -20,18 +34,121 @@ app = Flask(__name__, template_folder=_template_dir)
 app.secret_key = os.environ.get("HAIHUISHOU_SECRET_KEY", "haihuishou-grab-dev-secret")
 app.config["JSON_AS_ASCII"] = False
 
+# 订单推送连接空闲多久（秒）发一次保活注释
+FEED_KEEPALIVE = 15.0
+# 单个推送连接最长保持多久（秒），到时关闭，浏览器按 retry 自动重连
+FEED_MAX_AGE = 300.0
+# 同时保持的推送连接数上限（与 server.py 为推送连接另留的线程数一致），多出的连接收到 feed-error 后稍后重连
+_stream_slots = threading.BoundedSemaphore(stream_limit())
+
+# 抢光模式下接口允许的每轮最多抢单数 / 并发数
+MAX_DRAIN_GRABS = 100
+MAX_DRAIN_WORKERS = 32
+
+# 所有请求共用的客户端登记表：同一 userId 复用同一个客户端与 keep-alive 连接池；
+# 登录凭据落盘，服务重启后定时任务用旧 token 失效时可自动重新登录；设置 HAIHUISHOU_TRACE 时记录分阶段耗时
+clients = ClientRegistry(credentials=CredentialCache(), tracer=trace_sink_from_env())
+# 厂商 / 分类 / 品牌缓存（落盘，过期后台刷新）
+refdata = ReferenceDataCache(clients.anonymous())
+# 每个账号查列表的令牌桶，定时任务与 /api/execute-task 共用
+limiter = AccountLimiter()
+# 订单与抢单 / 报价历史（SQLite，后台批量写入）：在 start_background_services() 里创建，
+# 只导入模块（CLI、reloader 父进程）时不建库、不起写入线程；未启动或 HAIHUISHOU_HISTORY=0 时为 None
+history: Optional[HistoryStore] = None
+
+
+# 每个账号一个已抢订单索引，手动执行与服务端定时任务共用
+_seen_indexes: Dict[str, SeenOrderIndex] = {}
+_seen_lock = threading.Lock()
+
+
+def seen_index(user_id: Any) -> SeenOrderIndex:
+    with _seen_lock:
+        idx = _seen_indexes.get(str(user_id))
+        if idx is None:
+            idx = _seen_indexes[str(user_id)] = SeenOrderIndex()
+        return idx
+
+
+def _api_for(token: Any, user_id: Any) -> HaihuishouAPI:
+    return clients.get(token, user_id)
+
 
 def _api_with_session() -> HaihuishouAPI:
-    api = HaihuishouAPI()
     token = session.get("token")
     uid = session.get("user_id") or session.get("userId")
-    if token:
-        api.set_token(token, uid)
-    return api
+    return _api_for(token, uid)
 
 
 def _tool_with_session() -> GrabOrderTool:
-    return GrabOrderTool(api=_api_with_session())
+    return GrabOrderTool(api=_api_with_session(), refdata=refdata)
+
+
+def _tool_for(token: str, user_id: str) -> GrabOrderTool:
+    return GrabOrderTool(
+        api=_api_for(token, user_id), refdata=refdata, seen=seen_index(user_id), history=history, limiter=limiter
+    )
+
+
+# 实时订单列表：同一账号同一条件的页面共用一个服务端轮询
+order_feed = OrderFeedHub(_tool_for, limiter=limiter)
+
+
+_scheduler: Optional[TaskScheduler] = None
+_scheduler_lock = threading.Lock()
+
+
+def get_scheduler() -> TaskScheduler:
+    """定时任务调度器（首次使用时从本地文件加载任务定义）。"""
+    global _scheduler
+    with _scheduler_lock:
+        if _scheduler is None:
+            sched = TaskScheduler(_tool_for, limiter=limiter, history=history)
+            sched.load()
+            _scheduler = sched
+        return _scheduler
+
+
+def start_background_services() -> None:
+    """服务启动时调用：打开历史记录，预取基础数据，恢复上次退出前处于执行状态的定时任务。"""
+    global history
+    if history is None:
+        history = history_from_env()
+    refdata.start_auto_refresh()
+    sched = get_scheduler()
+    # 定时任务保存的是登录后会话里的 token：登记为共享客户端，恢复的任务复用连接与抢单快速通道
+    for user_id, token in sched.tokens().items():
+        api = clients.new_client()
+        api.set_token(token, user_id)
+        clients.register(api)
+    sched.resume()
+
+
+def stop_background_services(timeout: float = 30.0) -> None:
+    """
+    服务退出时调用：停止定时任务线程（等正在执行的一轮抢单、报价做完，running 状态保留，下次启动时恢复），
+    结束实时推送连接，停止基础数据刷新。
+    """
+    with _scheduler_lock:
+        sched = _scheduler
+    if sched is not None:
+        sched.shutdown(timeout)
+    order_feed.close()
+    refdata.stop_auto_refresh()
+
+
+def close_resources() -> None:
+    """请求全部结束后调用：写完历史记录，关闭全部客户端（停止抢单连接预热）。"""
+    if history is not None:
+        history.close()
+    clients.close()
+
+
+def _request_auth() -> Tuple[Optional[str], Optional[str]]:
+    """取当前请求的 token（请求头优先）与 userId（session）。"""
+    token = request.headers.get("token") or session.get("token")
+    user_id = session.get("user_id") or session.get("userId")
+    return token, user_id
 
 
 @app.route("/")
@@ -47,12 +164,14 @@ def api_login():
     if not login_name or not login_pwd:
         return jsonify({"success": False, "message": "请填写手机号和密码"}), 400
     try:
-        tool = _tool_with_session()
+        tool = GrabOrderTool(api=clients.new_client())
         info = tool.step1_login(login_name, login_pwd)
+        clients.register(tool.api)
         session["token"] = info.get("token")
         uid = info.get("userId") or info.get("user_id")
         session["user_id"] = uid
         session["userId"] = uid
+        get_scheduler().set_token(uid, info.get("token"))
         return jsonify({"success": True, "data": info})
     except Exception as e:
         return jsonify({"success": False, "message": str(e)}), 200
@@ -111,16 +230,8 @@ def api_brands():
         return jsonify({"success": False, "message": str(e)}), 200
 
 
-@app.route("/api/order-list", methods=["POST"])
-def api_order_list():
-    body = request.get_json() or {}
-    # 优先用请求里的 token（headers）和 userId（body），没有则用 session
-    token = request.headers.get("token") or session.get("token")
-    user_id = body.get("userId") or session.get("user_id") or session.get("userId")
-    if not token:
-        return jsonify({"success": False, "message": "请先登录（缺少 token，需放在请求头）"}), 401
-    if not user_id:
-        return jsonify({"success": False, "message": "请先登录（缺少 userId，需放在请求体）"}), 401
+def _order_list_condition(body: Dict[str, Any]) -> Tuple[GrabCondition, int]:
+    """订单列表查询条件与页码（/api/order-list 与 /api/order-stream 共用）。"""
     # categoryBrands: 电子产品+品牌 [{"key": "100001", "value": ["100007", "100011"]}]
     category_brands = body.get("categoryBrands") or []
     order_state = (body.get("orderState") or "10").strip()
@@ -139,45 +250,86 @@ def api_order_list():
         sub_order_source_names=sub_order_source_names,
         page_size=page_size,
     )
+    return cond, page
+
+
+@app.route("/api/order-list", methods=["POST"])
+def api_order_list():
+    body = request.get_json() or {}
+    # 优先用请求里的 token（headers）和 userId（body），没有则用 session
+    token = request.headers.get("token") or session.get("token")
+    user_id = body.get("userId") or session.get("user_id") or session.get("userId")
+    if not token:
+        return jsonify({"success": False, "message": "请先登录（缺少 token，需放在请求头）"}), 401
+    if not user_id:
+        return jsonify({"success": False, "message": "请先登录（缺少 userId，需放在请求体）"}), 401
+    cond, page = _order_list_condition(body)
     try:
-        api = HaihuishouAPI()
-        api.set_token(token, user_id)
-        tool = GrabOrderTool(api=api)
+        api = _api_for(token, user_id)
+        tool = GrabOrderTool(api=api, history=history)
         result = tool.step4_order_list(cond, page_index=page, user_id=user_id)
         # 出参：data.pageCount 为列表总数，data.result.orderList 为订单列表
-        if isinstance(result, list):
-            result = {"results": result, "totalCount": len(result)}
-        elif isinstance(result, dict):
-            lst = None
-            res_obj = result.get("result")
-            if isinstance(res_obj, dict):
-                lst = res_obj.get("orderList")
-            if lst is None:
-                lst = (
-                    result.get("list")
-                    or result.get("orderList")
-                    or result.get("results")
-                    or result.get("records")
-                    or result.get("rows")
-                    or result.get("items")
-                )
-            if lst is None and isinstance(result.get("data"), list):
-                lst = result["data"]
-            if lst is None and isinstance(result.get("data"), dict):
-                inner = result["data"]
-                lst = inner.get("result", {}).get("orderList") if isinstance(inner.get("result"), dict) else None
-                lst = lst or inner.get("list") or inner.get("orderList") or inner.get("results") or []
-            if not isinstance(lst, list):
-                lst = []
-            total = result.get("pageCount") or result.get("totalCount")
-            if total is None:
-                total = len(lst)
-            result = {"results": lst, "totalCount": total}
+        rows, total = ORDER_LIST.parse(result)
+        result = {"results": rows, "totalCount": total}
         return jsonify({"success": True, "data": result})
     except Exception as e:
         return jsonify({"success": False, "message": str(e)}), 200
 
 
+@app.route("/api/order-stream", methods=["GET"])
+def api_order_stream():
+    """
+    实时订单列表（Server-Sent Events）。查询参数 q 为与 /api/order-list 相同的 JSON 条件。
+    首个事件 snapshot 为全量 {"orders", "total"}，之后只推 diff {"added", "changed", "removed"（recordId）, "total"}，
+    出错时推 feed-error {"message"}（不用 error，以免与浏览器 EventSource 自身的 error 事件混淆）。同一账号同一条件的所有页面共用一个服务端轮询。
+    连接数达到上限（HAIHUISHOU_UI_STREAMS）时只推一条 feed-error 就关闭，浏览器 10 秒后重连；
+    每个连接最长保持 FEED_MAX_AGE 秒，到时关闭由浏览器重连，不会一直占着线程。
+    """
+    token = session.get("token")
+    user_id = session.get("user_id") or session.get("userId")
+    if not token or not user_id:
+        return jsonify({"success": False, "message": "请先登录"}), 401
+    try:
+        body = json.loads(request.args.get("q") or "{}")
+        cond, page = _order_list_condition(body if isinstance(body, dict) else {})
+    except (TypeError, ValueError, AttributeError):
+        return jsonify({"success": False, "message": "查询条件格式错误"}), 400
+    headers = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    if not _stream_slots.acquire(blocking=False):
+        busy = json.dumps({"message": "实时推送连接数已满，稍后自动重试"}, ensure_ascii=False)
+        return Response("retry: 10000\n\nevent: feed-error\ndata: %s\n\n" % busy, mimetype="text/event-stream", headers=headers)
+    try:
+        sub = order_feed.subscribe(token, user_id, cond, page)
+    except Exception:
+        _stream_slots.release()
+        raise
+
+    def _events():
+        expires = time.monotonic() + FEED_MAX_AGE
+        yield "retry: 3000\n\n"
+        while True:
+            left = expires - time.monotonic()
+            if left <= 0:
+                return  # 到最长时长，浏览器会自动重连
+            event = sub.get(timeout=min(FEED_KEEPALIVE, left))
+            if event is None:
+                yield ": keepalive\n\n"  # 注释行，防止代理断开空闲连接
+                continue
+            if event["type"] == "shutdown":
+                return  # 服务正在退出
+            data = json.dumps(event, ensure_ascii=False)
+            yield "event: %s\ndata: %s\n\n" % (event["type"], data)
+
+    def _close() -> None:
+        # 连接结束（含客户端断开、生成器尚未开始）时由 WSGI 服务调用一次
+        sub.close()
+        _stream_slots.release()
+
+    resp = Response(_events(), mimetype="text/event-stream", headers=headers)
+    resp.call_on_close(_close)
+    return resp
+
+
 @app.route("/api/grab-order", methods=["POST"])
 def api_grab_order():
     """先抢单，成功后再允许报价。body: recordId, orderId, userId；header: token。"""
@@ -193,8 +345,7 @@ def api_grab_order():
     if record_id is None or record_id == "" or order_id is None or order_id == "":
         return jsonify({"success": False, "message": "缺少 recordId 或 orderId"}), 400
     try:
-        api = HaihuishouAPI()
-        api.set_token(token, user_id)
+        api = _api_for(token, user_id)
         raw = api.grab_order(record_id=record_id, order_id=order_id, user_id=user_id)
         resp_data = raw.get("data") or {}
         sub_code = resp_data.get("subCode")
@@ -225,8 +376,7 @@ def api_quote():
     if record_id is None or order_id is None or actual_price is None or actual_price == "":
         return jsonify({"success": False, "message": "缺少 recordId / orderId / actualPrice（报价金额必填）"}), 400
     try:
-        api = HaihuishouAPI()
-        api.set_token(token, user_id)
+        api = _api_for(token, user_id)
         tool = GrabOrderTool(api=api)
         res = tool.step5_submit_quotation(
             record_id=int(record_id),
@@ -244,8 +394,9 @@ def api_quote():
 @app.route("/api/execute-task", methods=["POST"])
 def api_execute_task():
     """
-    执行定时任务：按条件查询待报价列表，对每条先抢单再报价（报价金额为任务设置值）。
-    body: taskName, manufacturerNames[], categoryId, brandIds[], minPrice, maxPrice, quoteAmount
+    执行定时任务：按条件查询待报价列表，对每条先抢单再报价（报价金额为任务设置值，或由 quoteRules 按订单计算）。
+    body: taskName, manufacturerNames[], categoryId, brandIds[], minPrice, maxPrice, quoteAmount, quoteRules[]（见 QuotePricer）,
+          drain（抢光模式，拉取全部符合条件的订单并发抢单）, maxGrabs（本次最多抢单数）, workers（并发数）
     """
     data = request.get_json() or {}
     token = request.headers.get("token") or session.get("token")
@@ -263,90 +414,207 @@ def api_execute_task():
         brand_ids = [str(x).strip() for x in brand_ids.split(",") if str(x).strip()]
     min_price = (data.get("minPrice") or "").strip() or None
     max_price = (data.get("maxPrice") or "").strip() or None
-    quote_amount = (data.get("quoteAmount") or "").strip()
-    if not quote_amount:
-        return jsonify({"success": False, "message": "请设置报价金额"}), 400
     try:
-        quote_num = float(quote_amount)
-        if quote_num < 0 or quote_num > 500:
-            return jsonify({"success": False, "message": "自动抢单报价金额须在 0～500 元范围内"}), 400
-    except ValueError:
-        return jsonify({"success": False, "message": "报价金额须为有效数字，且范围 0～500"}), 400
+        pricer = QuotePricer.from_body(data.get("quoteAmount"), data.get("quoteRules"))
+        priority = GrabPriority.from_body(data.get("priority"))
+    except ValueError as e:
+        return jsonify({"success": False, "message": str(e)}), 400
+    try:
+        max_grabs = min(MAX_DRAIN_GRABS, max(1, int(data.get("maxGrabs") or DRAIN_MAX_GRABS)))
+        workers = min(MAX_DRAIN_WORKERS, max(1, int(data.get("workers") or DRAIN_WORKERS)))
+    except (TypeError, ValueError):
+        return jsonify({"success": False, "message": "maxGrabs / workers 须为整数"}), 400
     task_name = (data.get("taskName") or "").strip()
     remark = task_name or "定时任务"
-    category_brands = [{"key": category_id, "value": brand_ids}] if category_id else []
-    cond = GrabCondition(
-        category_brands=category_brands,
-        order_state="10",
+    cond = GrabCondition.for_task(
+        manufacturer_names=manufacturer_names,
+        category_id=category_id,
+        brand_ids=brand_ids,
         min_price=min_price,
         max_price=max_price,
-        sub_order_source_names=manufacturer_names,
-        page_size=1,
     )
+    if not limiter.bucket(user_id).acquire(timeout=2.0):
+        return jsonify({"success": False, "message": "查询过于频繁，请稍后再试"}), 429
     try:
-        api = HaihuishouAPI()
-        api.set_token(token, user_id)
-        tool = GrabOrderTool(api=api)
-        result = tool.step4_order_list(cond, page_index=1, user_id=user_id)
-        lst = None
-        if isinstance(result, dict):
-            res_obj = result.get("result")
-            if isinstance(res_obj, dict):
-                lst = res_obj.get("orderList")
-            if lst is None:
-                lst = (
-                    result.get("list")
-                    or result.get("orderList")
-                    or result.get("results")
-                    or result.get("records")
-                    or result.get("rows")
-                    or result.get("items")
-                )
-            if lst is None and isinstance(result.get("data"), list):
-                lst = result["data"]
-            if lst is None and isinstance(result.get("data"), dict):
-                inner = result["data"]
-                lst = (inner.get("result") or {}).get("orderList") if isinstance(inner.get("result"), dict) else None
-                lst = lst or inner.get("list") or inner.get("orderList") or inner.get("results") or []
-        if not isinstance(lst, list):
-            lst = []
-        grabbed = 0
-        quoted = 0
-        errors = []
-        for o in lst:
-            record_id = o.get("recordId") or o.get("grabOrderId") or o.get("productId") or o.get("id")
-            order_id = o.get("orderId") or o.get("orderNo") or o.get("orderSn")
-            if record_id is None or order_id is None:
-                continue
-            try:
-                raw = api.grab_order(record_id=record_id, order_id=order_id, user_id=user_id)
-                resp_data = raw.get("data") or {}
-                sub_code = resp_data.get("subCode")
-                if sub_code == 200:
-                    errors.append("recordId=%s 抢单失败: %s" % (record_id, (resp_data.get("subMessage") or "已被抢")))
-                    continue
-                if sub_code != 100:
-                    errors.append("recordId=%s 抢单异常 subCode=%s" % (record_id, sub_code))
-                    continue
-                grabbed += 1
-                api.submit_quotation(
-                    record_id=int(record_id),
-                    order_id=int(order_id),
-                    actual_price=quote_amount,
-                    remark=remark,
-                    user_id=user_id,
-                )
-                quoted += 1
-            except Exception as e:
-                errors.append("recordId=%s: %s" % (record_id, str(e)))
-        return jsonify({
-            "success": True,
-            "data": {"grabbed": grabbed, "quoted": quoted, "total": len(lst), "errors": errors[:20]},
-        })
+        tool = _tool_for(token, user_id)
+        summary = tool.execute_task(
+            cond,
+            pricer.default,
+            remark=remark,
+            user_id=user_id,
+            drain=bool(data.get("drain")),
+            max_grabs=max_grabs,
+            workers=workers,
+            task="manual",
+            pricer=pricer,
+            priority=priority,
+            deadline=task_deadline_from_env(),
+        )
+        summary.pop("records", None)
+        METRICS.record_task("manual", summary)
+        if history is not None:
+            history.record_run("manual", user_id, summary=summary)
+        summary["errors"] = summary["errors"][:20]
+        return jsonify({"success": True, "data": summary})
     except Exception as e:
+        METRICS.record_task_failure("manual")
+        if history is not None:
+            history.record_run("manual", user_id, error=str(e))
         return jsonify({"success": False, "message": str(e)}), 200
 
 
+@app.route("/metrics", methods=["GET"])
+def metrics():
+    """Prometheus 文本格式：各上游接口延迟直方图、状态码 / subCode / 超时计数、熔断状态，各任务抢单与报价计数。"""
+    lines = [
+        "# HELP haihuishou_upstream_circuit_open 上游接口是否熔断中（half_open 探测中也记为 1）",
+        "# TYPE haihuishou_upstream_circuit_open gauge",
+    ]
+    for name, b in BREAKERS.snapshot().items():
+        lines.append('haihuishou_upstream_circuit_open{endpoint="%s"} %d' % (name, b["state"] != "closed"))
+    body = METRICS.render_prometheus() + "\n".join(lines) + "\n"
+    return Response(body, mimetype="text/plain; version=0.0.4; charset=utf-8")
+
+
+@app.route("/api/metrics", methods=["GET"])
+def api_metrics():
+    """同 /metrics 的 JSON 形式（含估算的 p50/p95/p99 与抢单成功率），供命令行 stats 使用。"""
+    data = METRICS.snapshot()
+    data["feeds"] = order_feed.stats()
+    data["breakers"] = BREAKERS.snapshot()
+    return jsonify({"success": True, "data": data})
+
+
+def _int_arg(name: str, default: int, upper: int) -> int:
+    try:
+        return min(upper, max(1, int(request.args.get(name) or default)))
+    except (TypeError, ValueError):
+        return default
+
+
+@app.route("/api/history", methods=["GET"])
+def api_history():
+    """历史统计：最近 days 天（默认 7）每天的订单数与抢单结果、按品牌的订单数与价格区间。"""
+    if history is None:
+        return jsonify({"success": False, "message": "未开启历史记录（HAIHUISHOU_HISTORY=0）"}), 404
+    days = _int_arg("days", 7, 366)
+    data = {"daily": history.daily_summary(days), "brands": history.brand_summary(days), "store": history.stats()}
+    return jsonify({"success": True, "data": data})
+
+
+@app.route("/api/history/orders", methods=["GET"])
+def api_history_orders():
+    """按品牌（brand）和 / 或日期（day=YYYY-MM-DD）查见过的订单。"""
+    if history is None:
+        return jsonify({"success": False, "message": "未开启历史记录（HAIHUISHOU_HISTORY=0）"}), 404
+    rows = history.orders(brand=request.args.get("brand"), day=request.args.get("day"), limit=_int_arg("limit", 200, 5000))
+    return jsonify({"success": True, "data": rows})
+
+
+@app.route("/api/history/attempts", methods=["GET"])
+def api_history_attempts():
+    """按订单（recordId）或任务（task，定时任务 id / manual / multi）查抢单与报价记录。"""
+    if history is None:
+        return jsonify({"success": False, "message": "未开启历史记录（HAIHUISHOU_HISTORY=0）"}), 404
+    rows = history.attempts(
+        record_id=request.args.get("recordId"), task=request.args.get("task"), limit=_int_arg("limit", 200, 5000)
+    )
+    return jsonify({"success": True, "data": rows})
+
+
+# ------------------------- 服务端定时任务 -------------------------
+
+
+def _scheduler_for_request():
+    """返回 (scheduler, user_id)；未登录时返回错误响应。"""
+    token, user_id = _request_auth()
+    if not token or not user_id:
+        return None, (jsonify({"success": False, "message": "请先登录"}), 401)
+    sched = get_scheduler()
+    sched.set_token(user_id, token)
+    return sched, user_id
+
+
+@app.route("/api/tasks", methods=["GET"])
+def api_tasks_list():
+    sched, uid = _scheduler_for_request()
+    if sched is None:
+        return uid
+    return jsonify({"success": True, "data": sched.list_tasks(uid), "rate": sched.account_rate(uid)})
+
+
+@app.route("/api/tasks", methods=["POST"])
+def api_tasks_create():
+    """新建定时任务。body: name, manufacturerNames[], categoryId, brandIds[], minPrice, maxPrice, quoteAmount, frequency"""
+    sched, uid = _scheduler_for_request()
+    if sched is None:
+        return uid
+    try:
+        task = sched.create(uid, request.get_json() or {})
+        return jsonify({"success": True, "data": task.to_json()})
+    except ValueError as e:
+        return jsonify({"success": False, "message": str(e)}), 400
+
+
+@app.route("/api/tasks/<int:task_id>", methods=["PUT"])
+def api_tasks_update(task_id: int):
+    sched, uid = _scheduler_for_request()
+    if sched is None:
+        return uid
+    try:
+        task = sched.update(task_id, uid, request.get_json() or {})
+        return jsonify({"success": True, "data": task.to_json()})
+    except KeyError:
+        return jsonify({"success": False, "message": "任务不存在"}), 404
+    except ValueError as e:
+        return jsonify({"success": False, "message": str(e)}), 400
+
+
+@app.route("/api/tasks/<int:task_id>", methods=["DELETE"])
+def api_tasks_delete(task_id: int):
+    sched, uid = _scheduler_for_request()
+    if sched is None:
+        return uid
+    try:
+        sched.delete(task_id, uid)
+        return jsonify({"success": True})
+    except KeyError:
+        return jsonify({"success": False, "message": "任务不存在"}), 404
+
+
+@app.route("/api/tasks/<int:task_id>/<action>", methods=["POST"])
+def api_tasks_action(task_id: int, action: str):
+    """开始 / 停止自动执行：POST /api/tasks/<id>/start、/api/tasks/<id>/stop"""
+    sched, uid = _scheduler_for_request()
+    if sched is None:
+        return uid
+    if action not in ("start", "stop"):
+        return jsonify({"success": False, "message": "未知操作"}), 404
+    try:
+        task = sched.start(task_id, uid) if action == "start" else sched.stop(task_id, uid)
+        return jsonify({"success": True, "data": task.to_json()})
+    except KeyError:
+        return jsonify({"success": False, "message": "任务不存在"}), 404
+    except Exception as e:
+        return jsonify({"success": False, "message": str(e)}), 200
+
+
+@app.route("/api/tasks/start-all", methods=["POST"])
+def api_tasks_start_all():
+    sched, uid = _scheduler_for_request()
+    if sched is None:
+        return uid
+    return jsonify({"success": True, "data": {"count": sched.start_all(uid)}})
+
+
+@app.route("/api/tasks/stop-all", methods=["POST"])
+def api_tasks_stop_all():
+    sched, uid = _scheduler_for_request()
+    if sched is None:
+        return uid
+    return jsonify({"success": True, "data": {"count": sched.stop_all(uid)}})
+
+
 @app.route("/api/update-quote", methods=["POST"])
 def api_update_quote():
     """已报价列表的修改报价，调用 hsdupdatequotation。body: recordId, orderId, actualPrice, remark, userId。"""
@@ -364,8 +632,7 @@ def api_update_quote():
     if record_id is None or order_id is None or actual_price is None or actual_price == "":
         return jsonify({"success": False, "message": "缺少 recordId / orderId / actualPrice（报价金额必填）"}), 400
     try:
-        api = HaihuishouAPI()
-        api.set_token(token, user_id)
+        api = _api_for(token, user_id)
         res = api.update_quotation(
             record_id=record_id,
             order_id=order_id,
@@ -378,19 +645,45 @@ def api_update_quote():
         return jsonify({"success": False, "message": str(e)}), 200
 
 
+def run_production(host: str, port: int, threads: Optional[int] = None, open_browser: bool = False) -> None:
+    """生产模式启动（线程池 WSGI 服务，见 server.py）：退出时先停定时任务、等进行中的请求结束，再写完历史记录。"""
+    from .server import serve
+
+    def _ready(server: Any) -> None:
+        start_background_services()
+        if open_browser:
+            import webbrowser
+
+            def _open_browser():
+                time.sleep(1.2)
+                url_host = "127.0.0.1" if host == "0.0.0.0" else host
+                webbrowser.open(f"http://{url_host}:{server.port}")
+
+            threading.Thread(target=_open_browser, daemon=True).start()
+
+    serve(
+        app,
+        host=host,
+        port=port,
+        threads=threads,
+        before_drain=stop_background_services,
+        after_drain=close_resources,
+        on_ready=_ready,
+    )
+
+
 def main():
+    """默认以生产模式启动并打开浏览器；HAIHUISHOU_DEBUG=1 时用 Flask 开发服务（调试器 + 自动重载）。"""
     host = os.environ.get("HAIHUISHOU_UI_HOST", "127.0.0.1")
     port = int(os.environ.get("HAIHUISHOU_UI_PORT", "5050"))
-    debug = not getattr(sys, "frozen", False)
+    debug = os.environ.get("HAIHUISHOU_DEBUG", "").strip().lower() in ("1", "true", "yes")
     if not debug:
-        import webbrowser
-        import threading
-        def _open_browser():
-            import time
-            time.sleep(1.2)
-            webbrowser.open(f"http://{host}:{port}")
-        threading.Thread(target=_open_browser, daemon=True).start()
-    app.run(host=host, port=port, debug=debug)
+        run_production(host, port, open_browser=True)
+        return
+    # 调试模式下 reloader 的父进程只负责监视文件，任务线程只在实际服务的子进程里启动
+    if os.environ.get("WERKZEUG_RUN_MAIN") == "true":
+        start_background_services()
+    app.run(host=host, port=port, debug=True)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,324 @@
+# -*- coding: utf-8 -*-
+"""
+嗨回收 API 的 asyncio 版本：接口、入参与业务报错与 HaihuishouAPI 一致，
+一个事件循环里可同时挂起上百个请求（多个任务、多个账号共用）。
+与同步版的区别：不缓存凭据、token 失效时不自动重新登录（抛 RuntimeError，由调用方重新 login），
+也不经过熔断器。
+依赖 aiohttp（可选依赖：pip install aiohttp）。
+"""
+
+import asyncio
+import json
+from typing import Any, Dict, List, Optional
+
+try:
+    import aiohttp
+except ImportError:  # 可选依赖，未安装时仅在实例化时报错
+    aiohttp = None
+
+from .api import HAIHUISHOU_API, HSD_API, WAP_API, _BASE_HEADERS, _endpoint_name, _ssl_verify, md5_password
+from .resilience import TimeoutBudgets, UpstreamTimeoutError
+
+
+class AsyncHaihuishouAPI:
+    """
+    嗨回收异步 API 客户端。需在事件循环中使用：
+        async with AsyncHaihuishouAPI() as api:
+            await api.login(name, pwd)
+    pool_size 为连接池总连接数上限（即同时在途请求数上限）。
+    每个接口的连接 / 读取超时同同步版（budgets，默认 TimeoutBudgets.from_env(timeout)），超时抛 UpstreamTimeoutError。
+    """
+
+    def __init__(
+        self,
+        base_hsd: str = HSD_API,
+        base_main: str = HAIHUISHOU_API,
+        base_wap: str = WAP_API,
+        timeout: int = 15,
+        verify: Optional[bool] = None,
+        pool_size: int = 200,
+        session: Optional["aiohttp.ClientSession"] = None,
+        budgets: Optional[TimeoutBudgets] = None,
+    ):
+        if aiohttp is None:
+            raise RuntimeError("异步客户端需要 aiohttp，请先执行 pip install aiohttp")
+        self.base_hsd = base_hsd.rstrip("/")
+        self.base_main = base_main.rstrip("/")
+        self.base_wap = base_wap.rstrip("/")
+        self.timeout = timeout
+        self.budgets = budgets or TimeoutBudgets.from_env(timeout)
+        self.verify = verify if verify is not None else _ssl_verify()
+        self.pool_size = pool_size
+        self._token: Optional[str] = None
+        self._user_id: Optional[str] = None
+        # 传入 session 时多个客户端（多个账号）共用同一个连接池
+        self._session = session
+        self._owns_session = session is None
+
+    def _headers(self, with_token: bool = False) -> Dict[str, str]:
+        h = dict(_BASE_HEADERS)
+        if with_token and self._token:
+            h["token"] = self._token
+        return h
+
+    def _get_session(self) -> "aiohttp.ClientSession":
+        if self._session is None:
+            self._session = new_session(self.pool_size, self.verify)
+        return self._session
+
+    async def _post(self, url: str, payload: Any, with_token: bool = False) -> str:
+        """
+        发出请求并返回响应文本；HTTP 错误状态抛 aiohttp.ClientResponseError（对应同步版 raise_for_status），
+        连接 / 读取超时抛 UpstreamTimeoutError。
+        """
+        endpoint = _endpoint_name(url)
+        connect, read = self.budgets.timeout(endpoint)
+        session = self._get_session()
+        try:
+            async with session.post(
+                url,
+                json=payload,
+                headers=self._headers(with_token),
+                timeout=aiohttp.ClientTimeout(sock_connect=connect, sock_read=read),
+            ) as r:
+                r.raise_for_status()
+                return await r.text()
+        except asyncio.TimeoutError as e:
+            # aiohttp 3.10 起连接超时单独为 ConnectionTimeoutError，更早的版本统一按读取超时报
+            if isinstance(e, getattr(aiohttp, "ConnectionTimeoutError", ())):
+                raise UpstreamTimeoutError(endpoint, "connect", connect) from e
+            raise UpstreamTimeoutError(endpoint, "read", read) from e
+
+    def set_token(self, token: str, user_id: Optional[str] = None) -> None:
+        self._token = token
+        if user_id is not None:
+            self._user_id = user_id
+
+    @property
+    def token(self) -> Optional[str]:
+        return self._token
+
+    @property
+    def user_id(self) -> Optional[str]:
+        return self._user_id
+
+    async def close(self) -> None:
+        if self._owns_session and self._session is not None:
+            await self._session.close()
+            self._session = None
+
+    async def __aenter__(self) -> "AsyncHaihuishouAPI":
+        return self
+
+    async def __aexit__(self, *exc: Any) -> None:
+        await self.close()
+
+    # ------------------------- 1. 登录 -------------------------
+
+    async def login(
+        self,
+        login_name: str,
+        login_pwd: str,
+        client: str = "001001002",
+        login_type: int = 1,
+        device_name: str = "",
+    ) -> Dict[str, Any]:
+        """登录获取 token 和用户信息。login_pwd 可为明文或 32 位小写 MD5。"""
+        pwd = login_pwd if len(login_pwd) == 32 and all(c in "0123456789abcdef" for c in login_pwd) else md5_password(login_pwd)
+        url = f"{self.base_hsd}/api/login/checklogin"
+        payload = {
+            "client": client,
+            "deviceName": device_name,
+            "loginName": login_name,
+            "loginPwd": pwd,
+            "loginType": login_type,
+        }
+        data = json.loads(await self._post(url, payload, with_token=False))
+        if data.get("code") != 1 or not data.get("success"):
+            raise RuntimeError(data.get("message", "登录失败"))
+        info = data.get("data", {})
+        self._token = info.get("token")
+        self._user_id = info.get("userId")
+        return info
+
+    async def query_user_info(self, user_id: Optional[str] = None) -> Dict[str, Any]:
+        """获取用户信息（queryuserinfo），需要 token。"""
+        uid = user_id or self._user_id
+        if not uid:
+            raise ValueError("查询用户信息需要 userId，请先登录")
+        if not self._token:
+            raise ValueError("查询用户信息需要 token，请先登录")
+        url = f"{self.base_hsd}/api/user/queryuserinfo"
+        data = json.loads(await self._post(url, {"userId": uid}, with_token=True))
+        if data.get("code") != 1 or not data.get("success"):
+            raise RuntimeError(data.get("message", "获取用户信息失败"))
+        return data.get("data", {})
+
+    # ------------------------- 2. 厂商与分类 -------------------------
+
+    async def get_manufacturer_list(self) -> List[Dict[str, str]]:
+        """获取厂商列表。"""
+        url = f"{self.base_hsd}/api/syscategory/getmanufacturerdata"
+        data = json.loads(await self._post(url, {}, with_token=False))
+        if data.get("code") != 1:
+            raise RuntimeError(data.get("message", "获取厂商列表失败"))
+        return data.get("data", {}).get("manufacturerList", [])
+
+    async def get_sys_category(self) -> List[Dict[str, Any]]:
+        """获取电子产品类型（如手机、平板、笔记本）。"""
+        url = f"{self.base_hsd}/api/syscategory/getsyscategory"
+        data = json.loads(await self._post(url, {}, with_token=False))
+        if data.get("code") != 1:
+            raise RuntimeError(data.get("message", "获取分类失败"))
+        return data.get("data", {}).get("catList", [])
+
+    async def get_sys_brand(self, cat_id: int) -> List[Dict[str, str]]:
+        """根据电子产品类型（catId）查询该类型下的品牌。"""
+        url = f"{self.base_hsd}/api/syscategory/getsysbrand"
+        data = json.loads(await self._post(url, {"catId": cat_id}, with_token=False))
+        if data.get("code") != 1:
+            raise RuntimeError(data.get("message", "获取品牌列表失败"))
+        return data.get("data", {}).get("brandList", [])
+
+    # ------------------------- 4. 抢单列表（需要 token） -------------------------
+
+    async def get_hsd_order_list(
+        self,
+        page_index: int = 1,
+        page_size: int = 100,
+        order_state: str = "10",
+        category_brands: Optional[List[Dict[str, Any]]] = None,
+        min_price: Optional[str] = None,
+        max_price: Optional[str] = None,
+        sub_order_source_names: Optional[List[str]] = None,
+        user_id: Optional[str] = None,
+    ) -> Dict[str, Any]:
+        """查询订单列表（gethsdorderlist），入参与出参同 HaihuishouAPI.get_hsd_order_list。"""
+        uid = user_id or self._user_id
+        if not uid:
+            raise ValueError("查询订单列表需要 userId，请先登录")
+        if not self._token:
+            raise ValueError("查询订单列表需要 token（请求头），请先登录")
+        url = f"{self.base_hsd}/api/orderquery/gethsdorderlist"
+        payload = {
+            "pageIndex": page_index,
+            "pageSize": page_size,
+            "orderState": order_state,
+            "categoryBrands": category_brands or [],
+            "subOrderSourceNames": sub_order_source_names or [],
+            "userId": uid,
+        }
+        if min_price is not None:
+            payload["minPrice"] = min_price
+        if max_price is not None:
+            payload["maxPrice"] = max_price
+        text = await self._post(url, payload, with_token=True)
+        try:
+            data = json.loads(text) if text.strip() else {}
+        except ValueError:
+            raise RuntimeError("订单列表接口返回非 JSON，请确认已登录且 token 有效")
+        if data.get("code") is not None and data.get("code") != 1:
+            raise RuntimeError(data.get("message", "查询订单列表失败"))
+        inner = data.get("data", data)
+        if isinstance(inner, dict) and "list" not in inner:
+            for key in ("list", "results", "records", "orderList"):
+                if key in data and data[key] is not None:
+                    inner = {**inner, "list": data[key]}
+                    break
+        return inner
+
+    async def grab_order_query(self, **body: Any) -> Dict[str, Any]:
+        """抢单查询接口（wap 域），需要 token。"""
+        url = f"{self.base_wap}/api/miniProgram/hd/order/grabOrderQuery"
+        return json.loads(await self._post(url, body or {}, with_token=True))
+
+    # ------------------------- 4.5 抢单（需要 token，成功后再报价） -------------------------
+
+    async def grab_order(
+        self,
+        record_id: Any,
+        order_id: Any,
+        user_id: Optional[str] = None,
+    ) -> Dict[str, Any]:
+        """抢单（hsdgraborder）。出参成功 subCode=100，失败 subCode=200。"""
+        uid = user_id or self._user_id
+        if not uid:
+            raise ValueError("抢单需要 userId，请先登录或传入 user_id")
+        if not self._token:
+            raise ValueError("抢单需要 token，请先登录")
+        url = f"{self.base_hsd}/api/orderoper/hsdgraborder"
+        payload = {
+            "recordId": int(record_id),
+            "orderId": int(order_id),
+            "userId": uid,
+        }
+        text = await self._post(url, payload, with_token=True)
+        return json.loads(text) if text.strip() else {}
+
+    # ------------------------- 5. 报价提交（需要 token） -------------------------
+
+    async def submit_quotation(
+        self,
+        record_id: int,
+        order_id: int,
+        actual_price: str,
+        quote_result: int = 1,
+        remark: str = "",
+        user_id: Optional[str] = None,
+    ) -> Dict[str, Any]:
+        """提交报价（hsdquotation），需要 token。"""
+        url = f"{self.base_hsd}/api/orderoper/hsdquotation"
+        uid = user_id or self._user_id
+        if not uid:
+            raise ValueError("报价需要 userId，请先登录或传入 user_id")
+        payload = {
+            "recordId": record_id,
+            "orderId": order_id,
+            "quoteResult": quote_result,
+            "actualPrice": str(actual_price),
+            "remark": remark,
+            "userId": uid,
+        }
+        data = json.loads(await self._post(url, payload, with_token=True))
+        if data.get("code") != 1:
+            raise RuntimeError(data.get("message", data.get("data", {}).get("subMessage", "报价失败")))
+        return data.get("data", {})
+
+    async def update_quotation(
+        self,
+        record_id: Any,
+        order_id: Any,
+        actual_price: str,
+        remark: str = "",
+        user_id: Optional[str] = None,
+    ) -> Dict[str, Any]:
+        """修改报价（hsdupdatequotation），成功 subCode=100。"""
+        uid = user_id or self._user_id
+        if not uid:
+            raise ValueError("修改报价需要 userId，请先登录或传入 user_id")
+        if not self._token:
+            raise ValueError("修改报价需要 token，请先登录")
+        url = f"{self.base_hsd}/api/orderoper/hsdupdatequotation"
+        payload = {
+            "actualPrice": str(actual_price),
+            "remark": remark,
+            "orderId": int(order_id),
+            "recordId": int(record_id),
+            "userId": uid,
+        }
+        text = await self._post(url, payload, with_token=True)
+        data = json.loads(text) if text.strip() else {}
+        resp_data = data.get("data") or {}
+        if data.get("code") != 1 or resp_data.get("subCode") != 100:
+            raise RuntimeError(resp_data.get("subMessage", data.get("message", "修改报价失败")))
+        return resp_data
+
+
+def new_session(pool_size: int = 200, verify: Optional[bool] = None) -> "aiohttp.ClientSession":
+    """创建共享连接池的 aiohttp 会话，可传给多个 AsyncHaihuishouAPI（多账号共用）。需在事件循环内调用。"""
+    if aiohttp is None:
+        raise RuntimeError("异步客户端需要 aiohttp，请先执行 pip install aiohttp")
+    verify = verify if verify is not None else _ssl_verify()
+    connector = aiohttp.TCPConnector(limit=pool_size, limit_per_host=pool_size, ssl=None if verify else False)
+    return aiohttp.ClientSession(connector=connector)
+
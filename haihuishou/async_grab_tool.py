@@ -0,0 +1,204 @@
+# -*- coding: utf-8 -*-
+"""
+异步抢单流程：与 GrabOrderTool 步骤一致，抢单与报价在同一事件循环里并发执行。
+多个任务、多个账号可各自创建 AsyncGrabOrderTool，用 asyncio.gather 放在同一个循环里跑。
+"""
+
+import asyncio
+import time
+from typing import Any, Dict, List, Optional
+
+from .async_api import AsyncHaihuishouAPI
+from .grab_tool import GrabCondition, QuotePricer
+from .orders import ORDER_LIST
+
+
+class AsyncGrabOrderTool:
+    """异步抢单流程封装。max_concurrency 为本工具同时在途的抢单/报价请求上限。"""
+
+    def __init__(self, api: Optional[AsyncHaihuishouAPI] = None, max_concurrency: int = 50):
+        self.api = api or AsyncHaihuishouAPI()
+        self.max_concurrency = max(1, max_concurrency)
+        # 信号量在事件循环内首次使用时创建（Python 3.8/3.9 的 Semaphore 会绑定创建时的循环）
+        self._sem: Optional[asyncio.Semaphore] = None
+
+    async def step1_login(self, login_name: str, login_pwd: str, **kwargs: Any) -> Dict[str, Any]:
+        """1. 登录，拿到用户信息与 token。"""
+        return await self.api.login(login_name, login_pwd, **kwargs)
+
+    async def step2_manufacturer_and_categories(self) -> Dict[str, Any]:
+        """2. 并发获取厂商列表、电子产品类型。"""
+        manufacturer_list, cat_list = await asyncio.gather(
+            self.api.get_manufacturer_list(), self.api.get_sys_category()
+        )
+        return {
+            "manufacturerList": manufacturer_list,
+            "catList": cat_list,
+        }
+
+    async def step3_brands_by_category(self, cat_id: int) -> List[Dict[str, str]]:
+        """3. 根据电子产品类型查询品牌。"""
+        return await self.api.get_sys_brand(cat_id)
+
+    async def step4_order_list(
+        self,
+        condition: GrabCondition,
+        page_index: int = 1,
+        user_id: Optional[str] = None,
+    ) -> Dict[str, Any]:
+        """4. 按抢单条件查询订单列表。"""
+        if not self.api.token:
+            raise RuntimeError("请先登录，列表查询需要 token（请求头）")
+        uid = user_id or self.api.user_id
+        if not uid:
+            raise RuntimeError("请先登录，列表查询需要 userId（请求体）")
+        return await self.api.get_hsd_order_list(
+            page_index=page_index,
+            page_size=condition.page_size,
+            order_state=condition.order_state,
+            category_brands=condition.category_brands or None,
+            min_price=condition.min_price,
+            max_price=condition.max_price,
+            sub_order_source_names=condition.sub_order_source_names or None,
+            user_id=uid,
+        )
+
+    async def step5_submit_quotation(
+        self,
+        record_id: int,
+        order_id: int,
+        actual_price: str,
+        quote_result: int = 1,
+        remark: str = "",
+        user_id: Optional[str] = None,
+    ) -> Dict[str, Any]:
+        """5. 报价提交。"""
+        if not self.api.token:
+            raise RuntimeError("请先登录，报价需要 token")
+        uid = user_id or self.api.user_id
+        if not uid:
+            raise RuntimeError("请先登录，报价需要 userId")
+        return await self.api.submit_quotation(
+            record_id=record_id,
+            order_id=order_id,
+            actual_price=actual_price,
+            quote_result=quote_result,
+            remark=remark,
+            user_id=uid,
+        )
+
+    async def grab_and_quote(
+        self,
+        record_id: Any,
+        order_id: Any,
+        actual_price: str,
+        remark: str = "",
+        user_id: Optional[str] = None,
+    ) -> Dict[str, Any]:
+        """
+        抢单成功（subCode=100）后立即报价。
+        返回 {"recordId", "orderId", "grabbed", "quoted", "subCode", "error"}。
+        """
+        out: Dict[str, Any] = {
+            "recordId": record_id,
+            "orderId": order_id,
+            "grabbed": False,
+            "quoted": False,
+            "subCode": None,
+            "error": None,
+        }
+        if self._sem is None:
+            self._sem = asyncio.Semaphore(self.max_concurrency)
+        async with self._sem:
+            try:
+                raw = await self.api.grab_order(record_id=record_id, order_id=order_id, user_id=user_id)
+                resp_data = raw.get("data") or {}
+                sub_code = resp_data.get("subCode")
+                out["subCode"] = sub_code
+                if sub_code == 200:
+                    out["error"] = "recordId=%s 抢单失败: %s" % (record_id, (resp_data.get("subMessage") or "已被抢"))
+                    return out
+                if sub_code != 100:
+                    out["error"] = "recordId=%s 抢单异常 subCode=%s" % (record_id, sub_code)
+                    return out
+                out["grabbed"] = True
+                await self.api.submit_quotation(
+                    record_id=int(record_id),
+                    order_id=int(order_id),
+                    actual_price=actual_price,
+                    remark=remark,
+                    user_id=user_id,
+                )
+                out["quoted"] = True
+            except Exception as e:
+                out["error"] = "recordId=%s: %s" % (record_id, str(e))
+        return out
+
+    async def execute_task(
+        self,
+        condition: GrabCondition,
+        quote_amount: Optional[str],
+        remark: str = "",
+        user_id: Optional[str] = None,
+        pricer: Optional[QuotePricer] = None,
+    ) -> Dict[str, Any]:
+        """
+        定时任务执行一次（同 GrabOrderTool.execute_task），列表中的订单并发抢单并报价。
+        pricer 为报价规则，判定不抢的订单计入 unpriced。返回 {"grabbed", "quoted", "total", "unpriced", "errors"}。
+        """
+        uid = user_id or self.api.user_id
+        if pricer is None:
+            pricer = QuotePricer(default=quote_amount)
+        result = await self.step4_order_list(condition, page_index=1, user_id=uid)
+        lst = ORDER_LIST.rows(result)
+        jobs = []
+        unpriced = 0
+        for rec in ORDER_LIST.records(lst, keep_raw=False):
+            amount = pricer.price(rec)
+            if amount is None:
+                unpriced += 1
+                continue
+            jobs.append(self.grab_and_quote(rec.record_id, rec.order_id, amount, remark=remark, user_id=uid))
+        results = await asyncio.gather(*jobs)
+        return {
+            "grabbed": sum(1 for r in results if r["grabbed"]),
+            "quoted": sum(1 for r in results if r["quoted"]),
+            "total": len(lst),
+            "unpriced": unpriced,
+            "errors": [r["error"] for r in results if r["error"]],
+        }
+
+    async def run_task(
+        self,
+        condition: GrabCondition,
+        quote_amount: Optional[str],
+        frequency: float = 1.0,
+        remark: str = "",
+        stop: Optional[asyncio.Event] = None,
+        max_runs: Optional[int] = None,
+        pricer: Optional[QuotePricer] = None,
+    ) -> Dict[str, int]:
+        """
+        按 frequency（秒/次）循环执行 execute_task，直到 stop 被设置或执行满 max_runs 次。
+        单轮出错不会中断循环。返回累计 {"runs", "grabbed", "quoted"}。
+        """
+        stop = stop or asyncio.Event()
+        if pricer is None:
+            pricer = QuotePricer(default=quote_amount)
+        totals = {"runs": 0, "grabbed": 0, "quoted": 0}
+        while not stop.is_set():
+            started = time.monotonic()
+            try:
+                summary = await self.execute_task(condition, quote_amount, remark=remark, pricer=pricer)
+                totals["grabbed"] += summary["grabbed"]
+                totals["quoted"] += summary["quoted"]
+            except Exception:
+                pass
+            totals["runs"] += 1
+            if max_runs is not None and totals["runs"] >= max_runs:
+                break
+            try:
+                await asyncio.wait_for(stop.wait(), max(0.0, frequency - (time.monotonic() - started)))
+            except asyncio.TimeoutError:
+                pass
+        return totals
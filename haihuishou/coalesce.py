@@ -0,0 +1,114 @@
+# -*- coding: utf-8 -*-
+"""
+相同查询合并（single-flight）：同一个 key 的调用在进行中时，后来者不再发请求，等第一个调用的结果；
+可选亚秒级微缓存（ttl），结果在 ttl 秒内直接复用。抢单等延迟敏感的路径传 fresh=True 跳过微缓存，
+但仍会合并正在进行的同一查询——它比新发一个请求更早返回。
+订单列表用法见 GrabOrderTool.step4_order_list，每个客户端一个（同一账号的定时任务、页面共用）。
+等待者按自己的截止时间（resilience.time_limit）等待，不会因为发起者的请求更慢而被拖住。
+"""
+
+import os
+import threading
+import time
+from typing import TYPE_CHECKING, Any, Callable, Dict, Optional, Tuple
+
+from .resilience import UpstreamTimeoutError, remaining
+
+if TYPE_CHECKING:
+    from .metrics import MetricsRegistry
+
+# 微缓存条目超过该数量时清理过期条目
+_CACHE_PRUNE_SIZE = 64
+
+
+def list_cache_ttl_from_env() -> float:
+    """订单列表微缓存时长（秒），HAIHUISHOU_LIST_CACHE_MS 指定毫秒数，默认 0（只合并进行中的相同查询）。"""
+    try:
+        return max(0.0, float(os.environ.get("HAIHUISHOU_LIST_CACHE_MS", "0") or 0) / 1000)
+    except ValueError:
+        return 0.0
+
+
+class _Call:
+    __slots__ = ("done", "result", "error")
+
+    def __init__(self) -> None:
+        self.done = threading.Event()
+        self.result: Any = None
+        self.error: Optional[BaseException] = None
+
+
+class SingleFlight:
+    """
+    按 key 合并并发调用。do(key, fn) 返回 fn() 的结果；fn 抛错时同批等待者都收到该异常，错误不缓存。
+    返回值由多个调用方共用，调用方不应修改。传入 metrics 与 name 时合并、命中缓存的次数记入指标。
+    合并到进行中调用的等待者最多等到自己线程的截止时间，到时抛 UpstreamTimeoutError（phase 为 deadline）。
+    """
+
+    def __init__(self, ttl: float = 0.0, name: Optional[str] = None, metrics: Optional["MetricsRegistry"] = None):
+        self.ttl = max(0.0, ttl)
+        self.name = name
+        self.metrics = metrics
+        self.calls = 0
+        self.shared = 0
+        self.cache_hits = 0
+        self._inflight: Dict[Any, _Call] = {}
+        # key -> (完成时间, 结果)
+        self._cache: Dict[Any, Tuple[float, Any]] = {}
+        self._lock = threading.Lock()
+
+    def do(self, key: Any, fn: Callable[[], Any], fresh: bool = False) -> Any:
+        with self._lock:
+            if not fresh and self.ttl > 0:
+                entry = self._cache.get(key)
+                if entry is not None and time.monotonic() - entry[0] < self.ttl:
+                    self.cache_hits += 1
+                    self._observe("cache")
+                    return entry[1]
+            call = self._inflight.get(key)
+            leader = call is None
+            if leader:
+                call = self._inflight[key] = _Call()
+                self.calls += 1
+            else:
+                self.shared += 1
+                self._observe("inflight")
+        if not leader:
+            left = remaining()
+            if not call.done.wait(None if left is None else max(0.0, left)):
+                raise UpstreamTimeoutError(self.name or "coalesced", "deadline")
+            if call.error is not None:
+                raise call.error
+            return call.result
+        try:
+            call.result = fn()
+            return call.result
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                self._inflight.pop(key, None)
+                if call.error is None and self.ttl > 0:
+                    now = time.monotonic()
+                    if len(self._cache) >= _CACHE_PRUNE_SIZE:
+                        for k in [k for k, (t, _) in self._cache.items() if now - t >= self.ttl]:
+                            del self._cache[k]
+                    self._cache[key] = (now, call.result)
+            call.done.set()
+
+    def invalidate(self, key: Any = None) -> None:
+        """清除某个 key（默认全部）的微缓存。"""
+        with self._lock:
+            if key is None:
+                self._cache.clear()
+            else:
+                self._cache.pop(key, None)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {"calls": self.calls, "shared": self.shared, "cacheHits": self.cache_hits, "ttl": self.ttl}
+
+    def _observe(self, kind: str) -> None:
+        if self.metrics is not None and self.name:
+            self.metrics.observe_coalesced(self.name, kind)
@@ -0,0 +1,193 @@
+# -*- coding: utf-8 -*-
+"""
+登录凭据缓存：按登录手机号保存 token 与 userId，命令行多次执行、Web UI 重启后可直接复用 token。
+默认不保存密码：接口登录直接用密码 MD5，存下 MD5 等于存下明文密码，而文件权限 0600 在 Windows 上不起作用。
+只保存加盐的校验值（pwdCheck），用来确认再次登录时输入的密码与缓存的 token 属于同一次登录。
+设置 HAIHUISHOU_SAVE_PASSWORD=1（或 CredentialCache(save_password=True)）时才保存 MD5，
+token 失效后 HaihuishouAPI 可用它自动重新登录（Web UI 重启后恢复的定时任务依赖这一点）。
+"""
+
+import hashlib
+
+import json
+import os
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional
+
+from .api import data_dir
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None  # type: ignore[assignment]
+    import msvcrt
+
+
+@contextmanager
+def _file_lock(path: str) -> Iterator[None]:
+    """跨进程互斥（锁文件 path + ".lock"），保证读取—合并—写回之间不被其他进程插入。"""
+    fd = os.open(path + ".lock", os.O_RDWR | os.O_CREAT, 0o600)
+    try:
+        if fcntl is not None:
+            fcntl.flock(fd, fcntl.LOCK_EX)
+        else:
+            while True:
+                try:
+                    msvcrt.locking(fd, msvcrt.LK_LOCK, 1)
+                    break
+                except OSError:
+                    continue  # LK_LOCK 重试约 10 秒后仍拿不到锁会抛错，继续等
+        yield
+    finally:
+        os.close(fd)  # 关闭即释放锁
+
+
+def _pwd_check(pwd: str, salt: Optional[str] = None) -> str:
+    """密码 MD5 的加盐校验值 "salt:sha256"，不能反推出 MD5、也不能用来登录。"""
+    salt = salt if salt is not None else os.urandom(8).hex()
+    return "%s:%s" % (salt, hashlib.sha256((salt + pwd).encode("utf-8")).hexdigest())
+
+
+class CredentialCache:
+    """
+    凭据缓存（JSON 文件，多进程共用）：
+        {"accounts": {"登录手机号": {"userId", "token", "pwdCheck", "pwd"（仅 save_password）, "client", "loginType",
+                                     "deviceName", "info", "savedAt"}}}
+    每次读取前检查文件修改时间，其他进程写入的新 token 会被读到；写入时只改本账号，其余以文件当前内容为准。
+    save_password 默认取环境变量 HAIHUISHOU_SAVE_PASSWORD。
+    """
+
+    def __init__(self, path: Optional[str] = None, save_password: Optional[bool] = None):
+        self.path = path if path is not None else os.path.join(data_dir(), "credentials.json")
+        if save_password is None:
+            save_password = os.environ.get("HAIHUISHOU_SAVE_PASSWORD", "").strip().lower() in ("1", "true", "yes")
+        self.save_password = save_password
+        self._accounts: Dict[str, Dict[str, Any]] = {}
+        self._mtime: Optional[float] = None
+        self._lock = threading.Lock()
+
+    def _reload(self) -> None:
+        """文件有变化时重新加载。调用方需持有 _lock。"""
+        try:
+            mtime = os.path.getmtime(self.path)
+        except OSError:
+            return
+        if mtime == self._mtime:
+            return
+        try:
+            self._accounts = self._read()
+            self._mtime = mtime
+        except (OSError, ValueError):
+            pass
+
+    def _read(self) -> Dict[str, Dict[str, Any]]:
+        with open(self.path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        return dict(data.get("accounts") or {})
+
+    def _update(self, login_name: str, entry: Optional[Dict[str, Any]]) -> None:
+        """
+        以文件当前内容为准改一个账号（entry 为 None 时删除）后写回，不覆盖其他进程刚写入的账号。
+        调用方需持有 _lock。文件无法读取时以内存中的内容为准；写入失败抛 OSError。
+        """
+        with _file_lock(self.path):
+            try:
+                accounts = self._read()
+            except (OSError, ValueError):
+                accounts = dict(self._accounts)
+            if entry is None:
+                accounts.pop(str(login_name), None)
+            else:
+                accounts[str(login_name)] = entry
+            self._accounts = accounts
+            self._save()
+
+    def _save(self) -> None:
+        """写同目录下的临时文件后替换。临时文件由 mkstemp 以 0600 创建、名字各进程不同。调用方需持有 _lock。"""
+        fd, tmp = tempfile.mkstemp(prefix=".credentials-", suffix=".tmp", dir=os.path.dirname(self.path) or ".")
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                json.dump({"accounts": self._accounts}, f, ensure_ascii=False, indent=2)
+            os.replace(tmp, self.path)
+        except BaseException:
+            try:
+                os.unlink(tmp)
+            except OSError:
+                pass
+            raise
+        self._mtime = os.path.getmtime(self.path)
+
+    def get(self, login_name: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            self._reload()
+            entry = self._accounts.get(str(login_name))
+            return dict(entry) if entry else None
+
+    def names(self) -> List[str]:
+        """缓存中的登录手机号。"""
+        with self._lock:
+            self._reload()
+            return list(self._accounts)
+
+    def lookup(self, login_name: str, pwd: str) -> Optional[Dict[str, Any]]:
+        """密码（MD5）与缓存时登录用的一致时返回该账号的条目，否则 None。"""
+        entry = self.get(login_name)
+        if not entry:
+            return None
+        check = entry.get("pwdCheck")
+        if check and ":" in check:
+            salt = check.split(":", 1)[0]
+            return entry if _pwd_check(pwd, salt) == check else None
+        return entry if entry.get("pwd") == pwd else None
+
+    def find_user(self, user_id: Any) -> Optional[Dict[str, Any]]:
+        """按 userId 查找，返回的条目带 loginName。"""
+        with self._lock:
+            self._reload()
+            for name, entry in self._accounts.items():
+                if str(entry.get("userId")) == str(user_id):
+                    return dict(entry, loginName=name)
+            return None
+
+    def put(
+        self,
+        login_name: str,
+        pwd: str,
+        info: Dict[str, Any],
+        client: str = "001001002",
+        login_type: int = 1,
+        device_name: str = "",
+    ) -> None:
+        """登录成功后保存。pwd 为 32 位小写 MD5，只有 save_password 时才写入文件。写入失败抛 OSError。"""
+        entry = {
+            "userId": info.get("userId"),
+            "token": info.get("token"),
+            "pwdCheck": _pwd_check(pwd),
+            "client": client,
+            "loginType": login_type,
+            "deviceName": device_name,
+            "info": info,
+            "savedAt": time.time(),
+        }
+        if self.save_password:
+            entry["pwd"] = pwd
+        with self._lock:
+            self._update(login_name, entry)
+
+    def invalidate(self, login_name: str, token: Optional[str] = None) -> None:
+        """清除 token（保留凭据）；传入 token 时仅当缓存中仍是该 token 才清除。"""
+        with self._lock:
+            self._reload()
+            entry = self._accounts.get(str(login_name))
+            if entry is None or (token is not None and entry.get("token") != token):
+                return
+            self._update(login_name, dict(entry, token=None))
+
+    def remove(self, login_name: str) -> None:
+        with self._lock:
+            self._reload()
+            if str(login_name) in self._accounts:
+                self._update(login_name, None)
@@ -3,10 +3,353 @@
 抢单工具：登录 → 获取分类/品牌 → 设置抢单条件 → 查询订单列表 → 报价提交。
 """
 
-from dataclasses import dataclass, field
-from typing import Any, Dict, List, Optional
+import heapq
+import itertools
+import json
+import math
+import os
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from dataclasses import dataclass, field, replace
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
 
 from .api import HaihuishouAPI, md5_password
+from .history import HistoryStore
+from .orders import ORDER_LIST, OrderRecord, SeenOrderIndex
+from .pacing import AccountLimiter
+from .refdata import ReferenceDataCache
+from .resilience import critical, current_deadline, expired, remaining, time_limit, use_deadline
+
+# 自动抢单报价金额上限（元），与页面限制一致
+MAX_AUTO_QUOTE = 500
+# 抢光模式：每页拉取条数、最多翻页数、默认每轮最多抢单数与并发数
+DRAIN_PAGE_SIZE = 50
+DRAIN_MAX_PAGES = 10
+DRAIN_MAX_GRABS = 20
+DRAIN_WORKERS = 8
+# 每页条数达到该值时订单列表边下载边解析（首单不必等整页）
+STREAM_PAGE_SIZE = 50
+# iter_orders 同时在途的翻页请求数
+PAGE_WINDOW = 4
+# quote_many 默认并发数
+QUOTE_WORKERS = 8
+
+
+def check_quote_amount(quote_amount: Any) -> str:
+    """校验自动报价金额（0～500 元），返回去掉空白的字符串，不合法时抛 ValueError。"""
+    text = str(quote_amount if quote_amount is not None else "").strip()
+    if not text:
+        raise ValueError("请设置报价金额")
+    try:
+        num = float(text)
+    except ValueError:
+        raise ValueError("报价金额须为有效数字，且范围 0～%d" % MAX_AUTO_QUOTE)
+    if num < 0 or num > MAX_AUTO_QUOTE:
+        raise ValueError("自动抢单报价金额须在 0～%d 元范围内" % MAX_AUTO_QUOTE)
+    return text
+
+
+def _rule_set(rule: Dict[str, Any], *keys: str) -> Optional[frozenset]:
+    for key in keys:
+        value = rule.get(key)
+        if value is None:
+            continue
+        if isinstance(value, (str, int)):
+            value = str(value).split(",")
+        items = frozenset(str(x).strip() for x in value if str(x).strip())
+        return items or None
+    return None
+
+
+def _rule_number(rule: Dict[str, Any], key: str, n: int) -> Optional[float]:
+    value = rule.get(key)
+    if value is None or value == "":
+        return None
+    try:
+        num = float(value)
+    except (TypeError, ValueError):
+        raise ValueError("第 %d 条报价规则的 %s 须为数字" % (n, key))
+    if num < 0 or math.isnan(num):
+        raise ValueError("第 %d 条报价规则的 %s 不能小于 0" % (n, key))
+    return num
+
+
+# 报价规则的动作
+_RULE_SKIP = 0
+_RULE_FIXED = 1
+_RULE_PERCENT = 2
+# 按 (分类, 品牌, 厂商) 缓存候选规则的组合数上限
+_PRICER_CACHE_SIZE = 4096
+
+
+class _Rule:
+    __slots__ = (
+        "categories",
+        "brands",
+        "manufacturers",
+        "min_estimate",
+        "max_estimate",
+        "kind",
+        "value",
+        "text",
+        "low",
+        "high",
+    )
+
+    def __init__(self, rule: Dict[str, Any], n: int):
+        if not isinstance(rule, dict):
+            raise ValueError("第 %d 条报价规则须为对象" % n)
+        self.categories = _rule_set(rule, "categories", "categoryIds", "categoryId")
+        self.brands = _rule_set(rule, "brands", "brandNames")
+        self.manufacturers = _rule_set(rule, "manufacturers", "manufacturerNames")
+        self.min_estimate = _rule_number(rule, "minEstimate", n)
+        self.max_estimate = _rule_number(rule, "maxEstimate", n)
+        amount = rule.get("amount")
+        percent = _rule_number(rule, "percent", n)
+        if sum((bool(rule.get("skip")), amount not in (None, ""), percent is not None)) != 1:
+            raise ValueError("第 %d 条报价规则须且只能设置 amount、percent、skip 之一" % n)
+        low = _rule_number(rule, "min", n)
+        high = _rule_number(rule, "max", n)
+        if high is not None and high > MAX_AUTO_QUOTE:
+            raise ValueError("第 %d 条报价规则的 max 不能超过 %d" % (n, MAX_AUTO_QUOTE))
+        if low is not None and high is not None and low > high:
+            raise ValueError("第 %d 条报价规则的 min 不能大于 max" % n)
+        self.low = low if low is not None else 0.0
+        self.high = high if high is not None else float(MAX_AUTO_QUOTE)
+        self.text = ""
+        if rule.get("skip"):
+            self.kind, self.value = _RULE_SKIP, 0.0
+        elif percent is not None:
+            self.kind, self.value = _RULE_PERCENT, percent / 100
+        else:
+            try:
+                self.text = check_quote_amount(amount)
+            except ValueError as e:
+                raise ValueError("第 %d 条报价规则: %s" % (n, e))
+            self.kind, self.value = _RULE_FIXED, float(self.text)
+
+    def matches(self, category: str, brand: str, manufacturer: str) -> bool:
+        return (
+            (self.categories is None or category in self.categories)
+            and (self.brands is None or brand in self.brands)
+            and (self.manufacturers is None or manufacturer in self.manufacturers)
+        )
+
+
+class QuotePricer:
+    """
+    自动报价规则：按订单的分类（catId）、品牌名、厂商名与预估金额逐条匹配 rules，第一条命中的规则决定报价；
+    都不命中时报 default（None 表示不抢）。规则为页面 / 任务 JSON 里的对象：
+        {"categories": ["100001"], "brands": ["苹果"], "manufacturers": ["华为"], "minEstimate": 100, "maxEstimate": 3000,
+         "amount": 30}                      # 固定金额
+        {"percent": 2.5, "min": 5, "max": 80}   # 预估金额的百分比，夹在 [min, max] 内（预估金额未知时跳过该规则）
+        {"brands": ["其他"], "skip": true}      # 不抢
+    条件字段省略表示不限。规则在构造时校验并编译一次，(分类, 品牌, 厂商) 对应的候选规则缓存复用，
+    每条订单只比较预估金额区间。
+    固定金额原样报价，按百分比算出的金额向下取整到元；无论规则如何，报价都在 0～MAX_AUTO_QUOTE 元内，
+    且报价达到预估金额 1.5 倍的订单不抢（与页面提示一致）。
+    """
+
+    # 报价达到预估金额的该倍数时不抢
+    ESTIMATE_GUARD = 1.5
+
+    def __init__(self, rules: Optional[Iterable[Dict[str, Any]]] = None, default: Any = None):
+        self.rules = list(rules or [])
+        self._rules = [_Rule(r, i + 1) for i, r in enumerate(self.rules)]
+        text = str(default).strip() if default is not None else ""
+        self.default = check_quote_amount(text) if text else None
+        self._default_value = float(self.default) if self.default is not None else None
+        self._candidates: Dict[Tuple[str, str, str], Tuple[_Rule, ...]] = {}
+
+    @classmethod
+    def from_body(cls, quote_amount: Any, rules: Any = None) -> "QuotePricer":
+        """由页面 / 任务入参（quoteAmount、quoteRules）构造；有规则时 quoteAmount 可为空（不命中的订单不抢）。"""
+        if rules is not None and not isinstance(rules, list):
+            raise ValueError("quoteRules 须为数组")
+        if not rules:
+            return cls(default=check_quote_amount(quote_amount))
+        return cls(rules, default=quote_amount)
+
+    def _rules_for(self, rec: OrderRecord) -> Tuple[_Rule, ...]:
+        key = (rec.category, rec.brand, rec.manufacturer)
+        found = self._candidates.get(key)
+        if found is None:
+            found = tuple(r for r in self._rules if r.matches(*key))
+            if len(self._candidates) >= _PRICER_CACHE_SIZE:
+                self._candidates.clear()
+            self._candidates[key] = found
+        return found
+
+    def price(self, rec: OrderRecord) -> Optional[str]:
+        """该订单的报价金额（字符串），不抢时返回 None。"""
+        estimate = rec.price
+        text, amount = self.default, self._default_value
+        for rule in self._rules_for(rec) if self._rules else ():
+            if rule.min_estimate is not None and (estimate is None or estimate < rule.min_estimate):
+                continue
+            if rule.max_estimate is not None and (estimate is None or estimate > rule.max_estimate):
+                continue
+            if rule.kind == _RULE_SKIP:
+                return None
+            if rule.kind == _RULE_FIXED:
+                text, amount = rule.text, rule.value
+            elif estimate is None:
+                continue
+            else:
+                amount = math.floor(min(max(estimate * rule.value, rule.low), rule.high, MAX_AUTO_QUOTE))
+                text = str(amount)
+            break
+        if amount is None:
+            return None
+        if estimate is not None and estimate > 0 and amount >= estimate * self.ESTIMATE_GUARD:
+            return None
+        return text
+
+    def price_many(self, records: Iterable[OrderRecord]) -> List[Optional[str]]:
+        """整页订单批量定价，顺序与 records 一致。"""
+        price = self.price
+        return [price(rec) for rec in records]
+
+
+def _env_weight(name: str, default: float) -> float:
+    try:
+        return float(os.environ.get(name, "") or default)
+    except ValueError:
+        return default
+
+
+@dataclass
+class GrabPriority:
+    """
+    待抢订单的优先级：score = value_weight × 预期利润（预估金额 − 报价，元） − urgency_weight × 剩余秒数，分高的先抢。
+    默认每元利润与每秒倒计时等价；剩余不足 min_remaining 秒的订单来不及抢单再报价，不发请求直接丢弃。
+    没有倒计时的订单按剩余 no_countdown 秒计分，且不会过期。
+    """
+
+    value_weight: float = 1.0
+    urgency_weight: float = 1.0
+    min_remaining: float = 0.5
+    no_countdown: float = 600.0
+
+    @classmethod
+    def from_env(cls) -> "GrabPriority":
+        """HAIHUISHOU_GRAB_VALUE_WEIGHT、HAIHUISHOU_GRAB_URGENCY_WEIGHT 指定两个权重（默认 1）。"""
+        return cls(
+            value_weight=_env_weight("HAIHUISHOU_GRAB_VALUE_WEIGHT", 1.0),
+            urgency_weight=_env_weight("HAIHUISHOU_GRAB_URGENCY_WEIGHT", 1.0),
+        )
+
+    @classmethod
+    def from_body(cls, body: Any) -> "GrabPriority":
+        """页面入参 {"valueWeight", "urgencyWeight", "minRemaining"}，省略的字段取环境变量或默认值。"""
+        base = cls.from_env()
+        if not body:
+            return base
+        if not isinstance(body, dict):
+            raise ValueError("priority 须为对象")
+        try:
+            return cls(
+                value_weight=float(body.get("valueWeight", base.value_weight)),
+                urgency_weight=float(body.get("urgencyWeight", base.urgency_weight)),
+                min_remaining=max(0.0, float(body.get("minRemaining", base.min_remaining))),
+            )
+        except (TypeError, ValueError):
+            raise ValueError("priority 的 valueWeight / urgencyWeight / minRemaining 须为数字")
+
+
+class GrabCandidate:
+    """队列中的一条待抢订单。deadline 为倒计时结束的时刻（time.monotonic），payload 由调用方使用。"""
+
+    __slots__ = ("record", "amount", "deadline", "payload")
+
+    def __init__(self, record: OrderRecord, amount: str, deadline: Optional[float], payload: Any = None):
+        self.record = record
+        self.amount = amount
+        self.deadline = deadline
+        self.payload = payload
+
+
+class GrabQueue:
+    """
+    按优先级出队的待抢订单（线程安全）：生产者按页 push_many，抢单线程 pop 得到当前分最高的订单，
+    出队时跳过已过期（剩余不足 min_remaining 秒）的订单并计入 expired。close() 后取空即返回 None。
+    分数里的倒计时项按截止时刻计算，先后入队的订单可以直接比较。on_expired(candidate) 在丢弃过期订单时调用（持有队列锁）。
+    """
+
+    def __init__(
+        self,
+        priority: Optional[GrabPriority] = None,
+        clock: Callable[[], float] = time.monotonic,
+        on_expired: Optional[Callable[[GrabCandidate], None]] = None,
+    ):
+        self.priority = priority or GrabPriority.from_env()
+        self.clock = clock
+        self.on_expired = on_expired
+        self.expired = 0
+        self._heap: List[Tuple[float, int, GrabCandidate]] = []
+        self._seq = itertools.count()
+        self._closed = False
+        self._cond = threading.Condition()
+
+    def _entry(self, rec: OrderRecord, amount: str, payload: Any, now: float) -> Tuple[float, int, GrabCandidate]:
+        p = self.priority
+        countdown = rec.countdown
+        deadline = now + countdown if countdown is not None and countdown > 0 else None
+        try:
+            margin = (rec.price or 0.0) - float(amount)
+        except ValueError:
+            margin = 0.0
+        due = deadline if deadline is not None else now + p.no_countdown
+        score = p.value_weight * margin - p.urgency_weight * due
+        return (-score, next(self._seq), GrabCandidate(rec, amount, deadline, payload))
+
+    def push_many(self, items: Iterable[Tuple[OrderRecord, str, Any]]) -> int:
+        """批量入队 (订单, 报价金额, payload)，整批入队后才唤醒抢单线程，同一页内总是先抢分最高的。返回入队条数。"""
+        now = self.clock()
+        entries = [self._entry(rec, amount, payload, now) for rec, amount, payload in items]
+        if not entries:
+            return 0
+        with self._cond:
+            for entry in entries:
+                heapq.heappush(self._heap, entry)
+            self._cond.notify(len(entries))
+        return len(entries)
+
+    def push(self, rec: OrderRecord, amount: str, payload: Any = None) -> None:
+        self.push_many([(rec, amount, payload)])
+
+    def pop(self, timeout: Optional[float] = None) -> Optional[GrabCandidate]:
+        """取出分最高且未过期的订单；队列空时等待，已 close 或等待超时返回 None。"""
+        deadline = None if timeout is None else self.clock() + timeout
+        with self._cond:
+            while True:
+                now = self.clock()
+                limit = now + self.priority.min_remaining
+                while self._heap:
+                    cand = heapq.heappop(self._heap)[2]
+                    if cand.deadline is not None and cand.deadline <= limit:
+                        self.expired += 1
+                        if self.on_expired is not None:
+                            self.on_expired(cand)
+                        continue
+                    return cand
+                if self._closed:
+                    return None
+                remaining = None if deadline is None else deadline - now
+                if remaining is not None and remaining <= 0:
+                    return None
+                self._cond.wait(remaining)
+
+    def close(self) -> None:
+        """不再入队；队列取空后 pop 返回 None。"""
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+
+    def __len__(self) -> int:
+        with self._cond:
+            return len(self._heap)
 
 
 @dataclass
@@ -25,12 +368,82 @@ class GrabCondition:
     # 每页条数
     page_size: int = 20
 
+    @classmethod
+    def for_task(
+        cls,
+        manufacturer_names: Optional[List[str]] = None,
+        category_id: str = "",
+        brand_ids: Optional[List[str]] = None,
+        min_price: Optional[str] = None,
+        max_price: Optional[str] = None,
+        page_size: int = 1,
+    ) -> "GrabCondition":
+        """定时任务的抢单条件：只查未被下单的订单（orderState=10）。"""
+        category_brands = [{"key": category_id, "value": list(brand_ids or [])}] if category_id else []
+        return cls(
+            category_brands=category_brands,
+            order_state="10",
+            min_price=min_price or None,
+            max_price=max_price or None,
+            sub_order_source_names=list(manufacturer_names or []),
+            page_size=page_size,
+        )
+
+
+def _price_key(value: Optional[str]) -> Optional[str]:
+    if value is None:
+        return None
+    text = str(value).strip()
+    try:
+        return repr(float(text))
+    except ValueError:
+        return text
+
+
+def order_list_key(condition: GrabCondition, page_index: int, user_id: Any) -> str:
+    """
+    订单列表查询的合并 key：账号、页码与规范化后的条件（品牌、厂商顺序无关，价格 "100" 与 "100.0" 视为相同）。
+    """
+    brands = sorted(
+        (str(cb.get("key")), sorted(str(v) for v in (cb.get("value") or []))) for cb in condition.category_brands or []
+    )
+    return json.dumps(
+        [
+            str(user_id),
+            page_index,
+            condition.page_size,
+            str(condition.order_state),
+            brands,
+            _price_key(condition.min_price),
+            _price_key(condition.max_price),
+            sorted(str(x) for x in condition.sub_order_source_names or []),
+        ],
+        ensure_ascii=False,
+    )
+
 
 class GrabOrderTool:
-    """抢单流程封装。"""
+    """
+    抢单流程封装。传入 refdata 时厂商 / 分类 / 品牌从缓存读取；
+    传入 seen 时 execute_task 跳过已被抢 / 已抢到的订单（同一账号的多个工具应共用同一个索引）。
+    传入 history 时查到的订单与每次抢单 / 报价结果写入历史记录（后台线程批量落盘，不阻塞抢单）。
+    传入 limiter（AccountLimiter）时翻页拉取的第 2 页起每页从该账号的令牌桶取一个令牌
+    （第 1 页由调用方在每轮开始时取，见 scheduler），抢光模式一轮多页查询同样计入账号限速。
+    """
 
-    def __init__(self, api: Optional[HaihuishouAPI] = None):
+    def __init__(
+        self,
+        api: Optional[HaihuishouAPI] = None,
+        refdata: Optional[ReferenceDataCache] = None,
+        seen: Optional[SeenOrderIndex] = None,
+        history: Optional[HistoryStore] = None,
+        limiter: Optional[AccountLimiter] = None,
+    ):
         self.api = api or HaihuishouAPI()
+        self.refdata = refdata
+        self.seen = seen
+        self.history = history
+        self.limiter = limiter
 
     def step1_login(self, login_name: str, login_pwd: str, **kwargs: Any) -> Dict[str, Any]:
         """1. 登录，拿到用户信息与 token。"""
@@ -39,8 +452,12 @@ class GrabOrderTool:
 
     def step2_manufacturer_and_categories(self) -> Dict[str, Any]:
         """2. 获取厂商列表、电子产品类型。"""
-        manufacturer_list = self.api.get_manufacturer_list()
-        cat_list = self.api.get_sys_category()
+        if self.refdata is not None:
+            manufacturer_list = self.refdata.manufacturers()
+            cat_list = self.refdata.categories()
+        else:
+            manufacturer_list = self.api.get_manufacturer_list()
+            cat_list = self.api.get_sys_category()
         return {
             "manufacturerList": manufacturer_list,
             "catList": cat_list,
@@ -48,6 +465,8 @@ class GrabOrderTool:
 
     def step3_brands_by_category(self, cat_id: int) -> List[Dict[str, str]]:
         """3. 根据电子产品类型查询品牌。"""
+        if self.refdata is not None:
+            return self.refdata.brands(cat_id)
         return self.api.get_sys_brand(cat_id)
 
     def step4_order_list(
@@ -55,15 +474,56 @@ class GrabOrderTool:
         condition: GrabCondition,
         page_index: int = 1,
         user_id: Optional[str] = None,
+        fresh: bool = False,
         **kwargs: Any,
     ) -> Dict[str, Any]:
-        """4. 按抢单条件查询订单列表（gethsdorderlist，需 headers 的 token + body 的 userId）。"""
+        """
+        4. 按抢单条件查询订单列表（gethsdorderlist，需 headers 的 token + body 的 userId）。
+        同一客户端上条件相同的并发查询只发一次请求（api.order_lists），开启微缓存时 ttl 内直接复用结果；
+        抢单路径传 fresh=True 跳过微缓存（仍合并进行中的相同查询）。返回值可能被多个调用方共用，不要修改。
+        """
+        if not self.api.token:
+            raise RuntimeError("请先登录，列表查询需要 token（请求头）")
+        uid = user_id or self.api.user_id
+        if not uid:
+            raise RuntimeError("请先登录，列表查询需要 userId（请求体）")
+
+        def _fetch() -> Dict[str, Any]:
+            result = self.api.get_hsd_order_list(
+                page_index=page_index,
+                page_size=condition.page_size,
+                order_state=condition.order_state,
+                category_brands=condition.category_brands or None,
+                min_price=condition.min_price,
+                max_price=condition.max_price,
+                sub_order_source_names=condition.sub_order_source_names or None,
+                user_id=uid,
+            )
+            if self.history is not None:
+                self.history.record_orders(ORDER_LIST.rows(result), uid)
+            return result
+
+        return self.api.order_lists.do(order_list_key(condition, page_index, uid), _fetch, fresh=fresh)
+
+    def step4_order_rows(
+        self,
+        condition: GrabCondition,
+        page_index: int = 1,
+        user_id: Optional[str] = None,
+        fresh: bool = False,
+    ) -> Iterable[Dict[str, Any]]:
+        """
+        4. 同 step4_order_list，直接返回订单行。page_size >= STREAM_PAGE_SIZE 时返回流式结果
+        （迭代时逐条解析，不参与合并），否则整页解析后返回列表。
+        """
+        if condition.page_size < STREAM_PAGE_SIZE:
+            return ORDER_LIST.rows(self.step4_order_list(condition, page_index=page_index, user_id=user_id, fresh=fresh))
         if not self.api.token:
             raise RuntimeError("请先登录，列表查询需要 token（请求头）")
         uid = user_id or self.api.user_id
         if not uid:
             raise RuntimeError("请先登录，列表查询需要 userId（请求体）")
-        return self.api.get_hsd_order_list(
+        stream = self.api.stream_hsd_order_list(
             page_index=page_index,
             page_size=condition.page_size,
             order_state=condition.order_state,
@@ -73,6 +533,119 @@ class GrabOrderTool:
             sub_order_source_names=condition.sub_order_source_names or None,
             user_id=uid,
         )
+        if self.history is None:
+            return stream
+        return self._record_stream(stream, uid)
+
+    def _record_stream(self, rows: Iterable[Dict[str, Any]], user_id: Any) -> Iterator[Dict[str, Any]]:
+        """流式结果边迭代边收集，迭代结束（或提前停止）时整批写入历史记录。"""
+        seen: List[Dict[str, Any]] = []
+        try:
+            for row in rows:
+                seen.append(row)
+                yield row
+        finally:
+            self.history.record_orders(seen, user_id)
+
+    def iter_orders(
+        self,
+        condition: GrabCondition,
+        user_id: Optional[str] = None,
+        window: int = PAGE_WINDOW,
+        max_pages: Optional[int] = None,
+        limit: Optional[int] = None,
+        fresh: bool = False,
+    ) -> Iterator[OrderRecord]:
+        """
+        逐条返回符合条件的全部订单（OrderRecord，raw 为原始行），翻页方式见 iter_order_pages。
+        第 1 页的订单立即返回，调用方可以一边抢单一边等后续页。
+        提前停止：迭代满 limit 条后结束，或调用方直接 break（未完成的页请求会被取消）。fresh 同 step4_order_list。
+        """
+        pages = self.iter_order_pages(condition, user_id=user_id, window=window, max_pages=max_pages, fresh=fresh)
+        yielded = 0
+        try:
+            for page in pages:
+                for rec in page:
+                    yield rec
+                    yielded += 1
+                    if limit is not None and yielded >= limit:
+                        return
+        finally:
+            pages.close()
+
+    def iter_order_pages(
+        self,
+        condition: GrabCondition,
+        user_id: Optional[str] = None,
+        window: int = PAGE_WINDOW,
+        max_pages: Optional[int] = None,
+        fresh: bool = False,
+    ) -> Iterator[List[OrderRecord]]:
+        """
+        逐页返回符合条件的全部订单。先查第 1 页并按 pageCount / totalCount 算出总页数，其余页最多 window 个并发预取，
+        按到达顺序返回，跨页按 recordId 去重。调用方停止迭代时未完成的页请求会被取消。
+        预取线程沿用调用方的截止时间（见 resilience.time_limit），截止时间到了不再请求后续页。
+        设置了 limiter 时后续每页先预约令牌，在预取线程里等到令牌可用再发请求；截止时间前等不到令牌则不再翻页。
+        """
+        uid = user_id or self.api.user_id
+        at = current_deadline()
+        rows, total = ORDER_LIST.parse(self.step4_order_list(condition, page_index=1, user_id=uid, fresh=fresh))
+        pages = max(1, math.ceil(total / max(1, condition.page_size)))
+        if max_pages is not None:
+            pages = min(pages, max_pages)
+        seen = set()
+
+        bucket = self.limiter.bucket(uid) if self.limiter is not None else None
+
+        def _fetch(page: int, wait: float) -> List[Dict[str, Any]]:
+            if wait > 0:
+                time.sleep(wait)
+            with use_deadline(at):
+                return ORDER_LIST.rows(self.step4_order_list(condition, page_index=page, user_id=uid, fresh=fresh))
+
+        def _submit() -> bool:
+            """预约令牌并提交下一页；截止时间前等不到令牌时返回 False，不再翻页。"""
+            nonlocal next_page
+            wait = 0.0
+            if bucket is not None:
+                left = remaining()
+                reserved = bucket.reserve(None if left is None else max(0.0, left))
+                if reserved is None:
+                    return False
+                wait = reserved
+            pending[pool.submit(_fetch, next_page, wait)] = next_page
+            next_page += 1
+            return True
+
+        pool = ThreadPoolExecutor(max_workers=max(1, window), thread_name_prefix="haihuishou-page") if pages > 1 else None
+        pending: Dict[Future, int] = {}
+        next_page = 2
+        try:
+            while pool is not None and next_page <= pages and len(pending) < window:
+                if not _submit():
+                    pages = next_page - 1
+                    break
+            while True:
+                batch = []
+                for rec in ORDER_LIST.records(rows):
+                    if rec.record_id in seen:
+                        continue
+                    seen.add(rec.record_id)
+                    batch.append(rec)
+                yield batch
+                if not pending:
+                    return
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                fut = next(iter(done))
+                pending.pop(fut)
+                if next_page <= pages and not expired() and not _submit():
+                    pages = next_page - 1
+                rows = fut.result()
+        finally:
+            if pool is not None:
+                for fut in pending:
+                    fut.cancel()
+                pool.shutdown(wait=False)
 
     def step5_submit_quotation(
         self,
@@ -98,6 +671,78 @@ class GrabOrderTool:
             user_id=uid,
         )
 
+    def quote_one(self, job: Dict[str, Any], user_id: Optional[str] = None) -> Dict[str, Any]:
+        """
+        执行一条报价任务。job 为 {"recordId", "orderId", "actualPrice", "remark", "update", "line"}，
+        update 为真时修改报价（hsdupdatequotation），否则提交报价（hsdquotation）；job 带 error 时直接返回失败。
+        返回 {"line", "recordId", "orderId", "action", "ok", "subCode", "ms", "error"}，不抛异常。
+        """
+        update = bool(job.get("update"))
+        out: Dict[str, Any] = {
+            "line": job.get("line"),
+            "recordId": job.get("recordId"),
+            "orderId": job.get("orderId"),
+            "action": "update" if update else "quote",
+            "ok": False,
+            "subCode": None,
+            "ms": None,
+            "error": job.get("error"),
+        }
+        if out["error"]:
+            return out
+        try:
+            record_id = int(job["recordId"])
+            order_id = int(job["orderId"])
+            price = str(job["actualPrice"]).strip()
+            float(price)
+        except KeyError as e:
+            out["error"] = "报价任务缺少字段 %s" % e
+            return out
+        except (TypeError, ValueError) as e:
+            out["error"] = "报价任务格式错误: %s" % e
+            return out
+        remark = str(job.get("remark") or "")
+        t0 = time.perf_counter()
+        try:
+            if update:
+                res = self.api.update_quotation(record_id, order_id, price, remark=remark, user_id=user_id)
+            else:
+                res = self.step5_submit_quotation(record_id, order_id, price, remark=remark, user_id=user_id)
+            out["subCode"] = res.get("subCode") if isinstance(res, dict) else None
+            out["ok"] = True
+        except Exception as e:
+            out["error"] = str(e)
+        out["ms"] = round((time.perf_counter() - t0) * 1000, 1)
+        if self.history is not None:
+            self.history.record_attempt(out, user_id or self.api.user_id, action=out["action"])
+        return out
+
+    def quote_many(
+        self,
+        jobs: Iterable[Dict[str, Any]],
+        workers: int = QUOTE_WORKERS,
+        user_id: Optional[str] = None,
+    ) -> Iterator[Dict[str, Any]]:
+        """
+        并发执行报价任务（格式同 quote_one），按完成顺序逐条返回结果。
+        jobs 按需读取，同时在途的任务不超过 workers * 2 条，可直接传入逐行读取文件的生成器。
+        """
+        workers = max(1, workers)
+        it = iter(jobs)
+        pending: set = set()
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="haihuishou-quote") as pool:
+            for job in it:
+                pending.add(pool.submit(self.quote_one, job, user_id))
+                if len(pending) < workers * 2:
+                    continue
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for fut in done:
+                    yield fut.result()
+            while pending:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for fut in done:
+                    yield fut.result()
+
     def run_full_flow(
         self,
         login_name: str,
@@ -125,3 +770,218 @@ class GrabOrderTool:
                 )
                 result["quotes"].append({"request": item, "response": quote_res})
         return result
+
+    def warm_up(self) -> None:
+        """预热并保持抢单连接（定时任务每轮调用，空闲一段时间后自动停止）。"""
+        self.api.fire_path().start_keepalive()
+
+    def grab_and_quote(
+        self,
+        record_id: Any,
+        order_id: Any,
+        actual_price: str,
+        remark: str = "",
+        user_id: Optional[str] = None,
+    ) -> Dict[str, Any]:
+        """
+        抢单成功（subCode=100）后立即报价，记录耗时（毫秒，均从发出抢单算起）。
+        默认走客户端的快速通道（预生成报文、直接复用连接池）；指定了其他账号的 user_id 时走普通接口。
+        返回 {"recordId", "orderId", "grabbed", "quoted", "subCode", "grabMs", "quoteMs", "error"}。
+        """
+        if user_id is None or user_id == self.api.user_id:
+            return self.api.fire_path().fire(record_id, order_id, actual_price, remark=remark)
+        out: Dict[str, Any] = {
+            "recordId": record_id,
+            "orderId": order_id,
+            "grabbed": False,
+            "quoted": False,
+            "subCode": None,
+            "grabMs": None,
+            "quoteMs": None,
+            "error": None,
+        }
+        t0 = time.perf_counter()
+        try:
+            raw = self.api.grab_order(record_id=record_id, order_id=order_id, user_id=user_id)
+            t1 = time.perf_counter()
+            out["grabMs"] = round((t1 - t0) * 1000, 1)
+            resp_data = raw.get("data") or {}
+            sub_code = resp_data.get("subCode")
+            out["subCode"] = sub_code
+            if sub_code == 200:
+                out["error"] = "recordId=%s 抢单失败: %s" % (record_id, (resp_data.get("subMessage") or "已被抢"))
+                return out
+            if sub_code != 100:
+                out["error"] = "recordId=%s 抢单异常 subCode=%s" % (record_id, sub_code)
+                return out
+            out["grabbed"] = True
+            with critical():
+                self.api.submit_quotation(
+                    record_id=int(record_id),
+                    order_id=int(order_id),
+                    actual_price=actual_price,
+                    remark=remark,
+                    user_id=user_id,
+                )
+            out["quoteMs"] = round((time.perf_counter() - t0) * 1000, 1)
+            out["quoted"] = True
+        except Exception as e:
+            out["error"] = "recordId=%s: %s" % (record_id, str(e))
+        return out
+
+    def execute_task(
+        self,
+        condition: GrabCondition,
+        quote_amount: Optional[str],
+        remark: str = "",
+        user_id: Optional[str] = None,
+        drain: bool = False,
+        max_grabs: int = DRAIN_MAX_GRABS,
+        workers: int = DRAIN_WORKERS,
+        task: Any = None,
+        pricer: Optional[QuotePricer] = None,
+        priority: Optional[GrabPriority] = None,
+        deadline: Optional[float] = None,
+    ) -> Dict[str, Any]:
+        """
+        定时任务执行一次：按条件查询待抢订单，对每条先抢单（subCode=100 成功）再按 quote_amount 报价。
+        传入 pricer（QuotePricer）时每单的报价由规则决定，quote_amount 不再使用；规则判定不抢的订单
+        （含报价达到预估金额 1.5 倍）不发抢单请求，计入 unpriced。
+        待抢订单先进 GrabQueue，按 priority（默认 GrabPriority.from_env()）的分数从高到低抢：剩余倒计时越短、
+        预期利润（预估金额 − 报价）越高越先抢；倒计时已到的订单不发请求，计入 expired。
+        drain=True（抢光模式）时按 DRAIN_PAGE_SIZE 并发翻页拉取全部符合条件的订单，每页一到就整页入队，
+        workers 个线程每次取队列里分最高的订单「抢单→报价」，本轮最多抢 max_grabs 单。
+        设置了 seen 时先查索引，已被抢 / 已抢到的订单不再发请求（计入 skipped），本轮结果写回索引。
+        设置了 history 时每单的抢单 / 报价结果记入历史记录，task 为记录里的任务标识。
+        deadline 为本轮总时限（秒）：查列表、翻页与抢单共用，到时不再翻页和发起新的抢单（已抢到的单照常报价），
+        队列里剩下的订单留到下一轮。第 1 页失败（含超时）时抛出；之后的页失败（超时、熔断、HTTP 错误等）只停止翻页，
+        已抢的单照常返回，错误记入 errors。
+        返回 {"grabbed", "quoted", "total", "skipped", "unpriced", "expired", "errors", "orders", "records"}，
+        orders 为每单的结果、报价金额（actualPrice）与耗时（grabMs / quoteMs），
+        records 为本轮列表里出现的全部 recordId（含跳过、未定价的单，供自适应间隔判断有无新订单）。
+        """
+        with time_limit(deadline) as at:
+            uid = user_id or self.api.user_id
+            seen_index = self.seen
+            history = self.history
+            if pricer is None:
+                pricer = QuotePricer(default=quote_amount)
+            queue = GrabQueue(priority)
+            counts = {"total": 0, "skipped": 0, "unpriced": 0}
+            listed: List[Any] = []
+
+            def _candidates(records: Iterable[Optional[OrderRecord]]) -> List[Tuple[OrderRecord, str, Any]]:
+                batch = []
+                for rec in records:
+                    counts["total"] += 1
+                    if rec is None:
+                        continue
+                    listed.append(rec.record_id)
+                    if seen_index is not None and seen_index.should_skip(rec.record_id):
+                        counts["skipped"] += 1
+                        continue
+                    amount = pricer.price(rec)
+                    if amount is None:
+                        counts["unpriced"] += 1
+                        continue
+                    batch.append((rec, amount, None))
+                return batch
+
+            def _finish(rec: OrderRecord, amount: str, res: Dict[str, Any]) -> Dict[str, Any]:
+                res["actualPrice"] = amount
+                if seen_index is not None:
+                    seen_index.mark_result(rec, res)
+                if history is not None:
+                    history.record_attempt(res, uid, task)
+                return res
+
+            orders: List[Dict[str, Any]] = []
+            if not drain:
+                rows = self.step4_order_rows(condition, page_index=1, user_id=uid, fresh=True)
+                queue.push_many(_candidates(ORDER_LIST.record(row, keep_raw=False) for row in rows))
+                queue.close()
+                while True:
+                    cand = queue.pop()
+                    if cand is None or expired():
+                        break
+                    rec = cand.record
+                    res = self.grab_and_quote(rec.record_id, rec.order_id, cand.amount, remark=remark, user_id=uid)
+                    orders.append(_finish(rec, cand.amount, res))
+                return _task_summary(
+                    counts["total"], orders, counts["skipped"], counts["unpriced"], queue.expired, records=listed
+                )
+
+            cond = condition if condition.page_size >= DRAIN_PAGE_SIZE else replace(condition, page_size=DRAIN_PAGE_SIZE)
+            lock = threading.Lock()
+            fired = [0]
+            page_errors: List[str] = []
+
+            def _worker() -> None:
+                with use_deadline(at):
+                    _grab_loop()
+
+            def _grab_loop() -> None:
+                while True:
+                    cand = queue.pop()
+                    if cand is None or expired():
+                        return
+                    with lock:
+                        if fired[0] >= max_grabs:
+                            return
+                        fired[0] += 1
+                    rec = cand.record
+                    res = self.grab_and_quote(rec.record_id, rec.order_id, cand.amount, remark, uid)
+                    res = _finish(rec, cand.amount, res)
+                    with lock:
+                        orders.append(res)
+
+            with ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix="haihuishou-grab") as pool:
+                grabbers = [pool.submit(_worker) for _ in range(max(1, workers))]
+                # 第 1 页一到就开始抢，后续页并发预取并入队；抢满 max_grabs 单即停止翻页
+                fetched = False
+                try:
+                    for page in self.iter_order_pages(cond, user_id=uid, max_pages=DRAIN_MAX_PAGES, fresh=True):
+                        fetched = True
+                        queue.push_many(_candidates(page))
+                        with lock:
+                            if fired[0] >= max_grabs or expired():
+                                break
+                except Exception as e:
+                    if not fetched:
+                        raise
+                    page_errors.append("翻页失败，本轮停止翻页: %s" % e)
+                finally:
+                    queue.close()
+                for f in grabbers:
+                    f.result()
+            return _task_summary(
+                counts["total"], orders, counts["skipped"], counts["unpriced"], queue.expired, page_errors, listed
+            )
+
+
+def _task_summary(
+    total: int,
+    orders: List[Dict[str, Any]],
+    skipped: int = 0,
+    unpriced: int = 0,
+    expired: int = 0,
+    errors: Optional[List[str]] = None,
+    records: Optional[List[Any]] = None,
+) -> Dict[str, Any]:
+    """
+    一轮执行的汇总；errors 为不属于某一单的错误（如翻页失败），排在各单错误之前。
+    给了 records（本轮列表里出现的 recordId）时一并返回。
+    """
+    summary = {
+        "grabbed": sum(1 for o in orders if o["grabbed"]),
+        "quoted": sum(1 for o in orders if o["quoted"]),
+        "total": total,
+        "skipped": skipped,
+        "unpriced": unpriced,
+        "expired": expired,
+        "errors": list(errors or []) + [o["error"] for o in orders if o["error"]],
+        "orders": orders,
+    }
+    if records is not None:
+        summary["records"] = records
+    return summary
@@ -0,0 +1,424 @@
+# -*- coding: utf-8 -*-
+"""
+历史记录：用 SQLite 保存见过的每一条订单（首次出现时间、预估价、品牌、厂商）、每一次抢单 / 报价的结果
+（subCode 与耗时）以及每一轮任务执行的汇总。抢单线程只把记录放进内存队列，由后台写线程批量写入，
+不会在磁盘上等待；队列满时丢弃并计数。超过保留天数的记录由写线程定期清理。
+
+    history = HistoryStore()            # ~/.haihuishou/history.db
+    tool = GrabOrderTool(api, history=history)
+    history.daily_summary(days=7)
+"""
+
+import os
+import queue
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from .orders import ORDER_LIST
+
+# 默认保留天数，可用 HAIHUISHOU_HISTORY_DAYS 调整
+DEFAULT_RETENTION_DAYS = 30
+# 写线程最多攒多少条一起提交、最长等待多久（秒）
+WRITE_BATCH = 1000
+FLUSH_INTERVAL = 0.5
+# 队列上限，超过后丢弃新记录（不阻塞抢单）
+QUEUE_LIMIT = 50000
+# 清理过期记录的间隔（秒）
+PRUNE_INTERVAL = 3600.0
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS orders (
+    record_id TEXT PRIMARY KEY,
+    order_id TEXT,
+    user_id TEXT,
+    first_seen REAL NOT NULL,
+    last_seen REAL NOT NULL,
+    day TEXT NOT NULL,
+    price REAL,
+    brand TEXT,
+    manufacturer TEXT,
+    seen_count INTEGER NOT NULL DEFAULT 1
+);
+CREATE INDEX IF NOT EXISTS idx_orders_day_brand ON orders (day, brand);
+CREATE INDEX IF NOT EXISTS idx_orders_brand_day ON orders (brand, day);
+CREATE INDEX IF NOT EXISTS idx_orders_last_seen ON orders (last_seen);
+
+CREATE TABLE IF NOT EXISTS attempts (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    ts REAL NOT NULL,
+    day TEXT NOT NULL,
+    user_id TEXT,
+    task TEXT,
+    action TEXT NOT NULL,
+    record_id TEXT,
+    order_id TEXT,
+    grabbed INTEGER NOT NULL DEFAULT 0,
+    quoted INTEGER NOT NULL DEFAULT 0,
+    sub_code INTEGER,
+    grab_ms REAL,
+    quote_ms REAL,
+    error TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_attempts_day ON attempts (day);
+CREATE INDEX IF NOT EXISTS idx_attempts_record ON attempts (record_id);
+CREATE INDEX IF NOT EXISTS idx_attempts_task_ts ON attempts (task, ts);
+
+CREATE TABLE IF NOT EXISTS runs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    ts REAL NOT NULL,
+    day TEXT NOT NULL,
+    user_id TEXT,
+    task TEXT,
+    total INTEGER,
+    skipped INTEGER,
+    grabbed INTEGER,
+    quoted INTEGER,
+    error TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_runs_task_ts ON runs (task, ts);
+CREATE INDEX IF NOT EXISTS idx_runs_day ON runs (day);
+"""
+
+_UPSERT_ORDER = """
+INSERT INTO orders (record_id, order_id, user_id, first_seen, last_seen, day, price, brand, manufacturer)
+VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+ON CONFLICT (record_id) DO UPDATE SET last_seen = excluded.last_seen, seen_count = seen_count + 1
+"""
+
+_INSERT_ATTEMPT = """
+INSERT INTO attempts (ts, day, user_id, task, action, record_id, order_id, grabbed, quoted, sub_code, grab_ms, quote_ms, error)
+VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+"""
+
+_INSERT_RUN = """
+INSERT INTO runs (ts, day, user_id, task, total, skipped, grabbed, quoted, error) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+"""
+
+
+def _day(ts: float) -> str:
+    return time.strftime("%Y-%m-%d", time.localtime(ts))
+
+
+def _text(value: Any) -> Optional[str]:
+    return None if value is None else str(value)
+
+
+def _retention_days() -> float:
+    try:
+        return max(0.0, float(os.environ.get("HAIHUISHOU_HISTORY_DAYS", DEFAULT_RETENTION_DAYS)))
+    except ValueError:
+        return float(DEFAULT_RETENTION_DAYS)
+
+
+class HistoryStore:
+    """
+    SQLite 历史记录。record_* 方法只入队，立即返回；查询方法各自打开只读连接（WAL 模式，不阻塞写线程）。
+    retention_days 为保留天数，0 表示不清理。close() 写完队列中剩余记录后退出写线程。
+    """
+
+    def __init__(self, path: Optional[str] = None, retention_days: Optional[float] = None):
+        if path is None:
+            from .api import data_dir
+
+            path = os.path.join(data_dir(), "history.db")
+        self.path = path
+        self.retention_days = retention_days if retention_days is not None else _retention_days()
+        self.dropped = 0
+        self.written = 0
+        self._queue: "queue.Queue[Optional[Tuple[str, Any]]]" = queue.Queue(maxsize=QUEUE_LIMIT)
+        self._flushed = threading.Condition()
+        self._pending = 0
+        self._closed = False
+        conn = self._connect()
+        try:
+            conn.executescript(_SCHEMA)
+        finally:
+            conn.close()
+        self._thread = threading.Thread(target=self._writer, name="haihuishou-history", daemon=True)
+        self._thread.start()
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    # ------------------------- 写入（只入队） -------------------------
+
+    def _put(self, kind: str, item: Any) -> None:
+        if self._closed:
+            return
+        with self._flushed:
+            self._pending += 1
+        try:
+            self._queue.put_nowait((kind, item))
+        except queue.Full:
+            self.dropped += 1
+            self._done(1)
+
+    def record_orders(self, rows: Iterable[Dict[str, Any]], user_id: Any = None) -> None:
+        """记录一批订单行（原始行，写线程里再解析）；已记录过的订单只更新最后出现时间。"""
+        rows = rows if isinstance(rows, list) else list(rows)
+        if rows:
+            self._put("orders", (time.time(), _text(user_id), rows))
+
+    def record_attempt(self, result: Dict[str, Any], user_id: Any = None, task: Any = None, action: str = "grab") -> None:
+        """
+        记录一次抢单 / 报价。result 为 grab_and_quote（action=grab）或 quote_one（action=quote / update）的返回值。
+        """
+        self._put("attempt", (time.time(), _text(user_id), _text(task), action, result))
+
+    def record_run(
+        self,
+        task: Any,
+        user_id: Any = None,
+        summary: Optional[Dict[str, Any]] = None,
+        error: Optional[str] = None,
+    ) -> None:
+        """记录一轮任务执行的汇总（execute_task 的返回值），整轮失败时传 error。"""
+        self._put("run", (time.time(), _text(user_id), _text(task), summary, error))
+
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """等到已入队的记录全部写入，返回是否在 timeout 内完成。"""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._flushed:
+            while self._pending > 0:
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self._flushed.wait(remaining)
+        return True
+
+    def close(self, timeout: float = 10.0) -> None:
+        if self._closed:
+            return
+        self._closed = True
+        self._queue.put(None)
+        self._thread.join(timeout)
+
+    def _done(self, n: int) -> None:
+        with self._flushed:
+            self._pending -= n
+            if self._pending <= 0:
+                self._flushed.notify_all()
+
+    # ------------------------- 写线程 -------------------------
+
+    def _writer(self) -> None:
+        conn = self._connect()
+        next_prune = time.monotonic()
+        try:
+            while True:
+                try:
+                    first = self._queue.get(timeout=FLUSH_INTERVAL)
+                except queue.Empty:
+                    first = False
+                batch: List[Tuple[str, Any]] = []
+                stop = first is None
+                if first:
+                    batch.append(first)
+                    while len(batch) < WRITE_BATCH:
+                        try:
+                            item = self._queue.get_nowait()
+                        except queue.Empty:
+                            break
+                        if item is None:
+                            stop = True
+                            break
+                        batch.append(item)
+                if batch:
+                    try:
+                        self._write(conn, batch)
+                        self.written += len(batch)
+                    except sqlite3.Error:
+                        self.dropped += len(batch)
+                    finally:
+                        self._done(len(batch))
+                if self.retention_days > 0 and time.monotonic() >= next_prune:
+                    next_prune = time.monotonic() + PRUNE_INTERVAL
+                    try:
+                        self._prune(conn, time.time() - self.retention_days * 86400)
+                    except sqlite3.Error:
+                        pass
+                if stop:
+                    return
+        finally:
+            conn.close()
+
+    def _write(self, conn: sqlite3.Connection, batch: List[Tuple[str, Any]]) -> None:
+        orders: List[Tuple[Any, ...]] = []
+        attempts: List[Tuple[Any, ...]] = []
+        runs: List[Tuple[Any, ...]] = []
+        for kind, item in batch:
+            if kind == "orders":
+                ts, uid, rows = item
+                day = _day(ts)
+                for rec in ORDER_LIST.records(rows, keep_raw=False):
+                    orders.append(
+                        (str(rec.record_id), _text(rec.order_id), uid, ts, ts, day, rec.price, rec.brand, rec.manufacturer)
+                    )
+            elif kind == "attempt":
+                ts, uid, task, action, r = item
+                grabbed = bool(r.get("grabbed")) if action == "grab" else True
+                quoted = bool(r.get("quoted")) if action == "grab" else bool(r.get("ok"))
+                attempts.append(
+                    (
+                        ts,
+                        _day(ts),
+                        uid,
+                        task,
+                        action,
+                        _text(r.get("recordId")),
+                        _text(r.get("orderId")),
+                        int(grabbed),
+                        int(quoted),
+                        r.get("subCode"),
+                        r.get("grabMs"),
+                        r.get("quoteMs") if action == "grab" else r.get("ms"),
+                        r.get("error"),
+                    )
+                )
+            elif kind == "run":
+                ts, uid, task, summary, error = item
+                s = summary or {}
+                runs.append(
+                    (ts, _day(ts), uid, task, s.get("total"), s.get("skipped"), s.get("grabbed"), s.get("quoted"), error)
+                )
+        with conn:
+            if orders:
+                conn.executemany(_UPSERT_ORDER, orders)
+            if attempts:
+                conn.executemany(_INSERT_ATTEMPT, attempts)
+            if runs:
+                conn.executemany(_INSERT_RUN, runs)
+
+    @staticmethod
+    def _prune(conn: sqlite3.Connection, before: float) -> None:
+        with conn:
+            conn.execute("DELETE FROM orders WHERE last_seen < ?", (before,))
+            conn.execute("DELETE FROM attempts WHERE ts < ?", (before,))
+            conn.execute("DELETE FROM runs WHERE ts < ?", (before,))
+
+    def prune(self, retention_days: Optional[float] = None) -> None:
+        """立即清理超过保留天数的记录（写线程也会每小时清理一次）。"""
+        days = self.retention_days if retention_days is None else retention_days
+        conn = self._connect()
+        try:
+            self._prune(conn, time.time() - days * 86400)
+        finally:
+            conn.close()
+
+    # ------------------------- 查询 -------------------------
+
+    def _query(self, sql: str, params: Tuple[Any, ...] = ()) -> List[Dict[str, Any]]:
+        conn = self._connect()
+        try:
+            return [dict(row) for row in conn.execute(sql, params)]
+        finally:
+            conn.close()
+
+    @staticmethod
+    def _day_range(days: int) -> str:
+        return _day(time.time() - max(0, days - 1) * 86400)
+
+    def daily_summary(self, days: int = 7) -> List[Dict[str, Any]]:
+        """最近 days 天每天新出现的订单数与抢单结果：[{"day", "orders", "attempts", "grabbed", "lost", "quoted", "avgGrabMs"}]。"""
+        since = self._day_range(days)
+        order_rows = self._query("SELECT day, COUNT(*) AS n FROM orders WHERE day >= ? GROUP BY day", (since,))
+        attempt_rows = self._query(
+            "SELECT day, COUNT(*) AS attempts, SUM(grabbed) AS grabbed, SUM(sub_code = 200) AS lost, "
+            "SUM(quoted) AS quoted, AVG(grab_ms) AS avg_grab_ms FROM attempts WHERE day >= ? AND action = 'grab' GROUP BY day",
+            (since,),
+        )
+        orders = {r["day"]: r["n"] for r in order_rows}
+        attempts = {r["day"]: r for r in attempt_rows}
+        out = []
+        for day in sorted(set(orders) | set(attempts), reverse=True):
+            a = attempts.get(day) or {}
+            avg = a.get("avg_grab_ms")
+            out.append(
+                {
+                    "day": day,
+                    "orders": orders.get(day, 0),
+                    "attempts": a.get("attempts") or 0,
+                    "grabbed": a.get("grabbed") or 0,
+                    "lost": a.get("lost") or 0,
+                    "quoted": a.get("quoted") or 0,
+                    "avgGrabMs": round(avg, 1) if avg is not None else None,
+                }
+            )
+        return out
+
+    def brand_summary(self, days: int = 7) -> List[Dict[str, Any]]:
+        """最近 days 天按品牌统计新出现的订单：[{"brand", "orders", "avgPrice", "minPrice", "maxPrice"}]，按订单数降序。"""
+        rows = self._query(
+            "SELECT brand, COUNT(*) AS orders, AVG(price) AS avg_price, MIN(price) AS min_price, MAX(price) AS max_price "
+            "FROM orders WHERE day >= ? GROUP BY brand ORDER BY orders DESC",
+            (self._day_range(days),),
+        )
+        return [
+            {
+                "brand": r["brand"] or "",
+                "orders": r["orders"],
+                "avgPrice": round(r["avg_price"], 2) if r["avg_price"] is not None else None,
+                "minPrice": r["min_price"],
+                "maxPrice": r["max_price"],
+            }
+            for r in rows
+        ]
+
+    def orders(self, brand: Optional[str] = None, day: Optional[str] = None, limit: int = 200) -> List[Dict[str, Any]]:
+        """按品牌和 / 或日期（YYYY-MM-DD）查订单，按首次出现时间倒序。"""
+        where, params = [], []
+        if brand is not None:
+            where.append("brand = ?")
+            params.append(brand)
+        if day is not None:
+            where.append("day = ?")
+            params.append(day)
+        sql = "SELECT * FROM orders"
+        if where:
+            sql += " WHERE " + " AND ".join(where)
+        sql += " ORDER BY first_seen DESC LIMIT ?"
+        return self._query(sql, tuple(params) + (int(limit),))
+
+    def attempts(self, record_id: Any = None, task: Any = None, limit: int = 200) -> List[Dict[str, Any]]:
+        """按订单或任务查抢单 / 报价记录，按时间倒序。"""
+        where, params = [], []
+        if record_id is not None:
+            where.append("record_id = ?")
+            params.append(str(record_id))
+        if task is not None:
+            where.append("task = ?")
+            params.append(str(task))
+        sql = "SELECT * FROM attempts"
+        if where:
+            sql += " WHERE " + " AND ".join(where)
+        sql += " ORDER BY ts DESC LIMIT ?"
+        return self._query(sql, tuple(params) + (int(limit),))
+
+    def runs(self, task: Any = None, limit: int = 100) -> List[Dict[str, Any]]:
+        """任务执行记录，按时间倒序。"""
+        if task is None:
+            return self._query("SELECT * FROM runs ORDER BY ts DESC LIMIT ?", (int(limit),))
+        return self._query("SELECT * FROM runs WHERE task = ? ORDER BY ts DESC LIMIT ?", (str(task), int(limit)))
+
+    def stats(self) -> Dict[str, Any]:
+        return {"path": self.path, "written": self.written, "dropped": self.dropped, "queued": self._queue.qsize()}
+
+
+def history_from_env() -> Optional[HistoryStore]:
+    """
+    按环境变量创建历史记录：HAIHUISHOU_HISTORY 为数据库路径，未设置或为 1 时用 ~/.haihuishou/history.db，
+    设为 0 关闭；HAIHUISHOU_HISTORY_DAYS 为保留天数（默认 30）。
+    """
+    path = os.environ.get("HAIHUISHOU_HISTORY", "").strip()
+    if path.lower() in ("0", "false", "no"):
+        return None
+    try:
+        return HistoryStore(None if not path or path.lower() in ("1", "true", "yes") else path)
+    except (OSError, sqlite3.Error):
+        return None
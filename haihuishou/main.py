@@ -2,16 +2,26 @@
 """
 抢单工具入口：支持交互式步骤或一次性执行。
 使用前请设置环境变量 HAIHUISHOU_LOGIN_NAME、HAIHUISHOU_LOGIN_PWD（可选，否则会提示输入）。
+登录结果缓存在 ~/.haihuishou/credentials.json，之后执行 list / quote 直接复用 token，失效时自动重新登录。
 """
 
 import argparse
+import csv
 import json
 import os
 import sys
-from typing import Optional
+import time
+from typing import Any, Dict, Iterable, Iterator, List, Optional, TextIO
 
 from .api import HaihuishouAPI
-from .grab_tool import GrabCondition, GrabOrderTool
+from .credentials import CredentialCache
+from .metrics import METRICS, format_snapshot
+from .grab_tool import QUOTE_WORKERS, GrabCondition, GrabOrderTool, QuotePricer
+from .history import HistoryStore, history_from_env
+from .multi_account import POLICIES, MultiAccountEngine
+from .orders import ORDER_LIST
+from .refdata import ReferenceDataCache
+from .tracing import trace_sink_from_env
 
 
 def _env(name: str, default: str = "") -> str:
@@ -35,6 +45,48 @@ def cmd_brands(tool: GrabOrderTool, cat_id: int) -> None:
     print("品牌列表:", json.dumps(brands, ensure_ascii=False, indent=2))
 
 
+def _column_value(row: Dict[str, Any], column: str) -> Any:
+    """取列值，支持 a.b 形式的嵌套字段。"""
+    node: Any = row
+    for key in column.split("."):
+        if not isinstance(node, dict):
+            return None
+        node = node.get(key)
+    return node
+
+
+def _csv_cell(value: Any) -> Any:
+    if value is None:
+        return ""
+    if isinstance(value, (dict, list)):
+        return json.dumps(value, ensure_ascii=False)
+    return value
+
+
+def export_rows(rows: Iterable[Dict[str, Any]], out: TextIO, fmt: str, columns: Optional[List[str]] = None) -> int:
+    """
+    逐条写出订单行，返回条数。fmt 为 jsonl（每行一个 JSON）或 csv（表头为 columns，未指定时取第一条订单的字段）；
+    指定 columns 时只输出这些字段（支持 a.b 嵌套字段）。不在内存中保留已写出的订单。
+    """
+    n = 0
+    writer = None
+    for row in rows:
+        if fmt == "csv":
+            if writer is None:
+                columns = columns or list(row.keys())
+                writer = csv.writer(out)
+                writer.writerow(columns)
+            writer.writerow([_csv_cell(_column_value(row, c)) for c in columns or ()])
+        else:
+            item = {c: _column_value(row, c) for c in columns} if columns else row
+            out.write(json.dumps(item, ensure_ascii=False, default=str) + "\n")
+        n += 1
+    if fmt == "csv" and writer is None and columns:
+        csv.writer(out).writerow(columns)
+    out.flush()
+    return n
+
+
 def cmd_list(
     tool: GrabOrderTool,
     cat_id: str,
@@ -44,7 +96,15 @@ def cmd_list(
     max_price: str,
     page: int,
     page_size: int,
+    fetch_all: bool = False,
+    fmt: str = "json",
+    output: str = "-",
+    columns: str = "",
 ) -> None:
+    """
+    查询订单列表。fmt=json 时整页（或全部）排版打印；jsonl / csv 时逐条写到 output（- 为标准输出），
+    配合 fetch_all 边翻页边写出，内存只保留在途的几页。columns 为逗号分隔的输出字段。
+    """
     bid_list = [x.strip() for x in (brand_ids or "").split(",") if x.strip()]
     category_brands = []
     if (cat_id or "").strip() and bid_list:
@@ -56,9 +116,28 @@ def cmd_list(
         max_price=max_price or "5609",
         page_size=page_size,
     )
-    data = tool.step4_order_list(cond, page_index=page)
-    results = data.get("results", [])
-    total = data.get("totalCount", 0)
+    if fmt != "json":
+        if fetch_all:
+            # 第 1 页之后的页并发预取，按到达顺序逐条写出
+            rows: Iterable[Dict[str, Any]] = (rec.raw for rec in tool.iter_orders(cond))
+        else:
+            rows = ORDER_LIST.rows(tool.step4_order_list(cond, page_index=page))
+        cols = [c.strip() for c in (columns or "").split(",") if c.strip()] or None
+        out = sys.stdout if output == "-" else open(output, "w", encoding="utf-8", newline="")
+        try:
+            n = export_rows(rows, out, fmt, cols)
+        finally:
+            if out is not sys.stdout:
+                out.close()
+        print(f"已导出 {n} 条订单", file=sys.stderr)
+        return
+    if fetch_all:
+        # 全部页：第 1 页之后的页并发拉取
+        results = [rec.raw for rec in tool.iter_orders(cond)]
+        print(f"订单列表 (全部 {len(results)} 条):")
+        print(json.dumps(results, ensure_ascii=False, indent=2, default=str))
+        return
+    results, total = ORDER_LIST.parse(tool.step4_order_list(cond, page_index=page))
     print(f"订单列表 (共 {total} 条，本页 {len(results)} 条):")
     print(json.dumps(results, ensure_ascii=False, indent=2, default=str))
 
@@ -79,16 +158,189 @@ def cmd_quote(
     print("报价结果:", json.dumps(res, ensure_ascii=False, indent=2))
 
 
+# 批量报价输入的字段别名（CSV 表头或 JSONL 键）
+_QUOTE_FIELDS = {
+    "recordId": ("recordId", "record_id"),
+    "orderId": ("orderId", "order_id"),
+    "actualPrice": ("actualPrice", "actual_price", "price"),
+    "remark": ("remark",),
+    "action": ("action",),
+}
+
+
+def _quote_job(row: Dict[str, Any], line: int, update: bool, remark: str) -> Dict[str, Any]:
+    job: Dict[str, Any] = {"line": line}
+    for key, aliases in _QUOTE_FIELDS.items():
+        for alias in aliases:
+            value = row.get(alias)
+            if value is not None and value != "":
+                job[key] = value
+                break
+    action = str(job.pop("action", "") or "").strip().lower()
+    if action and action not in ("quote", "update"):
+        job["error"] = "action 须为 quote 或 update"
+    job["update"] = action == "update" if action else update
+    job.setdefault("remark", remark)
+    return job
+
+
+def _read_quote_jobs(f: TextIO, fmt: str, update: bool, remark: str) -> Iterator[Dict[str, Any]]:
+    """逐行读取报价任务（csv 需表头；jsonl 每行一个对象，空行与 # 开头的行跳过），line 为输入中的行号。"""
+    if fmt == "csv":
+        reader = csv.DictReader(f)
+        for row in reader:
+            yield _quote_job(row, reader.line_num, update, remark)
+        return
+    for line, text in enumerate(f, 1):
+        text = text.strip()
+        if not text or text.startswith("#"):
+            continue
+        try:
+            row = json.loads(text)
+        except ValueError as e:
+            yield {"line": line, "error": "JSON 格式错误: %s" % e}
+            continue
+        if not isinstance(row, dict):
+            yield {"line": line, "error": "每行须为 JSON 对象"}
+            continue
+        yield _quote_job(row, line, update, remark)
+
+
+def cmd_quote_batch(
+    tool: GrabOrderTool,
+    source: str,
+    fmt: str,
+    output: str,
+    workers: int,
+    update: bool,
+    remark: str,
+) -> int:
+    """
+    批量报价：从 CSV / JSONL（文件或标准输入 -）逐行读取任务并发提交，每完成一条立即写出一行 JSON 结果。
+    返回失败条数。
+    """
+    if not fmt:
+        fmt = "csv" if source.lower().endswith(".csv") else "jsonl"
+    src = sys.stdin if source == "-" else open(source, "r", encoding="utf-8-sig", newline="")
+    out = sys.stdout if output == "-" else open(output, "w", encoding="utf-8")
+    ok = failed = 0
+    t0 = time.perf_counter()
+    try:
+        for res in tool.quote_many(_read_quote_jobs(src, fmt, update, remark), workers=workers):
+            out.write(json.dumps(res, ensure_ascii=False) + "\n")
+            out.flush()
+            if res["ok"]:
+                ok += 1
+            else:
+                failed += 1
+    finally:
+        if src is not sys.stdin:
+            src.close()
+        if out is not sys.stdout:
+            out.close()
+    print(f"批量报价完成：成功 {ok}，失败 {failed}，耗时 {time.perf_counter() - t0:.1f}s", file=sys.stderr)
+    return failed
+
+
+def cmd_multi(
+    accounts_file: str,
+    policy: str,
+    quote_amount: str,
+    frequency: float,
+    cat_id: str,
+    brand_ids: str,
+    manufacturers: str,
+    min_price: str,
+    max_price: str,
+    max_runs: Optional[int],
+    page_size: int = 20,
+    history: Optional[HistoryStore] = None,
+    quote_rules: str = "",
+) -> None:
+    """
+    多账号抢单。accounts_file 为 JSON 数组：[{"loginName": "...", "loginPwd": "...", "quota": 20}, ...]，
+    quota 可省略（不限）。quote_rules 为报价规则 JSON 文件（规则数组，见 QuotePricer），
+    设置后 quote_amount 为不命中任何规则时的报价（可为空，即不抢）。按 Ctrl+C 停止。
+    """
+    rules = None
+    if quote_rules:
+        with open(quote_rules, "r", encoding="utf-8") as f:
+            rules = json.load(f)
+    pricer = QuotePricer.from_body(quote_amount, rules)
+    with open(accounts_file, "r", encoding="utf-8") as f:
+        accounts = json.load(f)
+    engine = MultiAccountEngine(policy=policy, history=history)
+    credentials = CredentialCache()
+    tracer = trace_sink_from_env()
+    for item in accounts:
+        api = HaihuishouAPI(credentials=credentials, tracer=tracer)
+        api.login(str(item["loginName"]), str(item["loginPwd"]), use_cache=True)
+        engine.add_account(api, quota=item.get("quota"))
+        print(f"已登录 {item['loginName']}（userId={api.user_id}）")
+    cond = GrabCondition.for_task(
+        manufacturer_names=[x.strip() for x in manufacturers.split(",") if x.strip()],
+        category_id=cat_id.strip(),
+        brand_ids=[x.strip() for x in brand_ids.split(",") if x.strip()],
+        min_price=min_price or None,
+        max_price=max_price or None,
+        page_size=page_size,
+    )
+
+    def _report(summary: Any) -> None:
+        if isinstance(summary, Exception):
+            print(f"本轮失败: {summary}", file=sys.stderr)
+        elif summary["orders"] or summary["unpriced"]:
+            print(
+                f"本轮共 {summary['total']} 条，抢单 {summary['grabbed']}，报价 {summary['quoted']}，"
+                f"按报价规则不抢 {summary['unpriced']}"
+            )
+
+    try:
+        totals = engine.run(
+            cond,
+            pricer.default,
+            frequency=frequency,
+            remark="多账号抢单",
+            max_runs=max_runs,
+            on_result=_report,
+            pricer=pricer,
+        )
+        print(f"结束：执行 {totals['runs']} 轮，抢单 {totals['grabbed']}，报价 {totals['quoted']}")
+    except KeyboardInterrupt:
+        pass
+    finally:
+        engine.close()
+        print(json.dumps(engine.accounts, ensure_ascii=False, indent=2))
+        print(format_snapshot(METRICS.snapshot()))
+
+
+def cmd_stats(url: str, raw: bool) -> None:
+    """读取运行中的 Web UI 的指标：raw 时原样打印 /metrics（Prometheus 文本），否则按表格打印 /api/metrics。"""
+    import requests
+
+    base = url.rstrip("/")
+    if raw:
+        r = requests.get(base + "/metrics", timeout=10)
+        r.raise_for_status()
+        print(r.text, end="")
+        return
+    r = requests.get(base + "/api/metrics", timeout=10)
+    r.raise_for_status()
+    print(format_snapshot(r.json().get("data") or {}))
+
+
 def main() -> int:
     parser = argparse.ArgumentParser(description="嗨回收抢单工具")
     parser.add_argument("--login-name", default=_env("HAIHUISHOU_LOGIN_NAME"), help="登录手机号")
     parser.add_argument("--login-pwd", default=_env("HAIHUISHOU_LOGIN_PWD"), help="登录密码（明文或 MD5）")
     sub = parser.add_subparsers(dest="command", help="子命令")
 
-    sub.add_parser("login", help="登录并获取 token")
+    sub.add_parser("login", help="登录并获取 token（保存到本地凭据缓存）")
     p_cat = sub.add_parser("categories", help="获取厂商列表与电子产品类型")
+    p_cat.add_argument("--refresh", action="store_true", help="忽略本地缓存，重新拉取全部基础数据")
     p_brands = sub.add_parser("brands", help="根据分类 id 获取品牌")
     p_brands.add_argument("cat_id", type=int, help="分类 id，如 100001=手机")
+    p_brands.add_argument("--refresh", action="store_true", help="忽略本地缓存，重新拉取全部基础数据")
     p_list = sub.add_parser("list", help="按条件查询可抢订单列表（需先 login，无省份城市）")
     p_list.add_argument("--cat-id", default="", help="分类 id，如 100001=手机")
     p_list.add_argument("--brand-ids", default="", help="品牌 id 逗号分隔，如 100067,100611")
@@ -97,34 +349,101 @@ def main() -> int:
     p_list.add_argument("--max-price", default="5000", help="最高价")
     p_list.add_argument("--page", type=int, default=1, help="页码")
     p_list.add_argument("--page-size", type=int, default=100, help="每页条数")
+    p_list.add_argument("--all", action="store_true", help="拉取全部页（忽略 --page）")
+    p_list.add_argument(
+        "--format",
+        choices=("json", "jsonl", "csv"),
+        default="json",
+        help="输出格式：json 排版打印（默认）；jsonl / csv 逐条写出，适合配合 --all 导出大量订单",
+    )
+    p_list.add_argument("--output", "-o", default="-", help="jsonl / csv 输出文件，默认标准输出")
+    p_list.add_argument("--columns", default="", help="jsonl / csv 只输出这些字段（逗号分隔，支持 a.b），如 recordId,brandName,apprizeAmount")
+    p_multi = sub.add_parser("multi", help="多账号抢单（共用一次列表查询，按策略分单）")
+    p_multi.add_argument("accounts", help='账号 JSON 文件：[{"loginName", "loginPwd", "quota"}]')
+    p_multi.add_argument("quote_amount", nargs="?", default="", help="报价金额（0～500）；设置 --quote-rules 时为不命中规则的报价，可省略")
+    p_multi.add_argument("--quote-rules", default="", help="报价规则 JSON 文件（按分类 / 品牌 / 厂商 / 预估金额定价，见 README）")
+    p_multi.add_argument("--policy", choices=POLICIES, default="round_robin", help="分单策略，默认 round_robin")
+    p_multi.add_argument("--frequency", type=float, default=1.0, help="执行频率（秒/次）")
+    p_multi.add_argument("--cat-id", default="", help="分类 id，如 100001=手机")
+    p_multi.add_argument("--brand-ids", default="", help="品牌 id 逗号分隔")
+    p_multi.add_argument("--manufacturers", default="", help="厂商名称逗号分隔，如 华为,小米")
+    p_multi.add_argument("--min-price", default="", help="最低价")
+    p_multi.add_argument("--max-price", default="", help="最高价")
+    p_multi.add_argument("--max-runs", type=int, default=None, help="执行轮数，默认一直执行")
+    p_multi.add_argument("--page-size", type=int, default=20, help="每轮查询的订单条数")
+    p_stats = sub.add_parser("stats", help="查看运行中 Web UI 的接口延迟与抢单统计")
+    p_stats.add_argument(
+        "--url",
+        default="http://127.0.0.1:%s" % (_env("HAIHUISHOU_UI_PORT") or "5050"),
+        help="Web UI 地址，默认 http://127.0.0.1:5050",
+    )
+    p_stats.add_argument("--raw", action="store_true", help="输出 Prometheus 文本格式")
     p_quote = sub.add_parser("quote", help="提交报价（需先 login）")
     p_quote.add_argument("record_id", type=int, help="记录 id")
     p_quote.add_argument("order_id", type=int, help="订单 id")
     p_quote.add_argument("actual_price", help="报价金额")
     p_quote.add_argument("--remark", default="", help="备注")
+    p_batch = sub.add_parser("quote-batch", help="批量提交 / 修改报价（CSV 或 JSONL，并发执行，逐条输出结果）")
+    p_batch.add_argument(
+        "input",
+        nargs="?",
+        default="-",
+        help="任务文件，默认 - 读标准输入；字段 recordId, orderId, actualPrice, remark, action（quote / update）",
+    )
+    p_batch.add_argument("--format", choices=("csv", "jsonl"), default="", help="输入格式，默认按扩展名（.csv 为 csv，其余 jsonl）")
+    p_batch.add_argument("--output", "-o", default="-", help="结果 JSONL 输出文件，默认标准输出")
+    p_batch.add_argument("--workers", type=int, default=QUOTE_WORKERS, help="并发数，默认 %d" % QUOTE_WORKERS)
+    p_batch.add_argument("--update", action="store_true", help="未指定 action 的行按修改报价（hsdupdatequotation）处理")
+    p_batch.add_argument("--remark", default="", help="未指定 remark 的行使用的备注")
 
     args = parser.parse_args()
     if not args.command:
         parser.print_help()
         return 0
 
-    need_login = args.command in ("list", "quote")
+    need_login = args.command in ("list", "quote", "quote-batch")
     login_name = args.login_name or ""
     login_pwd = args.login_pwd or ""
 
-    if need_login and not (login_name and login_pwd):
+    credentials = CredentialCache()
+    cached: Optional[Dict[str, Any]] = None
+    if need_login and not (login_name and login_pwd) and args.command == "quote-batch" and args.input == "-":
+        # 任务从标准输入读取，不能再用 input() 提示登录；只能用缓存的 token（该账号或唯一缓存的账号）
+        names = [login_name] if login_name else credentials.names()
+        cached = credentials.get(names[0]) if len(names) == 1 else None
+        if not (cached and cached.get("token") and cached.get("userId")):
+            print(
+                "quote-batch 从标准输入读取任务时无法交互输入登录信息，"
+                "请用 --login-name / --login-pwd 或环境变量 HAIHUISHOU_LOGIN_NAME / HAIHUISHOU_LOGIN_PWD 提供，"
+                "或先执行 login 缓存 token",
+                file=sys.stderr,
+            )
+            return 1
+        login_name = names[0]
+        if cached.get("pwd"):
+            login_pwd = cached["pwd"]  # HAIHUISHOU_SAVE_PASSWORD 时缓存了密码，token 失效后可自动重新登录
+            cached = None
+
+    if need_login and cached is None and not (login_name and login_pwd):
         login_name = input("登录手机号: ").strip()
         login_pwd = input("登录密码: ").strip()
         if not (login_name and login_pwd):
             print("需要登录信息", file=sys.stderr)
             return 1
 
-    api = HaihuishouAPI()
-    tool = GrabOrderTool(api=api)
+    # 批量报价时连接池与并发数一致，避免超出部分每次新建连接
+    pool_size = max(1, args.workers) if args.command == "quote-batch" else None
+    api = HaihuishouAPI(credentials=credentials, tracer=trace_sink_from_env(), pool_size=pool_size)
+    refdata = ReferenceDataCache(api)
+    # 查订单、报价、抢单的子命令把结果写入历史记录（退出前写完）
+    history = history_from_env() if args.command in ("list", "quote-batch", "multi") else None
+    tool = GrabOrderTool(api=api, refdata=refdata, history=history)
 
-    if need_login:
+    if cached is not None:
+        api.set_token(cached["token"], cached["userId"])
+    elif need_login:
         try:
-            tool.step1_login(login_name, login_pwd)
+            tool.step1_login(login_name, login_pwd, use_cache=True)
         except Exception as e:
             print(f"登录失败: {e}", file=sys.stderr)
             return 1
@@ -138,8 +457,12 @@ def main() -> int:
                 return 1
             cmd_login(tool, name, pwd)
         elif args.command == "categories":
+            if args.refresh:
+                refdata.prefetch()
             cmd_categories(tool)
         elif args.command == "brands":
+            if args.refresh:
+                refdata.prefetch()
             cmd_brands(tool, args.cat_id)
         elif args.command == "list":
             cmd_list(
@@ -151,7 +474,29 @@ def main() -> int:
                 getattr(args, "max_price", "5000") or "5000",
                 getattr(args, "page", 1),
                 getattr(args, "page_size", 100),
+                getattr(args, "all", False),
+                args.format,
+                args.output,
+                args.columns,
             )
+        elif args.command == "multi":
+            cmd_multi(
+                args.accounts,
+                args.policy,
+                args.quote_amount,
+                args.frequency,
+                args.cat_id,
+                args.brand_ids,
+                args.manufacturers,
+                args.min_price,
+                args.max_price,
+                args.max_runs,
+                args.page_size,
+                history,
+                args.quote_rules,
+            )
+        elif args.command == "stats":
+            cmd_stats(args.url, args.raw)
         elif args.command == "quote":
             cmd_quote(
                 tool,
@@ -160,9 +505,15 @@ def main() -> int:
                 args.actual_price,
                 getattr(args, "remark", ""),
             )
+        elif args.command == "quote-batch":
+            if cmd_quote_batch(tool, args.input, args.format, args.output, args.workers, args.update, args.remark):
+                return 1
     except Exception as e:
         print(f"执行失败: {e}", file=sys.stderr)
         return 1
+    finally:
+        if history is not None:
+            history.close()
     return 0
 
 
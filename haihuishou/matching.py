@@ -0,0 +1,427 @@
+# -*- coding: utf-8 -*-
+"""
+多任务共用订单源：同一账号执行中的任务条件大量重叠时，不再每个任务各查一次订单列表，
+而是把全部条件合并成一个最宽的查询（broadest_condition）每轮只查一次，再由 TaskMatcher 在本地把每条订单分给各任务。
+
+TaskMatcher 用倒排索引匹配：分类、品牌、厂商各一张「取值 → 任务位图」表，价格区间按端点排序后二分查找，
+每条订单只做几次字典查找、两次二分和位运算，开销随订单数增长，与任务数基本无关。
+SharedOrderFeed 执行一轮：查列表 → 匹配 → 按优先级（GrabQueue）把每条订单交给第一个命中且按报价规则给出报价的任务抢单并报价。
+"""
+
+import json
+import threading
+from bisect import bisect_left, bisect_right
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, replace
+from functools import partial
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+from .grab_tool import (
+    DRAIN_MAX_GRABS,
+    DRAIN_MAX_PAGES,
+    DRAIN_PAGE_SIZE,
+    DRAIN_WORKERS,
+    GrabCandidate,
+    GrabCondition,
+    GrabOrderTool,
+    GrabPriority,
+    GrabQueue,
+    QuotePricer,
+    _task_summary,
+    order_list_key,
+)
+from .orders import ORDER_LIST, OrderRecord
+from .resilience import expired, time_limit, use_deadline
+
+# 多个任务共用订单源时每轮查询的条数（单个任务时用任务自己的条数）
+SHARED_PAGE_SIZE = DRAIN_PAGE_SIZE
+
+BrandNames = Callable[[str], Dict[str, str]]
+
+
+def _price(value: Optional[str]) -> Optional[float]:
+    if value is None or str(value).strip() == "":
+        return None
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def broadest_condition(conditions: Sequence[GrabCondition], page_size: Optional[int] = None) -> GrabCondition:
+    """
+    覆盖全部条件的最宽查询：某个条件不限分类 / 厂商 / 价格下限 / 价格上限时合并结果也不限，
+    否则取并集（同一分类下某个条件不限品牌时该分类不限品牌）与最宽的价格区间。订单状态取第一个条件的。
+    """
+    if not conditions:
+        raise ValueError("至少需要一个条件")
+    if any(not c.category_brands for c in conditions):
+        category_brands: List[Dict[str, Any]] = []
+    else:
+        merged: Dict[str, Optional[set]] = {}
+        for c in conditions:
+            for cb in c.category_brands:
+                cat = str(cb.get("key"))
+                brands = {str(b) for b in cb.get("value") or []}
+                if cat in merged and merged[cat] is None:
+                    continue
+                merged[cat] = None if not brands else (merged.get(cat) or set()) | brands
+        category_brands = [{"key": cat, "value": sorted(brands or [])} for cat, brands in sorted(merged.items())]
+    if any(not c.sub_order_source_names for c in conditions):
+        manufacturers: List[str] = []
+    else:
+        manufacturers = sorted({str(m) for c in conditions for m in c.sub_order_source_names})
+    lows = [_price(c.min_price) for c in conditions]
+    highs = [_price(c.max_price) for c in conditions]
+    min_price = None if any(x is None for x in lows) else min(zip(lows, (c.min_price for c in conditions)))[1]
+    max_price = None if any(x is None for x in highs) else max(zip(highs, (c.max_price for c in conditions)))[1]
+    return GrabCondition(
+        category_brands=category_brands,
+        order_state=conditions[0].order_state,
+        min_price=min_price,
+        max_price=max_price,
+        sub_order_source_names=manufacturers,
+        page_size=page_size if page_size is not None else max(c.page_size for c in conditions),
+    )
+
+
+class TaskMatcher:
+    """
+    把订单匹配到各任务的条件（与 gethsdorderlist 的筛选一致：分类 + 品牌、厂商、预估金额区间，各维度同时满足）。
+    tasks 为 [(key, GrabCondition)]，match(rec) 返回命中任务的位图，keys(mask) 按 tasks 顺序取出 key。
+    品牌按 brandId 匹配；传入 brand_names(cat_id) -> {品牌 id: 品牌名} 时也按品牌名匹配（订单行没有 brandId 时），
+    订单行没有 catId 时只按品牌判断分类。
+    """
+
+    def __init__(self, tasks: Sequence[Tuple[Any, GrabCondition]], brand_names: Optional[BrandNames] = None):
+        self.tasks = [key for key, _ in tasks]
+        self._any_category = 0
+        self._by_category: Dict[str, int] = {}
+        self._by_brand_id: Dict[Tuple[str, str], int] = {}
+        self._by_brand_name: Dict[Tuple[str, str], int] = {}
+        self._any_manufacturer = 0
+        self._by_manufacturer: Dict[str, int] = {}
+        no_low = no_high = 0
+        lows: List[Tuple[float, int]] = []
+        highs: List[Tuple[float, int]] = []
+        names_cache: Dict[str, Dict[str, str]] = {}
+
+        def _names(cat: str) -> Dict[str, str]:
+            if brand_names is None:
+                return {}
+            if cat not in names_cache:
+                try:
+                    names_cache[cat] = brand_names(cat) or {}
+                except Exception:
+                    names_cache[cat] = {}
+            return names_cache[cat]
+
+        for i, (_, cond) in enumerate(tasks):
+            bit = 1 << i
+            if not cond.category_brands:
+                self._any_category |= bit
+            for cb in cond.category_brands or []:
+                cat = str(cb.get("key"))
+                brand_ids = [str(b) for b in cb.get("value") or []]
+                if not brand_ids:
+                    self._by_category[cat] = self._by_category.get(cat, 0) | bit
+                    # 订单行没有 catId 时，按该分类下的品牌判断
+                    for bid, name in _names(cat).items():
+                        self._add_brand("", bid, name, bit)
+                    continue
+                names = _names(cat)
+                for bid in brand_ids:
+                    self._add_brand(cat, bid, names.get(bid), bit)
+                    self._add_brand("", bid, names.get(bid), bit)
+            if not cond.sub_order_source_names:
+                self._any_manufacturer |= bit
+            for name in cond.sub_order_source_names or []:
+                self._by_manufacturer[str(name)] = self._by_manufacturer.get(str(name), 0) | bit
+            low, high = _price(cond.min_price), _price(cond.max_price)
+            if low is None:
+                no_low |= bit
+            else:
+                lows.append((low, bit))
+            if high is None:
+                no_high |= bit
+            else:
+                highs.append((high, bit))
+        # 价格下限升序，_low_masks[k] 为前 k 个下限（均 <= 价格）的任务；上限升序，_high_masks[k] 为第 k 个起（均 >= 价格）的任务
+        lows.sort()
+        highs.sort()
+        self._low_points = [p for p, _ in lows]
+        self._low_masks = [no_low]
+        for _, bit in lows:
+            self._low_masks.append(self._low_masks[-1] | bit)
+        self._high_points = [p for p, _ in highs]
+        self._high_masks = [no_high]
+        for _, bit in reversed(highs):
+            self._high_masks.append(self._high_masks[-1] | bit)
+        self._high_masks.reverse()
+        self._unbounded = no_low & no_high
+
+    def _add_brand(self, cat: str, brand_id: str, name: Optional[str], bit: int) -> None:
+        key = (cat, brand_id)
+        self._by_brand_id[key] = self._by_brand_id.get(key, 0) | bit
+        if name:
+            key = (cat, str(name))
+            self._by_brand_name[key] = self._by_brand_name.get(key, 0) | bit
+
+    def match(self, rec: OrderRecord) -> int:
+        """命中任务的位图（第 i 位对应 tasks[i]），0 表示没有任务要这条订单。"""
+        cat = rec.category
+        mask = (
+            self._any_category
+            | self._by_category.get(cat, 0)
+            | self._by_brand_id.get((cat, rec.brand_id), 0)
+            | self._by_brand_name.get((cat, rec.brand), 0)
+        )
+        if not mask:
+            return 0
+        mask &= self._any_manufacturer | self._by_manufacturer.get(rec.manufacturer, 0)
+        if not mask:
+            return 0
+        price = rec.price
+        if price is None:
+            return mask & self._unbounded
+        return mask & self._low_masks[bisect_right(self._low_points, price)] & self._high_masks[
+            bisect_left(self._high_points, price)
+        ]
+
+    def keys(self, mask: int) -> Iterator[Any]:
+        """按 tasks 顺序逐个返回位图中的任务 key。"""
+        tasks = self.tasks
+        while mask:
+            low = mask & -mask
+            yield tasks[low.bit_length() - 1]
+            mask ^= low
+
+
+@dataclass
+class FeedTask:
+    """共用订单源里的一个任务：key 为任务标识，每轮最多抢 max_grabs 单（非抢光模式为条件的每页条数）。"""
+
+    key: Any
+    condition: GrabCondition
+    pricer: QuotePricer
+    remark: str = ""
+    drain: bool = False
+    max_grabs: int = DRAIN_MAX_GRABS
+
+    @property
+    def limit(self) -> int:
+        return self.max_grabs if self.drain else max(1, self.condition.page_size)
+
+
+class SharedOrderFeed:
+    """
+    一个账号的共用订单源。execute(tool, tasks) 执行一轮：按 broadest_condition 查一次订单列表
+    （有任务是抢光模式时翻页拉取，最多 DRAIN_MAX_PAGES 页），匹配到任务且报价规则给出报价的订单整页进入 GrabQueue，
+    workers 个线程按优先级（priority，默认 GrabPriority.from_env()）取出后交给其中第一个未抢满的任务抢单并报价
+    （同一订单只抢一次，分数按第一个给出报价的任务的报价计算）。返回 {任务 key: execute_task 格式的汇总}，
+    各任务的 total 为匹配到该任务的订单数，过期订单计入第一个给出报价的任务。任务集合与条件不变时匹配器只编译一次。
+    deadline 为本轮总时限（秒），含义同 GrabOrderTool.execute_task；第 1 页之后的页失败只停止翻页，错误记入各任务的 errors。
+    合并查询只取一页且页已满时，没匹配到任何订单的任务再用自己的条件补查一次（见 _fallback）。
+    """
+
+    def __init__(self, workers: int = DRAIN_WORKERS, priority: Optional[GrabPriority] = None):
+        self.workers = max(1, workers)
+        self.priority = priority
+        self._matcher: Optional[TaskMatcher] = None
+        self._matcher_key: Optional[str] = None
+        self.polls = 0
+
+    def matcher(self, tasks: Sequence[FeedTask], tool: Optional[GrabOrderTool] = None) -> TaskMatcher:
+        key = json.dumps([[str(t.key), order_list_key(t.condition, 0, "")] for t in tasks], ensure_ascii=False)
+        if self._matcher is None or key != self._matcher_key:
+            brand_names = partial(_brand_names, tool) if tool is not None else None
+            self._matcher = TaskMatcher([(t.key, t.condition) for t in tasks], brand_names)
+            self._matcher_key = key
+        return self._matcher
+
+    @staticmethod
+    def _condition(tasks: Sequence[FeedTask]) -> GrabCondition:
+        conditions = [t.condition for t in tasks]
+        if any(t.drain for t in tasks):
+            return broadest_condition(conditions, page_size=max(DRAIN_PAGE_SIZE, *(c.page_size for c in conditions)))
+        cond = broadest_condition(conditions)
+        if len(tasks) > 1:
+            cond = replace(cond, page_size=max(SHARED_PAGE_SIZE, cond.page_size))
+        return cond
+
+    def _pages(
+        self, tool: GrabOrderTool, tasks: Sequence[FeedTask], cond: GrabCondition, uid: Any
+    ) -> Iterable[List[OrderRecord]]:
+        if any(t.drain for t in tasks):
+            return tool.iter_order_pages(cond, user_id=uid, max_pages=DRAIN_MAX_PAGES, fresh=True)
+        rows = tool.step4_order_rows(cond, page_index=1, user_id=uid, fresh=True)
+        return [list(ORDER_LIST.records(rows, keep_raw=False))]
+
+    def execute(
+        self,
+        tool: GrabOrderTool,
+        tasks: Sequence[FeedTask],
+        user_id: Optional[str] = None,
+        deadline: Optional[float] = None,
+    ) -> Dict[Any, Dict[str, Any]]:
+        if not tasks:
+            return {}
+        with time_limit(deadline) as at:
+            return self._execute(tool, tasks, user_id or tool.api.user_id, at)
+
+    def _execute(
+        self, tool: GrabOrderTool, tasks: Sequence[FeedTask], uid: Any, at: Optional[float]
+    ) -> Dict[Any, Dict[str, Any]]:
+        matcher = self.matcher(tasks, tool)
+        by_key = {t.key: t for t in tasks}
+        stats = {t.key: {"total": 0, "skipped": 0, "unpriced": 0, "expired": 0, "grabs": 0} for t in tasks}
+        orders: Dict[Any, List[Dict[str, Any]]] = {t.key: [] for t in tasks}
+        records: Dict[Any, List[Any]] = {t.key: [] for t in tasks}
+        seen_index = tool.seen
+        lock = threading.Lock()
+        open_tasks = [len(tasks)]
+
+        def _expired(cand: GrabCandidate) -> None:
+            stats[cand.payload[0][0]]["expired"] += 1
+
+        queue = GrabQueue(self.priority, on_expired=_expired)
+        queued: set = set()
+        task_errors: Dict[Any, List[str]] = {t.key: [] for t in tasks}
+        self.polls += 1
+
+        def _candidates(page: List[OrderRecord], only: Any = None) -> List[Tuple[OrderRecord, str, Any]]:
+            """only 为任务 key 时 page 是该任务自己条件查到的订单，不再本地匹配、只分给该任务。"""
+            batch = []
+            for rec in page:
+                if only is not None:
+                    if rec.record_id in queued:
+                        continue
+                    keys = [only]
+                else:
+                    mask = matcher.match(rec)
+                    if not mask:
+                        continue
+                    keys = list(matcher.keys(mask))
+                for key in keys:
+                    stats[key]["total"] += 1
+                    records[key].append(rec.record_id)
+                if seen_index is not None and seen_index.should_skip(rec.record_id):
+                    for key in keys:
+                        stats[key]["skipped"] += 1
+                    continue
+                offers = []
+                for key in keys:
+                    amount = by_key[key].pricer.price(rec)
+                    if amount is None:
+                        stats[key]["unpriced"] += 1
+                    else:
+                        offers.append((key, amount))
+                if offers:
+                    queued.add(rec.record_id)
+                    batch.append((rec, offers[0][1], offers))
+            return batch
+
+        def _worker() -> None:
+            with use_deadline(at):
+                _grab_loop()
+
+        def _grab_loop() -> None:
+            while True:
+                cand = queue.pop()
+                if cand is None or expired():
+                    return
+                with lock:
+                    if open_tasks[0] <= 0:
+                        return
+                    chosen = None
+                    for key, amount in cand.payload:
+                        st = stats[key]
+                        if st["grabs"] < by_key[key].limit:
+                            st["grabs"] += 1
+                            if st["grabs"] >= by_key[key].limit:
+                                open_tasks[0] -= 1
+                            chosen = (key, amount)
+                            break
+                if chosen is None:
+                    continue
+                key, amount = chosen
+                rec = cand.record
+                res = tool.grab_and_quote(rec.record_id, rec.order_id, amount, by_key[key].remark, uid)
+                res["actualPrice"] = amount
+                if seen_index is not None:
+                    seen_index.mark_result(rec, res)
+                if tool.history is not None:
+                    tool.history.record_attempt(res, uid, key)
+                with lock:
+                    orders[key].append(res)
+
+        with ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="haihuishou-feed") as pool:
+            grabbers = [pool.submit(_worker) for _ in range(self.workers)]
+            fetched = False
+            page_errors: List[str] = []
+            cond = self._condition(tasks)
+            try:
+                rows = 0
+                for page in self._pages(tool, tasks, cond, uid):
+                    fetched = True
+                    rows += len(page)
+                    queue.push_many(_candidates(page))
+                    with lock:
+                        if open_tasks[0] <= 0 or expired():
+                            break  # 全部任务已抢满或时间已到，停止翻页
+                if len(tasks) > 1 and not any(t.drain for t in tasks) and rows >= cond.page_size:
+                    self._fallback(tool, tasks, uid, stats, task_errors, _candidates, queue)
+            except Exception as e:
+                if not fetched:
+                    raise
+                page_errors.append("翻页失败，本轮停止翻页: %s" % e)
+            finally:
+                queue.close()
+            for f in grabbers:
+                f.result()
+        return {
+            key: _task_summary(
+                st["total"],
+                orders[key],
+                st["skipped"],
+                st["unpriced"],
+                st["expired"],
+                page_errors + task_errors[key],
+                records[key],
+            )
+            for key, st in stats.items()
+        }
+
+    @staticmethod
+    def _fallback(
+        tool: GrabOrderTool,
+        tasks: Sequence[FeedTask],
+        uid: Any,
+        stats: Dict[Any, Dict[str, int]],
+        task_errors: Dict[Any, List[str]],
+        candidates: Callable[..., List[Tuple[OrderRecord, str, Any]]],
+        queue: GrabQueue,
+    ) -> None:
+        """
+        合并查询的页已满（后面可能还有订单）而某个任务一条也没匹配到时，用该任务自己的条件补查第 1 页，
+        避免条件窄的任务被其他任务的订单挤出这一页（共用前每个任务都能看到自己条件下的第 1 页）。
+        """
+        for t in tasks:
+            if stats[t.key]["total"] or expired():
+                continue
+            try:
+                rows = tool.step4_order_rows(t.condition, page_index=1, user_id=uid, fresh=True)
+                queue.push_many(candidates(list(ORDER_LIST.records(rows, keep_raw=False)), t.key))
+            except Exception as e:
+                task_errors[t.key].append("补查本任务订单失败: %s" % e)
+
+
+def _brand_names(tool: GrabOrderTool, cat: str) -> Dict[str, str]:
+    """分类下的 {品牌 id: 品牌名}（优先走基础数据缓存）。"""
+    out: Dict[str, str] = {}
+    for b in tool.step3_brands_by_category(int(cat)):
+        bid = b.get("key", b.get("brandId", b.get("id")))
+        name = b.get("value", b.get("brandName", b.get("name")))
+        if bid is not None and name:
+            out[str(bid)] = str(name)
+    return out
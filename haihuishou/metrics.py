@@ -0,0 +1,289 @@
+# -*- coding: utf-8 -*-
+"""
+运行指标：每个上游接口的延迟直方图、HTTP 状态 / subCode 计数、超时次数与被合并的查询数，以及每个任务的抢单、抢到、
+被抢走与报价结果计数。Web UI 的 /metrics 以 Prometheus 文本格式输出，/api/metrics 输出 JSON（命令行 stats 使用）。
+"""
+
+import bisect
+import threading
+from typing import Any, Dict, List, Optional, Tuple
+
+# 延迟直方图桶上限（秒），最后一个桶为 +Inf
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# 每个任务的计数项：抢单次数、抢到、被其他报价师抢走、抢单异常、报价成功、抢到后报价失败
+TASK_COUNTERS = ("attempts", "wins", "losses", "errors", "quoted", "quoteFailed")
+
+
+class Histogram:
+    """固定桶直方图（非累计存储，输出时再累加）。调用方负责加锁。"""
+
+    __slots__ = ("bounds", "counts", "sum", "count")
+
+    def __init__(self, bounds: Tuple[float, ...] = LATENCY_BUCKETS):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect.bisect_left(self.bounds, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def quantile(self, q: float) -> Optional[float]:
+        """按桶内线性插值估算分位数；落在 +Inf 桶时返回最大有限桶上限。"""
+        if not self.count:
+            return None
+        rank = q * self.count
+        seen = 0
+        lower = 0.0
+        for i, n in enumerate(self.counts):
+            if n and seen + n >= rank:
+                if i >= len(self.bounds):
+                    return self.bounds[-1]
+                return lower + (self.bounds[i] - lower) * (rank - seen) / n
+            seen += n
+            if i < len(self.bounds):
+                lower = self.bounds[i]
+        return self.bounds[-1]
+
+
+class _Endpoint:
+    __slots__ = ("latency", "statuses", "sub_codes", "timeouts", "coalesced", "rejected")
+
+    def __init__(self) -> None:
+        self.latency = Histogram()
+        self.statuses: Dict[str, int] = {}
+        self.sub_codes: Dict[str, int] = {}
+        self.timeouts = 0
+        # 未发出请求的调用：inflight 合并到进行中的相同查询，cache 命中微缓存
+        self.coalesced: Dict[str, int] = {}
+        # 未发出请求的调用：deadline 截止时间已到，circuit_open 熔断中
+        self.rejected: Dict[str, int] = {}
+
+
+def _label(value: Any) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+class MetricsRegistry:
+    """线程安全的指标登记表。HaihuishouAPI 默认写入全局 METRICS。"""
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._endpoints: Dict[str, _Endpoint] = {}
+        self._tasks: Dict[str, Dict[str, int]] = {}
+        self._task_failures: Dict[str, int] = {}
+
+    def _endpoint(self, name: str) -> _Endpoint:
+        ep = self._endpoints.get(name)
+        if ep is None:
+            ep = self._endpoints[name] = _Endpoint()
+        return ep
+
+    # ------------------------- 上游接口 -------------------------
+
+    def observe_request(self, endpoint: str, seconds: float, status: Any) -> None:
+        """记录一次请求：耗时与 HTTP 状态（请求未完成时 status 为 "timeout" / "error"）。"""
+        with self._lock:
+            ep = self._endpoint(endpoint)
+            ep.latency.observe(seconds)
+            key = str(status)
+            ep.statuses[key] = ep.statuses.get(key, 0) + 1
+            if status == "timeout":
+                ep.timeouts += 1
+
+    def observe_sub_code(self, endpoint: str, sub_code: Any) -> None:
+        """记录业务返回的 subCode（抢单 100 / 200 等）。"""
+        with self._lock:
+            ep = self._endpoint(endpoint)
+            key = str(sub_code)
+            ep.sub_codes[key] = ep.sub_codes.get(key, 0) + 1
+
+    def observe_coalesced(self, endpoint: str, kind: str) -> None:
+        """记录一次被合并的调用（kind 为 inflight / cache，见 coalesce.SingleFlight）。"""
+        with self._lock:
+            ep = self._endpoint(endpoint)
+            ep.coalesced[kind] = ep.coalesced.get(kind, 0) + 1
+
+    def observe_rejected(self, endpoint: str, reason: str) -> None:
+        """记录一次因截止时间已到（deadline）或熔断（circuit_open）而未发出的请求。"""
+        with self._lock:
+            ep = self._endpoint(endpoint)
+            ep.rejected[reason] = ep.rejected.get(reason, 0) + 1
+
+    # ------------------------- 任务 -------------------------
+
+    def record_task(self, task: Any, summary: Dict[str, Any]) -> None:
+        """按一轮 execute_task 的汇总累加该任务的抢单与报价计数。"""
+        orders = summary.get("orders") or []
+        delta = dict.fromkeys(TASK_COUNTERS, 0)
+        for o in orders:
+            delta["attempts"] += 1
+            if o.get("grabbed"):
+                delta["wins"] += 1
+                delta["quoted" if o.get("quoted") else "quoteFailed"] += 1
+            elif o.get("subCode") == 200:
+                delta["losses"] += 1
+            else:
+                delta["errors"] += 1
+        with self._lock:
+            counters = self._tasks.get(str(task))
+            if counters is None:
+                counters = self._tasks[str(task)] = dict.fromkeys(TASK_COUNTERS, 0)
+            for k, v in delta.items():
+                counters[k] += v
+
+    def record_task_failure(self, task: Any) -> None:
+        """整轮执行失败（查列表出错、未登录等）。"""
+        with self._lock:
+            self._task_failures[str(task)] = self._task_failures.get(str(task), 0) + 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._endpoints.clear()
+            self._tasks.clear()
+            self._task_failures.clear()
+
+    # ------------------------- 输出 -------------------------
+
+    def snapshot(self) -> Dict[str, Any]:
+        """
+        JSON 形式的当前指标：
+        {"endpoints": {名称: {"count", "sumSeconds", "p50Ms", "p95Ms", "p99Ms", "statuses", "subCodes", "timeouts", "coalesced", "rejected"}},
+         "tasks": {任务: {"attempts", "wins", "losses", "errors", "quoted", "quoteFailed", "failures", "winRate"}}}
+        """
+        with self._lock:
+            endpoints: Dict[str, Any] = {}
+            for name, ep in sorted(self._endpoints.items()):
+                h = ep.latency
+                endpoints[name] = {
+                    "count": h.count,
+                    "sumSeconds": round(h.sum, 6),
+                    "p50Ms": _ms(h.quantile(0.5)),
+                    "p95Ms": _ms(h.quantile(0.95)),
+                    "p99Ms": _ms(h.quantile(0.99)),
+                    "statuses": dict(ep.statuses),
+                    "subCodes": dict(ep.sub_codes),
+                    "timeouts": ep.timeouts,
+                    "coalesced": dict(ep.coalesced),
+                    "rejected": dict(ep.rejected),
+                }
+            tasks: Dict[str, Any] = {}
+            for name in sorted(set(self._tasks) | set(self._task_failures)):
+                counters = dict(self._tasks.get(name) or dict.fromkeys(TASK_COUNTERS, 0))
+                counters["failures"] = self._task_failures.get(name, 0)
+                decided = counters["wins"] + counters["losses"]
+                counters["winRate"] = round(counters["wins"] / decided, 4) if decided else None
+                tasks[name] = counters
+        return {"endpoints": endpoints, "tasks": tasks}
+
+    def render_prometheus(self) -> str:
+        """Prometheus 文本格式（text/plain; version=0.0.4）。"""
+        lines: List[str] = []
+        with self._lock:
+            endpoints = sorted(self._endpoints.items())
+            lines.append("# HELP haihuishou_upstream_request_seconds 上游接口请求耗时")
+            lines.append("# TYPE haihuishou_upstream_request_seconds histogram")
+            for name, ep in endpoints:
+                h = ep.latency
+                cumulative = 0
+                for i, n in enumerate(h.counts):
+                    cumulative += n
+                    le = "+Inf" if i >= len(h.bounds) else repr(h.bounds[i])
+                    lines.append(
+                        'haihuishou_upstream_request_seconds_bucket{endpoint="%s",le="%s"} %d' % (_label(name), le, cumulative)
+                    )
+                lines.append('haihuishou_upstream_request_seconds_sum{endpoint="%s"} %.6f' % (_label(name), h.sum))
+                lines.append('haihuishou_upstream_request_seconds_count{endpoint="%s"} %d' % (_label(name), h.count))
+            lines.append("# HELP haihuishou_upstream_responses_total 上游接口响应数（按 HTTP 状态）")
+            lines.append("# TYPE haihuishou_upstream_responses_total counter")
+            for name, ep in endpoints:
+                for status, n in sorted(ep.statuses.items()):
+                    lines.append(
+                        'haihuishou_upstream_responses_total{endpoint="%s",status="%s"} %d' % (_label(name), _label(status), n)
+                    )
+            lines.append("# HELP haihuishou_upstream_subcode_total 上游接口业务 subCode 计数")
+            lines.append("# TYPE haihuishou_upstream_subcode_total counter")
+            for name, ep in endpoints:
+                for code, n in sorted(ep.sub_codes.items()):
+                    lines.append(
+                        'haihuishou_upstream_subcode_total{endpoint="%s",subcode="%s"} %d' % (_label(name), _label(code), n)
+                    )
+            lines.append("# HELP haihuishou_upstream_timeouts_total 上游接口超时次数")
+            lines.append("# TYPE haihuishou_upstream_timeouts_total counter")
+            for name, ep in endpoints:
+                lines.append('haihuishou_upstream_timeouts_total{endpoint="%s"} %d' % (_label(name), ep.timeouts))
+            lines.append("# HELP haihuishou_upstream_coalesced_total 未发出请求的调用（合并到进行中的查询或命中微缓存）")
+            lines.append("# TYPE haihuishou_upstream_coalesced_total counter")
+            for name, ep in endpoints:
+                for kind, n in sorted(ep.coalesced.items()):
+                    lines.append(
+                        'haihuishou_upstream_coalesced_total{endpoint="%s",kind="%s"} %d' % (_label(name), _label(kind), n)
+                    )
+            lines.append("# HELP haihuishou_upstream_rejected_total 未发出的请求（截止时间已到或熔断中）")
+            lines.append("# TYPE haihuishou_upstream_rejected_total counter")
+            for name, ep in endpoints:
+                for reason, n in sorted(ep.rejected.items()):
+                    lines.append(
+                        'haihuishou_upstream_rejected_total{endpoint="%s",reason="%s"} %d' % (_label(name), _label(reason), n)
+                    )
+            for key in TASK_COUNTERS:
+                metric = "haihuishou_task_%s_total" % _snake(key)
+                lines.append("# TYPE %s counter" % metric)
+                for task, counters in sorted(self._tasks.items()):
+                    lines.append('%s{task="%s"} %d' % (metric, _label(task), counters[key]))
+            lines.append("# TYPE haihuishou_task_failures_total counter")
+            for task, n in sorted(self._task_failures.items()):
+                lines.append('haihuishou_task_failures_total{task="%s"} %d' % (_label(task), n))
+        return "\n".join(lines) + "\n"
+
+
+def format_snapshot(snapshot: Dict[str, Any]) -> str:
+    """把 snapshot() 的结果排成便于终端阅读的表格（命令行 stats 使用）。"""
+    lines = ["%-22s %7s %9s %9s %9s %6s  %s" % ("接口", "次数", "p50(ms)", "p95(ms)", "p99(ms)", "超时", "状态码 / subCode")]
+    for name, ep in (snapshot.get("endpoints") or {}).items():
+        codes = " ".join("%s:%d" % kv for kv in sorted(ep["statuses"].items()))
+        if ep["subCodes"]:
+            codes += " | " + " ".join("%s:%d" % kv for kv in sorted(ep["subCodes"].items()))
+        if ep.get("coalesced"):
+            codes += " | 合并 " + " ".join("%s:%d" % kv for kv in sorted(ep["coalesced"].items()))
+        if ep.get("rejected"):
+            codes += " | 未发出 " + " ".join("%s:%d" % kv for kv in sorted(ep["rejected"].items()))
+        lines.append(
+            "%-22s %7d %9s %9s %9s %6d  %s"
+            % (name, ep["count"], _fmt(ep["p50Ms"]), _fmt(ep["p95Ms"]), _fmt(ep["p99Ms"]), ep["timeouts"], codes)
+        )
+    tasks = snapshot.get("tasks") or {}
+    if tasks:
+        lines.append("")
+        lines.append("%-12s %7s %6s %8s %6s %6s %8s %6s %8s" % ("任务", "抢单", "抢到", "被抢走", "异常", "报价", "报价失败", "失败轮", "成功率"))
+        for name, t in tasks.items():
+            rate = "-" if t["winRate"] is None else "%.1f%%" % (t["winRate"] * 100)
+            lines.append(
+                "%-12s %7d %6d %8d %6d %6d %8d %6d %8s"
+                % (name, t["attempts"], t["wins"], t["losses"], t["errors"], t["quoted"], t["quoteFailed"], t["failures"], rate)
+            )
+    tripped = {name: b for name, b in (snapshot.get("breakers") or {}).items() if b["state"] != "closed"}
+    if tripped:
+        lines.append("")
+        for name, b in tripped.items():
+            lines.append("熔断 %-17s %s，%.1f 秒后探测（累计打开 %d 次）" % (name, b["state"], b["retryAfter"], b["opened"]))
+    return "\n".join(lines)
+
+
+def _fmt(value: Optional[float]) -> str:
+    return "-" if value is None else "%.1f" % value
+
+
+def _ms(seconds: Optional[float]) -> Optional[float]:
+    return round(seconds * 1000, 2) if seconds is not None else None
+
+
+def _snake(name: str) -> str:
+    return "".join("_" + c.lower() if c.isupper() else c for c in name)
+
+
+# 进程内共用的指标登记表
+METRICS = MetricsRegistry()
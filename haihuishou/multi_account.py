@@ -0,0 +1,282 @@
+# -*- coding: utf-8 -*-
+"""
+多账号抢单：多个已登录账号共用一次订单列表查询，按策略把每条订单分给其中一个账号去抢，
+抢到后由该账号自己报价。每个账号有独立的线程池，某个账号变慢不会拖住其他账号。
+"""
+
+import itertools
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor, wait
+from typing import Any, Dict, List, Optional
+
+from .api import HaihuishouAPI
+from .grab_tool import DRAIN_MAX_GRABS, GrabCondition, GrabOrderTool, QuotePricer, _task_summary
+from .history import HistoryStore
+from .metrics import METRICS
+from .orders import ORDER_LIST, OrderRecord, SeenOrderIndex
+
+# 分单策略：轮流、按配额（剩余配额多的优先，用完不再分）、均衡（在途与已抢最少的优先）
+POLICIES = ("round_robin", "quota", "balance")
+
+
+class _Account:
+    """单个账号的工具、线程池与统计。"""
+
+    def __init__(self, tool: GrabOrderTool, quota: Optional[int], workers: int):
+        self.tool = tool
+        self.quota = quota
+        self.workers = max(1, workers)
+        self.pool = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="haihuishou-acct")
+        self.in_flight = 0
+        self.attempts = 0
+        self.grabbed = 0
+        self.quoted = 0
+        self.errors = 0
+
+    @property
+    def user_id(self) -> Optional[str]:
+        return self.tool.api.user_id
+
+    def available(self) -> bool:
+        """配额未用完且线程池有空闲（忙满说明该账号请求变慢，先分给别的账号）。"""
+        if self.quota is not None and self.grabbed + self.in_flight >= self.quota:
+            return False
+        return self.in_flight < self.workers
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "userId": self.user_id,
+            "quota": self.quota,
+            "attempts": self.attempts,
+            "grabbed": self.grabbed,
+            "quoted": self.quoted,
+            "errors": self.errors,
+            "inFlight": self.in_flight,
+        }
+
+
+class MultiAccountEngine:
+    """
+    多账号抢单引擎：
+        engine = MultiAccountEngine(policy="quota")
+        engine.add_account(api1, quota=20)
+        engine.add_account(api2, quota=10)
+        engine.run(cond, quote_amount="10", frequency=1)
+    每轮只用一个账号查订单列表（依次轮换，出错时换下一个账号），订单按 policy 分给各账号抢单并报价。
+    传入 history 时订单、每单结果与每轮汇总写入历史记录（任务标识为 multi）。
+    """
+
+    def __init__(
+        self,
+        policy: str = "round_robin",
+        workers_per_account: int = 8,
+        seen: Optional[SeenOrderIndex] = None,
+        history: Optional[HistoryStore] = None,
+    ):
+        if policy not in POLICIES:
+            raise ValueError("分单策略须为 %s 之一" % " / ".join(POLICIES))
+        self.policy = policy
+        self.workers_per_account = workers_per_account
+        self.seen = seen if seen is not None else SeenOrderIndex()
+        self.history = history
+        self._accounts: List[_Account] = []
+        self._lock = threading.Lock()
+        self._rr = itertools.count()
+        self._feed = itertools.count()
+        # 上一轮没等到结果的抢单（账号变慢），结果计入之后的轮次
+        self._pending: List[Future] = []
+        self._in_flight_ids: set = set()
+
+    def add_account(self, api: HaihuishouAPI, quota: Optional[int] = None, workers: Optional[int] = None) -> None:
+        """添加已登录的账号；quota 为本引擎运行期间该账号最多抢单数（policy=quota 时生效，None 表示不限）。"""
+        if not api.token or not api.user_id:
+            raise ValueError("账号需先登录")
+        tool = GrabOrderTool(api=api, seen=self.seen, history=self.history)
+        with self._lock:
+            self._accounts.append(_Account(tool, quota, workers or self.workers_per_account))
+
+    @property
+    def accounts(self) -> List[Dict[str, Any]]:
+        with self._lock:
+            return [a.stats() for a in self._accounts]
+
+    def close(self) -> None:
+        with self._lock:
+            accounts = list(self._accounts)
+        for acct in accounts:
+            acct.pool.shutdown(wait=True)
+
+    # ------------------------- 分单 -------------------------
+
+    def _pick(self) -> Optional[_Account]:
+        """按策略选一个可用账号，没有可用账号时返回 None。调用方需持有 _lock。"""
+        candidates = [a for a in self._accounts if a.available()]
+        if not candidates:
+            return None
+        if self.policy == "round_robin":
+            n = len(self._accounts)
+            start = next(self._rr) % n
+            for i in range(n):
+                acct = self._accounts[(start + i) % n]
+                if acct.available():
+                    return acct
+            return None
+        if self.policy == "quota":
+            # 剩余配额多的优先；不限配额的账号排在最后兜底
+            return max(
+                candidates,
+                key=lambda a: (a.quota is not None, (a.quota or 0) - a.grabbed - a.in_flight),
+            )
+        return min(candidates, key=lambda a: (a.in_flight, a.grabbed))
+
+    def _attempt(self, acct: _Account, rec: OrderRecord, quote_amount: str, remark: str) -> Dict[str, Any]:
+        """抢单并报价；任何异常都转成该订单结果里的 error（计入 acct.errors），不影响同一轮其他订单的汇总。"""
+        res: Optional[Dict[str, Any]] = None
+        try:
+            res = acct.tool.grab_and_quote(rec.record_id, rec.order_id, quote_amount, remark=remark)
+            self.seen.mark_result(rec, res)
+            if self.history is not None:
+                self.history.record_attempt(res, acct.user_id, "multi")
+        except Exception as e:
+            if res is None:
+                res = {
+                    "recordId": rec.record_id,
+                    "orderId": rec.order_id,
+                    "grabbed": False,
+                    "quoted": False,
+                    "subCode": None,
+                    "grabMs": None,
+                    "quoteMs": None,
+                    "error": "recordId=%s: %s" % (rec.record_id, e),
+                }
+            elif not res.get("error"):
+                # 抢单结果已拿到，只是记录失败：保留 grabbed / quoted
+                res["error"] = "recordId=%s 记录结果失败: %s" % (rec.record_id, e)
+        finally:
+            with self._lock:
+                acct.in_flight -= 1
+                self._in_flight_ids.discard(rec.record_id)
+        with self._lock:
+            acct.grabbed += 1 if res["grabbed"] else 0
+            acct.quoted += 1 if res["quoted"] else 0
+            acct.errors += 1 if res["error"] and res["subCode"] != 200 else 0
+        res["userId"] = acct.user_id
+        res["actualPrice"] = quote_amount
+        return res
+
+    # ------------------------- 执行 -------------------------
+
+    def _feed_rows(self, condition: GrabCondition) -> List[Dict[str, Any]]:
+        """用一个账号查订单列表（每轮换一个账号，分摊查询）；该账号出错时依次换下一个。"""
+        with self._lock:
+            accounts = list(self._accounts)
+        if not accounts:
+            raise RuntimeError("请先添加账号")
+        start = next(self._feed) % len(accounts)
+        last_error: Optional[Exception] = None
+        for i in range(len(accounts)):
+            tool = accounts[(start + i) % len(accounts)].tool
+            try:
+                return ORDER_LIST.rows(tool.step4_order_list(condition, fresh=True))
+            except Exception as e:
+                last_error = e
+        raise RuntimeError("所有账号查询订单列表均失败: %s" % last_error)
+
+    def execute_once(
+        self,
+        condition: GrabCondition,
+        quote_amount: Optional[str],
+        remark: str = "",
+        max_grabs: int = DRAIN_MAX_GRABS,
+        timeout: Optional[float] = None,
+        pricer: Optional[QuotePricer] = None,
+    ) -> Dict[str, Any]:
+        """
+        执行一轮：查一次订单列表，把未抢过的订单按策略分给各账号并发抢单并报价。
+        pricer 同 GrabOrderTool.execute_task：按规则定价，判定不抢的订单计入 unpriced，不占用账号。
+        所有账号都忙或配额用完时，剩余订单留到下一轮。最多等 timeout 秒，没返回的抢单继续在该账号线程里执行，
+        结果计入之后的轮次（该账号忙满前不会再分到订单）。返回同 execute_task 的汇总，orders 中带 userId。
+        """
+        if pricer is None:
+            pricer = QuotePricer(default=quote_amount)
+        rows = self._feed_rows(condition)
+        jobs: List[Future] = []
+        skipped = 0
+        unpriced = 0
+        for rec in ORDER_LIST.records(rows, keep_raw=False):
+            if len(jobs) >= max_grabs:
+                break
+            if self.seen.should_skip(rec.record_id):
+                skipped += 1
+                continue
+            amount = pricer.price(rec)
+            if amount is None:
+                unpriced += 1
+                continue
+            with self._lock:
+                if rec.record_id in self._in_flight_ids:
+                    skipped += 1
+                    continue
+                acct = self._pick()
+                if acct is None:
+                    break
+                self._in_flight_ids.add(rec.record_id)
+                acct.in_flight += 1
+                acct.attempts += 1
+            jobs.append(acct.pool.submit(self._attempt, acct, rec, amount, remark))
+        with self._lock:
+            jobs = self._pending + jobs
+            self._pending = []
+        done, not_done = wait(jobs, timeout=timeout)
+        with self._lock:
+            self._pending.extend(not_done)
+        orders = [f.result() for f in jobs if f in done]
+        summary = _task_summary(len(rows), orders, skipped, unpriced)
+        METRICS.record_task("multi", summary)
+        if self.history is not None:
+            self.history.record_run("multi", summary=summary)
+        return summary
+
+    def run(
+        self,
+        condition: GrabCondition,
+        quote_amount: Optional[str],
+        frequency: float = 1.0,
+        remark: str = "",
+        max_grabs: int = DRAIN_MAX_GRABS,
+        stop: Optional[threading.Event] = None,
+        max_runs: Optional[int] = None,
+        on_result: Optional[Any] = None,
+        pricer: Optional[QuotePricer] = None,
+    ) -> Dict[str, int]:
+        """
+        按 frequency（秒/次）循环执行 execute_once，直到 stop 被设置、执行满 max_runs 次或全部账号配额用完。
+        pricer 为报价规则（只编译一次，各轮共用）。on_result(summary 或 Exception) 在每轮结束后回调。返回累计 {"runs", "grabbed", "quoted"}。
+        """
+        stop = stop or threading.Event()
+        if pricer is None:
+            pricer = QuotePricer(default=quote_amount)
+        totals = {"runs": 0, "grabbed": 0, "quoted": 0}
+        while not stop.is_set():
+            started = time.monotonic()
+            try:
+                summary = self.execute_once(
+                    condition, quote_amount, remark=remark, max_grabs=max_grabs, timeout=frequency, pricer=pricer
+                )
+                totals["grabbed"] += summary["grabbed"]
+                totals["quoted"] += summary["quoted"]
+                if on_result is not None:
+                    on_result(summary)
+            except Exception as e:
+                if on_result is not None:
+                    on_result(e)
+            totals["runs"] += 1
+            if max_runs is not None and totals["runs"] >= max_runs:
+                break
+            with self._lock:
+                exhausted = all(a.quota is not None and a.grabbed >= a.quota for a in self._accounts)
+            if exhausted:
+                break
+            stop.wait(max(0.0, frequency - (time.monotonic() - started)))
+        return totals
@@ -0,0 +1,249 @@
+# -*- coding: utf-8 -*-
+"""
+订单推送：Web UI 的实时订单列表（SSE）由服务端轮询后推送。同一账号、同一查询条件（含页码）只有一个轮询线程，
+不管打开多少个页面，对方接口的查询次数只取决于不同条件的个数；每轮只把新增、消失、变化的订单与总数推给订阅者。
+轮询共用该账号的令牌桶（见 pacing.AccountLimiter），间隔按结果自适应（有新订单时加快，出错时退避）。
+"""
+
+import json
+import queue
+import threading
+import time
+from dataclasses import asdict
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from .grab_tool import GrabCondition, GrabOrderTool
+from .orders import ORDER_LIST
+from .pacing import AccountLimiter, AdaptivePacer
+
+# 默认轮询间隔（秒）
+DEFAULT_FEED_INTERVAL = 2.0
+# 每个订阅者最多积压的事件数，超过后清空并改发一次全量
+SUBSCRIBER_BACKLOG = 64
+
+
+def _fingerprint(row: Dict[str, Any]) -> str:
+    """订单内容指纹（不含倒计时，倒计时由页面自己走）。"""
+    return json.dumps({k: v for k, v in row.items() if k != "countdown"}, sort_keys=True, ensure_ascii=False, default=str)
+
+
+class FeedSubscription:
+    """一个页面的订阅。get() 取下一个事件（超时返回 None），页面断开时 close()。"""
+
+    def __init__(self, poller: "_ConditionPoller"):
+        self._poller = poller
+        self._queue: "queue.Queue[Dict[str, Any]]" = queue.Queue(maxsize=SUBSCRIBER_BACKLOG)
+        self.closed = False
+
+    def _put(self, event: Dict[str, Any]) -> None:
+        try:
+            self._queue.put_nowait(event)
+        except queue.Full:
+            # 页面跟不上：丢掉积压的增量，改发一次全量
+            while True:
+                try:
+                    self._queue.get_nowait()
+                except queue.Empty:
+                    break
+            self._queue.put_nowait(self._poller.snapshot_event())
+
+    def get(self, timeout: Optional[float] = None) -> Optional[Dict[str, Any]]:
+        try:
+            return self._queue.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+    def close(self) -> None:
+        if not self.closed:
+            self.closed = True
+            self._poller.unsubscribe(self)
+
+
+class _ConditionPoller:
+    """单个（账号, 条件, 页码）的轮询线程：没有订阅者时自动退出。"""
+
+    def __init__(
+        self,
+        hub: "OrderFeedHub",
+        key: str,
+        token: str,
+        user_id: str,
+        condition: GrabCondition,
+        page_index: int,
+    ):
+        self.hub = hub
+        self.key = key
+        self.token = token
+        self.user_id = user_id
+        self.condition = condition
+        self.page_index = page_index
+        self.pacer = AdaptivePacer(hub.interval)
+        self.polls = 0
+        self._subscribers: List[FeedSubscription] = []
+        # recordId -> (指纹, 订单行)，保持列表顺序
+        self._rows: Dict[Any, Tuple[str, Dict[str, Any]]] = {}
+        self._total: Optional[int] = None
+        self._ready = False
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="haihuishou-feed", daemon=True)
+
+    # ------------------------- 订阅 -------------------------
+
+    def subscribe(self, token: str) -> FeedSubscription:
+        sub = FeedSubscription(self)
+        with self._lock:
+            self.token = token  # 用最新登录的 token
+            self._subscribers.append(sub)
+            ready = self._ready
+        if ready:
+            sub._put(self.snapshot_event())
+        return sub
+
+    def unsubscribe(self, sub: FeedSubscription) -> None:
+        with self._lock:
+            if sub in self._subscribers:
+                self._subscribers.remove(sub)
+            idle = not self._subscribers
+        if idle:
+            self.hub._release(self)
+
+    def subscriber_count(self) -> int:
+        with self._lock:
+            return len(self._subscribers)
+
+    def snapshot_event(self) -> Dict[str, Any]:
+        with self._lock:
+            return {"type": "snapshot", "orders": [row for _, row in self._rows.values()], "total": self._total}
+
+    def _broadcast(self, event: Dict[str, Any]) -> None:
+        with self._lock:
+            subs = list(self._subscribers)
+        for sub in subs:
+            sub._put(event)
+
+    # ------------------------- 轮询 -------------------------
+
+    def start(self) -> None:
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+
+    def _fetch(self) -> Tuple[List[Dict[str, Any]], Optional[int]]:
+        tool = self.hub.tool_factory(self.token, self.user_id)
+        return ORDER_LIST.parse(tool.step4_order_list(self.condition, page_index=self.page_index, user_id=self.user_id))
+
+    def _diff(self, rows: List[Dict[str, Any]], total: Optional[int]) -> Optional[Dict[str, Any]]:
+        """与上一轮比较，更新状态；有变化时返回增量事件。首轮返回全量事件。"""
+        fresh: Dict[Any, Tuple[str, Dict[str, Any]]] = {}
+        for row in rows:
+            rid = ORDER_LIST.ids(row)[0]
+            fp = _fingerprint(row)
+            fresh[rid if rid is not None else fp] = (fp, row)
+        with self._lock:
+            old = self._rows
+            first = not self._ready
+            self._rows = fresh
+            self._ready = True
+            total_changed = total != self._total
+            self._total = total
+        if first:
+            return {"type": "snapshot", "orders": [row for _, row in fresh.values()], "total": total}
+        added = [row for k, (fp, row) in fresh.items() if k not in old]
+        changed = [row for k, (fp, row) in fresh.items() if k in old and old[k][0] != fp]
+        removed = [k for k in old if k not in fresh]
+        if not (added or changed or removed or total_changed):
+            return None
+        return {"type": "diff", "added": added, "changed": changed, "removed": removed, "total": total}
+
+    def _run(self) -> None:
+        bucket = self.hub.limiter.bucket(self.user_id)
+        while not self._stop.is_set():
+            if not bucket.acquire(self._stop):
+                return
+            started = time.monotonic()
+            error: Optional[str] = None
+            event: Optional[Dict[str, Any]] = None
+            try:
+                rows, total = self._fetch()
+                event = self._diff(rows, total)
+            except Exception as e:
+                error = str(e)
+            self.polls += 1
+            if error is not None:
+                self._broadcast({"type": "feed-error", "message": error})
+            elif event is not None:
+                self._broadcast(event)
+            elapsed = time.monotonic() - started
+            # 只有增量里的新订单才让轮询加快；首轮全量不算
+            added = event["added"] if event is not None and event["type"] == "diff" else []
+            interval = self.pacer.on_result(
+                {"records": [ORDER_LIST.ids(r)[0] for r in added]}, elapsed, error=error is not None
+            )
+            if self._stop.wait(max(0.0, interval - elapsed)):
+                return
+
+
+class OrderFeedHub:
+    """
+    订单推送中心：subscribe(token, user_id, condition, page_index) 返回订阅；
+    同一 (userId, 条件, 页码) 共用一个轮询线程，最后一个订阅者离开时线程退出。
+    tool_factory(token, user_id) 返回该账号的 GrabOrderTool。
+    """
+
+    def __init__(
+        self,
+        tool_factory: Callable[[str, str], GrabOrderTool],
+        limiter: Optional[AccountLimiter] = None,
+        interval: float = DEFAULT_FEED_INTERVAL,
+    ):
+        self.tool_factory = tool_factory
+        self.limiter = limiter or AccountLimiter()
+        self.interval = interval
+        self._pollers: Dict[str, _ConditionPoller] = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def key(user_id: Any, condition: GrabCondition, page_index: int) -> str:
+        return json.dumps([str(user_id), asdict(condition), page_index], sort_keys=True, ensure_ascii=False)
+
+    def subscribe(self, token: str, user_id: Any, condition: GrabCondition, page_index: int = 1) -> FeedSubscription:
+        key = self.key(user_id, condition, page_index)
+        with self._lock:
+            poller = self._pollers.get(key)
+            if poller is None:
+                poller = self._pollers[key] = _ConditionPoller(self, key, token, str(user_id), condition, page_index)
+                poller.start()
+            # 在 hub 锁内订阅，避免与最后一个订阅者离开时的回收交错
+            return poller.subscribe(token)
+
+    def _release(self, poller: _ConditionPoller) -> None:
+        with self._lock:
+            if poller.subscriber_count() == 0 and self._pollers.get(poller.key) is poller:
+                del self._pollers[poller.key]
+                poller.stop()
+
+    def stats(self) -> List[Dict[str, Any]]:
+        """各轮询线程的订阅数、已轮询次数与当前间隔。"""
+        with self._lock:
+            pollers = list(self._pollers.values())
+        return [
+            {
+                "userId": p.user_id,
+                "pageIndex": p.page_index,
+                "subscribers": p.subscriber_count(),
+                "polls": p.polls,
+                "interval": round(p.pacer.interval, 2),
+            }
+            for p in pollers
+        ]
+
+    def close(self) -> None:
+        """停止全部轮询，并给所有订阅者发 shutdown 事件（服务退出时结束推送连接）。"""
+        with self._lock:
+            pollers = list(self._pollers.values())
+            self._pollers.clear()
+        for p in pollers:
+            p.stop()
+            p._broadcast({"type": "shutdown"})
@@ -0,0 +1,426 @@
+# -*- coding: utf-8 -*-
+"""
+订单列表解析：gethsdorderlist 出参结构统一识别一次并缓存，行数据转成紧凑的 OrderRecord；
+大页用 OrderStreamDecoder 边收边解析，首条订单不必等整页下载、解码完。
+SeenOrderIndex 记录已抢过的订单结果，定时任务每轮跳过已被抢 / 已抢到的订单。
+"""
+
+import codecs
+import json
+import re
+import threading
+import time
+from array import array
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+# 订单列表可能出现的位置（按优先级），data.result.orderList 为正式出参
+_LIST_PATHS: Tuple[Tuple[str, ...], ...] = (
+    ("result", "orderList"),
+    ("list",),
+    ("orderList",),
+    ("results",),
+    ("records",),
+    ("rows",),
+    ("items",),
+    ("data",),
+    ("data", "result", "orderList"),
+    ("data", "list"),
+    ("data", "orderList"),
+    ("data", "results"),
+)
+RECORD_ID_KEYS = ("recordId", "grabOrderId", "productId", "id")
+ORDER_ID_KEYS = ("orderId", "orderNo", "orderSn")
+
+
+def _to_float(value: Any) -> Optional[float]:
+    if value is None or value == "":
+        return None
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def _page_total(result: Any) -> Optional[int]:
+    """data.pageCount（接口用它表示列表总数）或 totalCount，都没有时返回 None。"""
+    if not isinstance(result, dict):
+        return None
+    total = result.get("pageCount") or result.get("totalCount")
+    if total is None and isinstance(result.get("data"), dict):
+        total = result["data"].get("pageCount") or result["data"].get("totalCount")
+    try:
+        return int(total) if total is not None else None
+    except (TypeError, ValueError):
+        return None
+
+
+def _to_int(value: Any) -> Optional[int]:
+    if value is None or value == "":
+        return None
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+class OrderRecord:
+    """
+    一条待抢订单的关键字段。price 为预估金额（apprizeAmount），category / brand_id 为分类与品牌 id（catId / brandId），
+    countdown 为剩余秒数，raw 为原始行（页面展示需要全部字段；只做抢单时可不保留）。
+    """
+
+    __slots__ = ("record_id", "order_id", "price", "brand", "manufacturer", "category", "brand_id", "countdown", "raw")
+
+    def __init__(
+        self,
+        record_id: Any,
+        order_id: Any,
+        price: Optional[float] = None,
+        brand: str = "",
+        manufacturer: str = "",
+        countdown: Optional[int] = None,
+        raw: Optional[Dict[str, Any]] = None,
+        category: str = "",
+        brand_id: str = "",
+    ):
+        self.record_id = record_id
+        self.order_id = order_id
+        self.price = price
+        self.brand = brand
+        self.manufacturer = manufacturer
+        self.category = category
+        self.brand_id = brand_id
+        self.countdown = countdown
+        self.raw = raw
+
+    def __repr__(self) -> str:
+        return "OrderRecord(record_id=%r, order_id=%r, price=%r, brand=%r, manufacturer=%r, category=%r, countdown=%r)" % (
+            self.record_id,
+            self.order_id,
+            self.price,
+            self.brand,
+            self.manufacturer,
+            self.category,
+            self.countdown,
+        )
+
+
+class OrderListNormalizer:
+    """
+    识别订单列表出参结构并缓存：首次按 _LIST_PATHS 逐个查找，之后先走上次命中的路径；
+    行内的 recordId / orderId 字段名同样按首行识别后缓存。
+    """
+
+    def __init__(self) -> None:
+        self._path: Optional[Tuple[str, ...]] = None
+        self._record_key: Optional[str] = None
+        self._order_key: Optional[str] = None
+
+    @staticmethod
+    def _follow(result: Any, path: Tuple[str, ...]) -> Any:
+        node = result
+        for key in path:
+            if not isinstance(node, dict):
+                return None
+            node = node.get(key)
+        return node
+
+    def rows(self, result: Any) -> List[Dict[str, Any]]:
+        """取订单行列表，找不到时返回空列表。"""
+        if isinstance(result, list):
+            return result
+        if not isinstance(result, dict):
+            return []
+        path = self._path
+        if path is not None:
+            lst = self._follow(result, path)
+            if isinstance(lst, list):
+                return lst
+        for path in _LIST_PATHS:
+            lst = self._follow(result, path)
+            if isinstance(lst, list) and lst:
+                self._path = path
+                return lst
+        # 只找到空列表时不缓存路径，下次有数据时再确认结构
+        return []
+
+    def parse(self, result: Any) -> Tuple[List[Dict[str, Any]], int]:
+        """返回 (订单行, 列表总数)；出参没有总数时为本页条数。"""
+        rows = self.rows(result)
+        total = _page_total(result)
+        return rows, total if total is not None else len(rows)
+
+    def ids(self, row: Dict[str, Any]) -> Tuple[Any, Any]:
+        """取 (recordId, orderId)，字段名按首次命中缓存；不是对象的行返回 (None, None)。"""
+        if not isinstance(row, dict):
+            return None, None
+        rk, ok = self._record_key, self._order_key
+        record_id = row.get(rk) if rk is not None else None
+        if record_id is None or record_id == "":
+            record_id = None
+            for key in RECORD_ID_KEYS:
+                value = row.get(key)
+                if value is not None and value != "":
+                    record_id = value
+                    self._record_key = key
+                    break
+        order_id = row.get(ok) if ok is not None else None
+        if order_id is None or order_id == "":
+            order_id = None
+            for key in ORDER_ID_KEYS:
+                value = row.get(key)
+                if value is not None and value != "":
+                    order_id = value
+                    self._order_key = key
+                    break
+        return record_id, order_id
+
+    def record(self, row: Dict[str, Any], keep_raw: bool = True) -> Optional[OrderRecord]:
+        """单行转 OrderRecord；不是对象、缺少 recordId / orderId 的行返回 None。"""
+        if not isinstance(row, dict):
+            return None
+        record_id, order_id = self.ids(row)
+        if record_id is None or order_id is None:
+            return None
+        return OrderRecord(
+            record_id,
+            order_id,
+            price=_to_float(row.get("apprizeAmount", row.get("apprize_amount"))),
+            brand=row.get("brandName") or row.get("brand") or "",
+            manufacturer=row.get("subOrderSourceName") or "",
+            countdown=_to_int(row.get("countdown")),
+            raw=row if keep_raw else None,
+            category=str(row.get("catId") or row.get("categoryId") or ""),
+            brand_id=str(row.get("brandId") or ""),
+        )
+
+    def records(self, rows: Iterable[Dict[str, Any]], keep_raw: bool = True) -> Iterator[OrderRecord]:
+        for row in rows:
+            rec = self.record(row, keep_raw=keep_raw)
+            if rec is not None:
+                yield rec
+
+
+# 全局共享的解析器（结构缓存对同一接口的所有调用有效）
+ORDER_LIST = OrderListNormalizer()
+
+# 流式解析只认这些位置的数组：_LIST_PATHS 相对 data，整个响应体再加一层 data
+_STREAM_PATHS = frozenset(_LIST_PATHS) | frozenset(("data",) + p for p in _LIST_PATHS)
+_STRING = re.compile(r'"(?:[^"\\]|\\.)*"')
+_SKIP = " \t\r\n,"
+
+
+class OrderStreamDecoder:
+    """
+    增量解析订单列表 JSON：feed() 传入文本片段，返回本次新解析出的完整订单行；
+    只保留尚未解析完的一条订单文本，内存不随页大小增长。close() 返回去掉订单列表后的外层结构
+    （code / message / pageCount 等）。
+    列表起点按键路径定位（data.result.orderList 等，见 _STREAM_PATHS），不会误取其他位置同名的数组；
+    列表内不是对象的元素跳过。
+    """
+
+    def __init__(self) -> None:
+        self._buf = ""
+        self._state = 0  # 0: 查找列表起点  1: 列表内  2: 列表已结束
+        self._prefix = ""
+        self._decoder = json.JSONDecoder()
+        # 查找列表起点时的扫描状态：已扫描到的位置、外层容器栈（[类型, 当前键]）、下一个字符串是否为键
+        self._scan = 0
+        self._stack: List[List[Any]] = []
+        self._expect_key = False
+
+    def _find_list(self) -> int:
+        """从上次停下的位置继续扫描，返回订单列表 "[" 之后的位置；尚未出现时返回 -1。"""
+        buf = self._buf
+        pos = self._scan
+        n = len(buf)
+        stack = self._stack
+        while pos < n:
+            c = buf[pos]
+            if c == '"':
+                m = _STRING.match(buf, pos)
+                if m is None:
+                    break  # 字符串还没收全
+                if self._expect_key and stack and stack[-1][0] == "o":
+                    stack[-1][1] = json.loads(m.group())
+                    self._expect_key = False
+                pos = m.end()
+                continue
+            if c == "{":
+                stack.append(["o", None])
+                self._expect_key = True
+            elif c == "[":
+                if stack and all(kind == "o" for kind, _ in stack):
+                    if tuple(key for _, key in stack) in _STREAM_PATHS:
+                        self._scan = pos + 1
+                        return pos + 1
+                stack.append(["a", None])
+                self._expect_key = False
+            elif c in "}]":
+                if stack:
+                    stack.pop()
+                self._expect_key = False
+            elif c == ",":
+                self._expect_key = bool(stack) and stack[-1][0] == "o"
+            pos += 1
+        self._scan = pos
+        return -1
+
+    def feed(self, text: str) -> List[Dict[str, Any]]:
+        self._buf += text
+        if self._state == 0:
+            end = self._find_list()
+            if end < 0:
+                return []
+            self._prefix = self._buf[: end - 1]
+            self._buf = self._buf[end:]
+            self._state = 1
+        if self._state != 1:
+            return []
+        out = []
+        buf = self._buf
+        pos = 0
+        n = len(buf)
+        while True:
+            while pos < n and buf[pos] in _SKIP:
+                pos += 1
+            if pos >= n:
+                break
+            if buf[pos] == "]":
+                self._state = 2
+                pos += 1
+                break
+            try:
+                row, pos = self._decoder.raw_decode(buf, pos)
+            except ValueError:
+                break  # 这一条还没收全
+            if isinstance(row, dict):
+                out.append(row)
+        self._buf = buf[pos:]
+        return out
+
+    def close(self) -> Dict[str, Any]:
+        """输入结束，返回外层结构；列表未闭合或 JSON 不完整时抛 ValueError。"""
+        if self._state == 1:
+            raise ValueError("订单列表 JSON 不完整")
+        text = self._buf if self._state == 0 else self._prefix + "[]" + self._buf
+        if not text.strip():
+            return {}
+        return json.loads(text)
+
+
+class OrderListStream:
+    """
+    流式订单列表：迭代得到订单行（边下载边解析），迭代结束后 envelope 为外层结构、total 为总数。
+    chunks 为响应字节片段的迭代器；check(envelope) 用于迭代结束后校验业务码。
+    """
+
+    def __init__(
+        self,
+        chunks: Iterable[bytes],
+        check: Optional[Callable[[Dict[str, Any]], None]] = None,
+        on_close: Optional[Callable[[], None]] = None,
+    ):
+        self._chunks = chunks
+        self._check = check
+        self._on_close = on_close
+        self.envelope: Optional[Dict[str, Any]] = None
+        self.total: Optional[int] = None
+        self.count = 0
+
+    def __iter__(self) -> Iterator[Dict[str, Any]]:
+        decoder = OrderStreamDecoder()
+        utf8 = codecs.getincrementaldecoder("utf-8")()
+        try:
+            for chunk in self._chunks:
+                for row in decoder.feed(utf8.decode(chunk)):
+                    self.count += 1
+                    yield row
+            for row in decoder.feed(utf8.decode(b"", final=True)):
+                self.count += 1
+                yield row
+            envelope = decoder.close()
+        finally:
+            if self._on_close is not None:
+                self._on_close()
+        if self._check is not None:
+            self._check(envelope)
+        self.envelope = envelope
+        total = _page_total(envelope)
+        self.total = total if total is not None else self.count
+
+
+# SeenOrderIndex 中记录的结果
+OUTCOME_LOST = 1  # 已被其他报价师抢单（subCode=200）
+OUTCOME_GRABBED = 2  # 已抢到
+
+
+class SeenOrderIndex:
+    """
+    已尝试订单的索引（按 recordId）：记录上次抢单结果，到订单倒计时结束（无倒计时则 default_ttl 秒）后失效。
+    容量固定为 capacity 个槽位，结果与过期时间存放在定长数组里，满了按写入顺序覆盖最旧的槽位，
+    长时间轮询内存也不会增长。线程安全，同一账号的多个任务可共用。
+    """
+
+    def __init__(self, capacity: int = 4096, default_ttl: float = 600.0):
+        self.capacity = max(1, capacity)
+        self.default_ttl = default_ttl
+        self._slots: Dict[Any, int] = {}
+        self._keys: List[Any] = [None] * self.capacity
+        self._expires = array("d", [0.0]) * self.capacity
+        self._outcomes = array("b", [0]) * self.capacity
+        self._hand = 0
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _key(record_id: Any) -> str:
+        return str(record_id)
+
+    def get(self, record_id: Any) -> int:
+        """上次结果（OUTCOME_*），没有记录或已过期返回 0。"""
+        key = self._key(record_id)
+        with self._lock:
+            slot = self._slots.get(key)
+            if slot is None:
+                return 0
+            if self._expires[slot] <= time.monotonic():
+                del self._slots[key]
+                self._keys[slot] = None
+                return 0
+            return self._outcomes[slot]
+
+    def should_skip(self, record_id: Any) -> bool:
+        return self.get(record_id) != 0
+
+    def mark(self, record_id: Any, outcome: int, countdown: Optional[int] = None) -> None:
+        """记录结果；countdown 为订单剩余秒数，决定记录保留多久。"""
+        ttl = countdown if countdown is not None and countdown > 0 else self.default_ttl
+        key = self._key(record_id)
+        with self._lock:
+            slot = self._slots.get(key)
+            if slot is None:
+                slot = self._hand
+                self._hand = (slot + 1) % self.capacity
+                old = self._keys[slot]
+                if old is not None:
+                    self._slots.pop(old, None)
+                self._keys[slot] = key
+                self._slots[key] = slot
+            self._outcomes[slot] = outcome
+            self._expires[slot] = time.monotonic() + ttl
+
+    def mark_result(self, record: OrderRecord, result: Dict[str, Any]) -> None:
+        """按 grab_and_quote 的返回值记录：抢到或已被抢时记下，网络异常等不记（下一轮重试）。"""
+        if result.get("grabbed"):
+            self.mark(record.record_id, OUTCOME_GRABBED, record.countdown)
+        elif result.get("subCode") == 200:
+            self.mark(record.record_id, OUTCOME_LOST, record.countdown)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._slots.clear()
+            self._keys = [None] * self.capacity
+            self._hand = 0
+
+    def __len__(self) -> int:
+        return len(self._slots)
@@ -0,0 +1,166 @@
+# -*- coding: utf-8 -*-
+"""
+轮询节奏控制：同一账号的所有定时任务共用一个令牌桶（限制每秒查列表次数，避免被对方限流），
+每个任务的间隔按结果自适应——有新订单时加快，出错或接口变慢时指数退避，空闲时回到设定频率。
+"""
+
+import os
+import threading
+import time
+from collections import deque
+from typing import Any, Deque, Dict, Optional
+
+# 每个账号默认每秒最多查列表次数与突发上限
+DEFAULT_ACCOUNT_RATE = 2.0
+DEFAULT_ACCOUNT_BURST = 4
+# 有新订单时最多加快到设定频率的 1/SPEEDUP_FACTOR，且不低于 MIN_INTERVAL 秒
+SPEEDUP_FACTOR = 4
+MIN_INTERVAL = 0.25
+# 出错或变慢时最多退避到 MAX_BACKOFF 秒
+MAX_BACKOFF = 120.0
+# 单轮耗时超过该值（秒）视为对方接口变慢
+SLOW_TICK = 3.0
+
+
+def _account_rate() -> float:
+    try:
+        return max(0.1, float(os.environ.get("HAIHUISHOU_ACCOUNT_RATE", DEFAULT_ACCOUNT_RATE)))
+    except ValueError:
+        return DEFAULT_ACCOUNT_RATE
+
+
+class TokenBucket:
+    """令牌桶：每秒补充 rate 个令牌，最多存 burst 个。线程安全。"""
+
+    def __init__(self, rate: float, burst: int):
+        self.rate = rate
+        self.burst = max(1, burst)
+        self._tokens = float(self.burst)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+        # 最近取到令牌的时间，用于计算实际速率
+        self._taken: Deque[float] = deque(maxlen=256)
+
+    def _refill(self, now: float) -> None:
+        self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def reserve(self, max_wait: Optional[float] = None) -> Optional[float]:
+        """
+        预约一个令牌，返回需要等待的秒数（先到先得，令牌可以透支，后来者排在后面）。
+        需要等待超过 max_wait 秒时不预约，返回 None。
+        """
+        with self._lock:
+            now = time.monotonic()
+            self._refill(now)
+            wait = 0.0 if self._tokens >= 1 else (1 - self._tokens) / self.rate
+            if max_wait is not None and wait > max_wait:
+                return None
+            self._tokens -= 1
+            self._taken.append(now + wait)
+            return wait
+
+    def cancel(self) -> None:
+        """归还一个已预约但未使用的令牌。"""
+        with self._lock:
+            self._tokens = min(self.burst, self._tokens + 1)
+            if self._taken:
+                self._taken.pop()
+
+    def acquire(self, stop: Optional[threading.Event] = None, timeout: Optional[float] = None) -> bool:
+        """等到预约的令牌可用；stop 被设置或需要等待超过 timeout 秒时返回 False。"""
+        wait = self.reserve(timeout)
+        if wait is None:
+            return False
+        if wait <= 0:
+            return True
+        if stop is not None:
+            if stop.wait(wait):
+                self.cancel()
+                return False
+        else:
+            time.sleep(wait)
+        return True
+
+    def observed_rate(self, window: float = 10.0) -> float:
+        """最近 window 秒内实际取令牌的速率（次/秒）。"""
+        now = time.monotonic()
+        with self._lock:
+            n = sum(1 for t in self._taken if 0 <= now - t <= window)
+        return n / window
+
+
+class AccountLimiter:
+    """按 userId 分配令牌桶，同一账号的所有任务（以及 /api/execute-task）共用。"""
+
+    def __init__(self, rate: Optional[float] = None, burst: int = DEFAULT_ACCOUNT_BURST):
+        self.rate = rate if rate is not None else _account_rate()
+        self.burst = burst
+        self._buckets: Dict[str, TokenBucket] = {}
+        self._lock = threading.Lock()
+
+    def bucket(self, user_id: Any) -> TokenBucket:
+        with self._lock:
+            b = self._buckets.get(str(user_id))
+            if b is None:
+                b = self._buckets[str(user_id)] = TokenBucket(self.rate, self.burst)
+            return b
+
+
+class AdaptivePacer:
+    """
+    单个任务的自适应间隔。base 为设定频率（秒/次）：
+    本轮有新订单时间隔减半（不低于 base / SPEEDUP_FACTOR），出错或耗时超过 SLOW_TICK 时翻倍（不超过 MAX_BACKOFF），
+    其余情况逐步回到 base。
+    """
+
+    def __init__(self, base: float):
+        self.base = max(MIN_INTERVAL, float(base))
+        self.interval = self.base
+        self.failures = 0
+        self._known: Deque[Any] = deque(maxlen=512)
+        self._known_set: set = set()
+
+    @property
+    def floor(self) -> float:
+        return max(MIN_INTERVAL, self.base / SPEEDUP_FACTOR)
+
+    def set_base(self, base: float) -> None:
+        """任务频率被修改时调用。"""
+        base = max(MIN_INTERVAL, float(base))
+        if base != self.base:
+            self.base = base
+            self.interval = base
+
+    def _new_orders(self, summary: Dict[str, Any]) -> int:
+        """
+        本轮列表里出现的、之前没见过的订单数。按 summary["records"]（列表返回的全部 recordId）计，
+        跳过和未定价的单也算新到订单，否则只盯特定机型、大部分单都不报价的任务永远不会加速。
+        """
+        n = 0
+        for rid in summary.get("records") or []:
+            if rid is None or rid in self._known_set:
+                continue
+            if len(self._known) == self._known.maxlen:
+                self._known_set.discard(self._known[0])
+            self._known.append(rid)
+            self._known_set.add(rid)
+            n += 1
+        return n
+
+    def on_result(self, summary: Optional[Dict[str, Any]], elapsed: float, error: bool = False) -> float:
+        """根据本轮结果调整并返回下一轮间隔（秒）。"""
+        if error or elapsed > SLOW_TICK:
+            self.failures += 1
+            self.interval = min(MAX_BACKOFF, max(self.interval, self.base) * 2)
+        elif summary is not None and self._new_orders(summary) > 0:
+            self.failures = 0
+            self.interval = max(self.floor, min(self.interval, self.base) / 2)
+        else:
+            self.failures = 0
+            # 退避后减半回落，加速后逐步放慢，最终回到 base
+            if self.interval > self.base:
+                self.interval = max(self.base, self.interval / 2)
+            elif self.interval < self.base:
+                self.interval = min(self.base, self.interval * 1.5)
+        return self.interval
@@ -0,0 +1,191 @@
+# -*- coding: utf-8 -*-
+"""
+基础数据缓存：厂商列表、电子产品类型、各类型下的品牌。
+这些数据几乎不变，缓存在内存并落盘（重启后直接可用）；过期后先返回旧数据，同时在后台刷新。
+"""
+
+import json
+import os
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from .api import HaihuishouAPI, data_dir
+
+# 默认有效期（秒）
+DEFAULT_TTL = 6 * 3600
+
+
+class ReferenceDataCache:
+    """
+    厂商 / 分类 / 品牌缓存。
+    manufacturers()、categories()、brands(cat_id) 命中时直接返回内存数据；未命中时同步请求一次，
+    已过期时返回旧数据并在后台刷新。prefetch() 并发拉取全部分类的品牌。
+    """
+
+    def __init__(
+        self,
+        api: Optional[HaihuishouAPI] = None,
+        ttl: float = DEFAULT_TTL,
+        path: Optional[str] = None,
+        workers: int = 8,
+    ):
+        self.api = api or HaihuishouAPI()
+        self.ttl = ttl
+        self.path = path if path is not None else os.path.join(data_dir(), "refdata.json")
+        self.workers = workers
+        # key -> (拉取时间（time.time()）, 数据)
+        self._entries: Dict[str, Tuple[float, Any]] = {}
+        self._lock = threading.Lock()
+        self._refreshing: Dict[str, bool] = {}
+        self._auto_stop = threading.Event()
+        self._auto_thread: Optional[threading.Thread] = None
+        self._load()
+
+    # ------------------------- 持久化 -------------------------
+
+    def _load(self) -> None:
+        if not self.path or not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            self._entries = {k: (float(v[0]), v[1]) for k, v in data.items()}
+        except (OSError, ValueError, TypeError, IndexError):
+            self._entries = {}
+
+    def _save(self) -> None:
+        """
+        写同目录下的临时文件后替换。临时文件名由 mkstemp 生成、各线程 / 进程不同，
+        后台刷新、并发预取与其他进程同时写入时不会互相覆盖半截文件。缓存写不进去不影响使用，失败时忽略。
+        """
+        if not self.path:
+            return
+        with self._lock:
+            data = {k: [ts, value] for k, (ts, value) in self._entries.items()}
+        try:
+            fd, tmp = tempfile.mkstemp(prefix=".refdata-", suffix=".tmp", dir=os.path.dirname(self.path) or ".")
+        except OSError:
+            return
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                json.dump(data, f, ensure_ascii=False)
+            os.replace(tmp, self.path)
+        except OSError:
+            try:
+                os.unlink(tmp)
+            except OSError:
+                pass
+
+    # ------------------------- 读取 -------------------------
+
+    def _get(self, key: str, loader: Callable[[], Any]) -> Any:
+        entry = self._entries.get(key)
+        if entry is None:
+            return self._fetch(key, loader)
+        ts, value = entry
+        if time.time() - ts > self.ttl:
+            self._refresh_in_background(key, loader)
+        return value
+
+    def _fetch(self, key: str, loader: Callable[[], Any], save: bool = True) -> Any:
+        value = loader()
+        with self._lock:
+            self._entries[key] = (time.time(), value)
+        if save:
+            self._save()
+        return value
+
+    def _refresh_in_background(self, key: str, loader: Callable[[], Any]) -> None:
+        with self._lock:
+            if self._refreshing.get(key):
+                return
+            self._refreshing[key] = True
+
+        def _run() -> None:
+            try:
+                self._fetch(key, loader)
+            except Exception:
+                pass  # 刷新失败继续用旧数据，下次读取时再试
+            finally:
+                with self._lock:
+                    self._refreshing.pop(key, None)
+
+        threading.Thread(target=_run, name="haihuishou-refdata", daemon=True).start()
+
+    def manufacturers(self) -> List[Dict[str, str]]:
+        """厂商列表（getmanufacturerdata）。"""
+        return self._get("manufacturers", self.api.get_manufacturer_list)
+
+    def categories(self) -> List[Dict[str, Any]]:
+        """电子产品类型（getsyscategory）。"""
+        return self._get("categories", self.api.get_sys_category)
+
+    def brands(self, cat_id: Any) -> List[Dict[str, str]]:
+        """某电子产品类型下的品牌（getsysbrand）。"""
+        return self._get("brands:%s" % cat_id, lambda: self.api.get_sys_brand(int(cat_id)))
+
+    # ------------------------- 预取与刷新 -------------------------
+
+    def prefetch(self, wait: bool = True) -> None:
+        """
+        并发拉取厂商、分类，再并发拉取全部分类的品牌，整体写盘一次。
+        wait=False 时在后台线程执行并立即返回。
+        """
+        if not wait:
+            threading.Thread(target=self._prefetch_quietly, name="haihuishou-refdata", daemon=True).start()
+            return
+        with ThreadPoolExecutor(max_workers=max(1, self.workers), thread_name_prefix="haihuishou-refdata") as pool:
+            f_m = pool.submit(self._fetch, "manufacturers", self.api.get_manufacturer_list, False)
+            cats = pool.submit(self._fetch, "categories", self.api.get_sys_category, False).result()
+            brand_futures = [
+                pool.submit(self._fetch, "brands:%s" % c["catId"], lambda cid=c["catId"]: self.api.get_sys_brand(int(cid)), False)
+                for c in cats
+                if c.get("catId") is not None
+            ]
+            f_m.result()
+            for f in brand_futures:
+                f.result()
+        self._save()
+
+    def _prefetch_quietly(self) -> None:
+        try:
+            self.prefetch()
+        except Exception:
+            pass
+
+    def start_auto_refresh(self, interval: Optional[float] = None) -> None:
+        """后台线程每 interval 秒（默认 ttl）整体刷新一次，启动时若数据缺失或过期先刷新。"""
+        if self._auto_thread is not None and self._auto_thread.is_alive():
+            return
+        interval = interval or self.ttl
+        self._auto_stop.clear()
+
+        def _loop() -> None:
+            if not self.is_fresh():
+                self._prefetch_quietly()
+            while not self._auto_stop.wait(interval):
+                self._prefetch_quietly()
+
+        self._auto_thread = threading.Thread(target=_loop, name="haihuishou-refdata-auto", daemon=True)
+        self._auto_thread.start()
+
+    def stop_auto_refresh(self) -> None:
+        self._auto_stop.set()
+
+    def is_fresh(self) -> bool:
+        """厂商、分类都已缓存且未过期。"""
+        now = time.time()
+        for key in ("manufacturers", "categories"):
+            entry = self._entries.get(key)
+            if entry is None or now - entry[0] > self.ttl:
+                return False
+        return True
+
+    def clear(self) -> None:
+        """清空内存与磁盘缓存。"""
+        with self._lock:
+            self._entries = {}
+        self._save()
@@ -0,0 +1,318 @@
+# -*- coding: utf-8 -*-
+"""
+上游接口的超时预算、截止时间与熔断（HaihuishouAPI 的所有请求都经过这里）。
+
+- TimeoutBudgets：每个接口各自的连接 / 读取超时。连不上的抢单晚几百毫秒就已经输了，不必等满 15 秒；
+  默认值见 DEFAULT_BUDGETS，未列出的接口用客户端的 timeout，可用 HAIHUISHOU_TIMEOUTS 覆盖。
+  抢单、报价不幂等（NON_IDEMPOTENT）：请求发出后读取超时不代表没有生效，抢到却没报价的单会一直挂在账号上，
+  所以这些接口只缩短连接超时，读取超时保持客户端的 timeout，也不按截止时间截短。
+- time_limit(seconds)：当前线程里之后的接口调用共用一个截止时间，每次请求的超时取预算与剩余时间的较小值，
+  时间用完后不再发请求、直接抛 UpstreamTimeoutError。截止时间按线程保存，交给线程池时用 current_deadline()
+  取出、在线程里用 use_deadline() 恢复。critical() 内的调用（抢到单后的报价）不受截止时间与熔断限制。
+- CircuitBreaker：每个接口一个（全局 BREAKERS）。连续 failure_threshold 次超时 / 连接失败 / 5xx 后打开，
+  打开期间直接抛 CircuitOpenError、不发请求；reset_timeout 秒后放行一个探测请求，成功则关闭，
+  失败则再次打开且等待时间翻倍（最长 max_reset 秒）。
+"""
+
+import os
+import threading
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, Iterator, Optional, Tuple
+
+import requests
+
+# 默认连接超时（秒）；略大于 3 秒的 TCP 重传间隔
+CONNECT_TIMEOUT = 3.05
+
+# 不幂等的接口：只缩短连接超时（连接超时时请求还没发出），读取超时不短于客户端的 timeout
+NON_IDEMPOTENT = frozenset({"hsdgraborder", "hsdquotation", "hsdupdatequotation"})
+
+# 各接口默认的 (连接, 读取) 超时（秒），接口名为 URL 最后一段路径；读取为 None 时取客户端的 timeout
+DEFAULT_BUDGETS: Dict[str, Tuple[float, Optional[float]]] = {
+    "hsdgraborder": (0.5, None),
+    "hsdquotation": (1.0, None),
+    "hsdupdatequotation": (1.0, None),
+    "gethsdorderlist": (1.0, 5.0),
+}
+
+FAILURE_THRESHOLD = 5
+RESET_TIMEOUT = 5.0
+MAX_RESET = 60.0
+TASK_DEADLINE = 10.0
+
+_local = threading.local()
+
+
+def _env_number(name: str, default: float) -> float:
+    try:
+        return float(os.environ.get(name, "") or default)
+    except ValueError:
+        return default
+
+
+class UpstreamTimeoutError(requests.Timeout, TimeoutError):
+    """
+    上游接口超时：连接 / 读取超过该接口的预算，或截止时间已到（phase 为 connect / read / deadline）。
+    同时是 requests.Timeout 与内置 TimeoutError，原有按这两类捕获的代码不受影响。
+    """
+
+    def __init__(self, endpoint: str, phase: str, seconds: Optional[float] = None):
+        if phase == "deadline":
+            message = "%s 未完成：截止时间已到" % endpoint
+        else:
+            message = "%s %s超时（%.3g 秒）" % (endpoint, "连接" if phase == "connect" else "读取", seconds or 0)
+        super().__init__(message)
+        self.endpoint = endpoint
+        self.phase = phase
+        self.seconds = seconds
+
+
+class CircuitOpenError(requests.RequestException):
+    """接口熔断中，请求未发出。retry_after 为距下次放行探测请求的秒数。"""
+
+    def __init__(self, endpoint: str, retry_after: float):
+        super().__init__("%s 熔断中（上游持续超时或出错），%.1f 秒后重试" % (endpoint, retry_after))
+        self.endpoint = endpoint
+        self.retry_after = retry_after
+
+
+# ------------------------- 超时预算 -------------------------
+
+
+@dataclass(frozen=True)
+class EndpointBudget:
+    """单个接口的连接 / 读取超时（秒）。"""
+
+    connect: float
+    read: float
+
+
+class TimeoutBudgets:
+    """
+    接口名 → EndpointBudget。overrides 覆盖 DEFAULT_BUDGETS，未列出的接口为 (CONNECT_TIMEOUT, default_read)。
+    NON_IDEMPOTENT 中接口的读取超时不会低于 default_read。
+    timeout(endpoint) 返回本次请求可用的 (连接, 读取) 超时，已按当前线程的截止时间截短（不幂等接口只截短连接超时）。
+    """
+
+    def __init__(self, default_read: float = 15.0, overrides: Optional[Dict[str, Tuple[float, float]]] = None):
+        self.default = EndpointBudget(min(CONNECT_TIMEOUT, default_read), default_read)
+        self._budgets: Dict[str, EndpointBudget] = {}
+        for name, (connect, read) in {**DEFAULT_BUDGETS, **(overrides or {})}.items():
+            read = default_read if read is None else read
+            if name in NON_IDEMPOTENT:
+                read = max(read, default_read)
+            self._budgets[name] = EndpointBudget(connect, read)
+
+    @classmethod
+    def from_env(cls, default_read: float = 15.0) -> "TimeoutBudgets":
+        """
+        HAIHUISHOU_TIMEOUTS 为逗号分隔的「接口名=连接/读取」或「接口名=读取」（连接超时取两者较小值），
+        如 "hsdgraborder=0.3/15,gethsdorderlist=4"；写错的项忽略。
+        """
+        overrides: Dict[str, Tuple[float, float]] = {}
+        for item in os.environ.get("HAIHUISHOU_TIMEOUTS", "").split(","):
+            name, _, value = item.partition("=")
+            name = name.strip()
+            if not name or not value.strip():
+                continue
+            try:
+                parts = [float(x) for x in value.split("/")]
+            except ValueError:
+                continue
+            if len(parts) == 1:
+                parts = [min(CONNECT_TIMEOUT, parts[0]), parts[0]]
+            if len(parts) == 2 and min(parts) > 0:
+                overrides[name] = (parts[0], parts[1])
+        return cls(default_read, overrides)
+
+    def get(self, endpoint: str) -> EndpointBudget:
+        return self._budgets.get(endpoint, self.default)
+
+    def timeout(self, endpoint: str) -> Tuple[float, float]:
+        """本次请求的 (连接, 读取) 超时；截止时间已到时抛 UpstreamTimeoutError。"""
+        budget = self.get(endpoint)
+        left = remaining()
+        if left is None:
+            return budget.connect, budget.read
+        if left <= 0:
+            raise UpstreamTimeoutError(endpoint, "deadline")
+        if endpoint in NON_IDEMPOTENT:
+            return min(budget.connect, left), budget.read
+        return min(budget.connect, left), min(budget.read, left)
+
+    def snapshot(self) -> Dict[str, Dict[str, float]]:
+        out = {name: {"connect": b.connect, "read": b.read} for name, b in sorted(self._budgets.items())}
+        out["*"] = {"connect": self.default.connect, "read": self.default.read}
+        return out
+
+
+# ------------------------- 截止时间 -------------------------
+
+
+def current_deadline() -> Optional[float]:
+    """当前线程的截止时刻（time.monotonic），没有则为 None。"""
+    return getattr(_local, "deadline", None)
+
+
+def remaining() -> Optional[float]:
+    """距截止时间的秒数（可能为负）；没有截止时间时为 None。"""
+    at = current_deadline()
+    return None if at is None else at - time.monotonic()
+
+
+def expired() -> bool:
+    left = remaining()
+    return left is not None and left <= 0
+
+
+@contextmanager
+def use_deadline(at: Optional[float]) -> Iterator[Optional[float]]:
+    """把当前线程的截止时刻设为 at（None 为不限），退出时恢复；用于把截止时间交给线程池里的线程。"""
+    prev = current_deadline()
+    _local.deadline = at
+    try:
+        yield at
+    finally:
+        _local.deadline = prev
+
+
+@contextmanager
+def time_limit(seconds: Optional[float]) -> Iterator[Optional[float]]:
+    """之后 seconds 秒内必须完成（None 或 <= 0 为不另设）；嵌套时取更早的截止时刻。"""
+    at = current_deadline()
+    if seconds is not None and seconds > 0:
+        mine = time.monotonic() + seconds
+        at = mine if at is None else min(at, mine)
+    with use_deadline(at):
+        yield at
+
+
+def is_critical() -> bool:
+    return getattr(_local, "critical", False)
+
+
+@contextmanager
+def critical() -> Iterator[None]:
+    """其中的调用不受截止时间与熔断限制（仍使用接口自己的超时预算），用于抢到单后必须发出的报价。"""
+    prev = is_critical()
+    _local.critical = True
+    try:
+        with use_deadline(None):
+            yield
+    finally:
+        _local.critical = prev
+
+
+def task_deadline_from_env() -> Optional[float]:
+    """一轮任务（查列表、抢单）的总时限，HAIHUISHOU_TASK_DEADLINE 秒，默认 10，设为 0 不限。"""
+    seconds = _env_number("HAIHUISHOU_TASK_DEADLINE", TASK_DEADLINE)
+    return seconds if seconds > 0 else None
+
+
+# ------------------------- 熔断 -------------------------
+
+
+class CircuitBreaker:
+    """单个接口的熔断器（线程安全），状态为 closed / open / half_open。"""
+
+    def __init__(
+        self,
+        endpoint: str,
+        failure_threshold: int = FAILURE_THRESHOLD,
+        reset_timeout: float = RESET_TIMEOUT,
+        max_reset: float = MAX_RESET,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.endpoint = endpoint
+        self.failure_threshold = max(1, failure_threshold)
+        self.reset_timeout = reset_timeout
+        self.max_reset = max(reset_timeout, max_reset)
+        self.clock = clock
+        self.state = "closed"
+        self.failures = 0
+        self.opened = 0
+        self._wait = reset_timeout
+        self._retry_at = 0.0
+        self._lock = threading.Lock()
+
+    def before(self) -> None:
+        """发请求前调用：熔断中抛 CircuitOpenError；到了探测时间只放行一个请求。"""
+        with self._lock:
+            if self.state == "closed":
+                return
+            now = self.clock()
+            if now >= self._retry_at:
+                # 放行一个探测请求；它迟迟没有结果时，到时再放行下一个
+                self.state = "half_open"
+                self._retry_at = now + self._wait
+                return
+            raise CircuitOpenError(self.endpoint, max(0.0, self._retry_at - now))
+
+    def success(self) -> None:
+        with self._lock:
+            self.state = "closed"
+            self.failures = 0
+            self._wait = self.reset_timeout
+
+    def failure(self) -> None:
+        with self._lock:
+            self.failures += 1
+            if self.state == "half_open":
+                self._wait = min(self._wait * 2, self.max_reset)
+            elif self.state == "open" or self.failures < self.failure_threshold:
+                return
+            self.state = "open"
+            self.opened += 1
+            self._retry_at = self.clock() + self._wait
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            retry_after = max(0.0, self._retry_at - self.clock()) if self.state != "closed" else 0.0
+            return {"state": self.state, "failures": self.failures, "opened": self.opened, "retryAfter": round(retry_after, 3)}
+
+
+class BreakerRegistry:
+    """
+    接口名 → CircuitBreaker，同一进程的所有客户端共用（上游变慢对所有账号都一样）。
+    参数默认取 HAIHUISHOU_BREAKER_FAILURES（连续失败次数，默认 5，设为 0 关闭熔断）与 HAIHUISHOU_BREAKER_RESET（秒，默认 5）。
+    """
+
+    def __init__(self, failure_threshold: Optional[int] = None, reset_timeout: Optional[float] = None):
+        self.failure_threshold = int(
+            failure_threshold if failure_threshold is not None else _env_number("HAIHUISHOU_BREAKER_FAILURES", FAILURE_THRESHOLD)
+        )
+        self.reset_timeout = reset_timeout if reset_timeout is not None else _env_number("HAIHUISHOU_BREAKER_RESET", RESET_TIMEOUT)
+        self._breakers: Dict[str, CircuitBreaker] = {}
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        return self.failure_threshold > 0
+
+    def get(self, endpoint: str) -> Optional[CircuitBreaker]:
+        """该接口的熔断器；熔断关闭时为 None。"""
+        if not self.enabled:
+            return None
+        breaker = self._breakers.get(endpoint)
+        if breaker is None:
+            with self._lock:
+                breaker = self._breakers.get(endpoint)
+                if breaker is None:
+                    breaker = self._breakers[endpoint] = CircuitBreaker(
+                        endpoint, self.failure_threshold, self.reset_timeout
+                    )
+        return breaker
+
+    def snapshot(self) -> Dict[str, Dict[str, Any]]:
+        with self._lock:
+            breakers = sorted(self._breakers.items())
+        return {name: b.snapshot() for name, b in breakers}
+
+    def clear(self) -> None:
+        with self._lock:
+            self._breakers.clear()
+
+
+BREAKERS = BreakerRegistry()
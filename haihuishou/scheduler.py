@@ -0,0 +1,502 @@
+# -*- coding: utf-8 -*-
+"""
+服务端定时抢单任务：任务定义保存在本地 JSON 文件（重启后自动恢复执行中的任务），
+按频率循环「查列表 → 抢单 → 报价」。默认同一账号的执行中任务共用一个工作线程与一次列表查询（见 matching），
+HAIHUISHOU_SHARED_FEED=0 时每个任务在独立工作线程里各自查询。
+同一账号的任务共用令牌桶限速，查询间隔按结果自适应（见 pacing）。
+"""
+
+import json
+import os
+import tempfile
+import threading
+import time
+from dataclasses import asdict, dataclass, field
+from functools import cached_property
+from typing import Any, Callable, Dict, List, Optional
+
+from .api import data_dir
+from .grab_tool import DRAIN_MAX_GRABS, GrabCondition, GrabOrderTool, QuotePricer
+from .history import HistoryStore
+from .matching import FeedTask, SharedOrderFeed
+from .metrics import METRICS
+from .pacing import AccountLimiter, AdaptivePacer
+from .resilience import task_deadline_from_env
+
+ToolFactory = Callable[[str, str], GrabOrderTool]
+
+
+def shared_feed_from_env() -> bool:
+    """HAIHUISHOU_SHARED_FEED：同一账号的任务是否共用订单列表查询，默认开启，设为 0 关闭。"""
+    return os.environ.get("HAIHUISHOU_SHARED_FEED", "1").strip().lower() not in ("0", "false", "no")
+
+
+def _str_list(value: Any) -> List[str]:
+    if isinstance(value, str):
+        value = value.split(",")
+    return [str(x).strip() for x in (value or []) if str(x).strip()]
+
+
+@dataclass
+class ScheduledTask:
+    """定时任务定义（字段与页面 / execute-task 入参一致）。"""
+
+    id: int
+    user_id: str
+    name: str
+    quote_amount: str
+    manufacturer_names: List[str] = field(default_factory=list)
+    category_id: str = ""
+    brand_ids: List[str] = field(default_factory=list)
+    min_price: Optional[str] = None
+    max_price: Optional[str] = None
+    # 执行频率（秒/次）
+    frequency: int = 1
+    # 抢光模式：每轮拉取全部符合条件的订单并发抢单，最多 max_grabs 单
+    drain: bool = False
+    max_grabs: int = DRAIN_MAX_GRABS
+    # 是否处于自动执行状态，重启后据此恢复
+    running: bool = False
+    # 报价规则（见 QuotePricer），为空时每单报 quote_amount
+    quote_rules: List[Dict[str, Any]] = field(default_factory=list)
+
+    @cached_property
+    def pricer(self) -> QuotePricer:
+        """编译后的报价规则，同一任务定义只编译一次（修改任务会生成新的定义）。"""
+        return QuotePricer.from_body(self.quote_amount, self.quote_rules)
+
+    @classmethod
+    def from_body(cls, task_id: int, user_id: str, body: Dict[str, Any]) -> "ScheduledTask":
+        """由页面提交的 JSON（驼峰字段）构造任务，校验失败抛 ValueError。"""
+        name = str(body.get("name") or body.get("taskName") or "").strip()
+        if not name:
+            raise ValueError("请填写任务名称")
+        try:
+            frequency = max(1, int(body.get("frequency") or 1))
+        except (TypeError, ValueError):
+            raise ValueError("执行频率须为整数秒")
+        try:
+            max_grabs = max(1, int(body.get("maxGrabs") or DRAIN_MAX_GRABS))
+        except (TypeError, ValueError):
+            raise ValueError("每轮最多抢单数须为整数")
+        pricer = QuotePricer.from_body(body.get("quoteAmount"), body.get("quoteRules"))
+        return cls(
+            id=task_id,
+            user_id=str(user_id),
+            name=name,
+            quote_amount=pricer.default or "",
+            manufacturer_names=_str_list(body.get("manufacturerNames")),
+            category_id=str(body.get("categoryId") or "").strip(),
+            brand_ids=_str_list(body.get("brandIds")),
+            min_price=str(body.get("minPrice") or "").strip() or None,
+            max_price=str(body.get("maxPrice") or "").strip() or None,
+            frequency=frequency,
+            drain=bool(body.get("drain")),
+            max_grabs=max_grabs,
+            quote_rules=pricer.rules,
+        )
+
+    def condition(self) -> GrabCondition:
+        return GrabCondition.for_task(
+            manufacturer_names=self.manufacturer_names,
+            category_id=self.category_id,
+            brand_ids=self.brand_ids,
+            min_price=self.min_price,
+            max_price=self.max_price,
+        )
+
+    def to_json(self) -> Dict[str, Any]:
+        """返回给页面的驼峰字段。"""
+        return {
+            "id": self.id,
+            "name": self.name,
+            "quoteAmount": self.quote_amount,
+            "manufacturerNames": list(self.manufacturer_names),
+            "categoryId": self.category_id,
+            "brandIds": list(self.brand_ids),
+            "minPrice": self.min_price,
+            "maxPrice": self.max_price,
+            "frequency": str(self.frequency),
+            "drain": self.drain,
+            "maxGrabs": self.max_grabs,
+            "running": self.running,
+            "quoteRules": list(self.quote_rules),
+        }
+
+
+class _TaskRunner:
+    """单个任务的工作线程与运行统计。"""
+
+    def __init__(self, task_id: int, frequency: float):
+        self.task_id = task_id
+        self.pacer = AdaptivePacer(frequency)
+        self.stop_event = threading.Event()
+        self.thread: Optional[threading.Thread] = None
+        self.runs = 0
+        self.grabbed = 0
+        self.quoted = 0
+        self.last_run_at: Optional[float] = None
+        self.last_result: Optional[Dict[str, Any]] = None
+        self.last_error: Optional[str] = None
+
+    def status(self) -> Dict[str, Any]:
+        return {
+            "runs": self.runs,
+            "grabbed": self.grabbed,
+            "quoted": self.quoted,
+            "lastRunAt": self.last_run_at,
+            "lastResult": self.last_result,
+            "lastError": self.last_error,
+            # 当前实际间隔（秒/次）与连续出错 / 变慢次数
+            "interval": round(self.pacer.interval, 2),
+            "backoff": self.pacer.failures,
+        }
+
+
+class _AccountFeed:
+    """共用订单源模式下一个账号的工作线程：按该账号执行中任务的最短频率查列表，匹配给各任务。"""
+
+    def __init__(self, user_id: str):
+        self.user_id = user_id
+        self.feed = SharedOrderFeed()
+        self.pacer = AdaptivePacer(1)
+        self.stop_event = threading.Event()
+        self.thread: Optional[threading.Thread] = None
+
+
+class TaskScheduler:
+    """
+    定时任务调度器。tool_factory(token, user_id) 返回该账号的 GrabOrderTool，
+    token 按 userId 保存（页面每次请求会刷新），任务线程每轮取最新 token。
+    每轮查列表前从 limiter 中该账号的令牌桶取令牌；抢光模式的后续页由工具按页取令牌（tool_factory 返回的工具应带同一个 limiter）。传入 history 时每轮汇总（含整轮失败）写入历史记录。
+    shared_feed（默认取 HAIHUISHOU_SHARED_FEED）为真时同一账号的执行中任务共用一个线程：每轮按全部任务条件的并集
+    查一次列表，在本地匹配给各任务（SharedOrderFeed），频率取其中最短的；各任务的运行统计照常单独记录。
+    task_deadline 为每轮的总时限（秒，默认取 HAIHUISHOU_TASK_DEADLINE），上游卡住时一轮不会占着线程等满客户端超时。
+    """
+
+    def __init__(
+        self,
+        tool_factory: ToolFactory,
+        path: Optional[str] = None,
+        limiter: Optional[AccountLimiter] = None,
+        history: Optional[HistoryStore] = None,
+        shared_feed: Optional[bool] = None,
+        task_deadline: Optional[float] = None,
+    ):
+        self._tool_factory = tool_factory
+        self.path = path or os.path.join(data_dir(), "scheduled_tasks.json")
+        self.limiter = limiter or AccountLimiter()
+        self.history = history
+        self.shared_feed = shared_feed_from_env() if shared_feed is None else shared_feed
+        self.task_deadline = task_deadline_from_env() if task_deadline is None else task_deadline
+        self._feeds: Dict[str, _AccountFeed] = {}
+        self._tasks: Dict[int, ScheduledTask] = {}
+        self._tokens: Dict[str, str] = {}
+        self._runners: Dict[int, _TaskRunner] = {}
+        self._lock = threading.RLock()
+        self._last_id = 0
+
+    # ------------------------- 持久化 -------------------------
+
+    def load(self) -> None:
+        """从文件加载任务定义与各账号 token，不启动线程（见 resume）。"""
+        if not os.path.exists(self.path):
+            return
+        with open(self.path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        with self._lock:
+            self._tokens = dict(data.get("tokens") or {})
+            self._tasks = {}
+            for item in data.get("tasks") or []:
+                task = ScheduledTask(**item)
+                self._tasks[task.id] = task
+                self._last_id = max(self._last_id, task.id)
+
+    def save(self) -> None:
+        """
+        写同目录下的临时文件后替换，避免写到一半时进程退出损坏任务文件。
+        文件里有 token：临时文件由 mkstemp 以 0600 创建（仅本人可读），名字各进程不同。
+        """
+        with self._lock:
+            data = {
+                "tokens": dict(self._tokens),
+                "tasks": [asdict(t) for t in self._tasks.values()],
+            }
+            fd, tmp = tempfile.mkstemp(prefix=".scheduled_tasks-", suffix=".tmp", dir=os.path.dirname(self.path) or ".")
+            try:
+                with os.fdopen(fd, "w", encoding="utf-8") as f:
+                    json.dump(data, f, ensure_ascii=False, indent=2)
+                os.replace(tmp, self.path)
+            except BaseException:
+                try:
+                    os.unlink(tmp)
+                except OSError:
+                    pass
+                raise
+
+    def resume(self) -> None:
+        """启动上次退出时仍处于执行状态的任务。"""
+        with self._lock:
+            for task in self._tasks.values():
+                if task.running and self._tokens.get(task.user_id):
+                    self._start_thread(task)
+
+    def shutdown(self, timeout: float = 5.0) -> None:
+        """停止全部工作线程（保留 running 状态，下次启动时恢复）。"""
+        with self._lock:
+            runners = list(self._runners.values())
+            feeds = list(self._feeds.values())
+        for worker in runners + feeds:
+            worker.stop_event.set()
+        for worker in runners + feeds:
+            if worker.thread is not None:
+                worker.thread.join(timeout)
+
+    # ------------------------- 任务管理 -------------------------
+
+    def set_token(self, user_id: str, token: str) -> None:
+        """记录账号最新 token，任务线程下一轮开始使用。"""
+        if not user_id or not token:
+            return
+        with self._lock:
+            if self._tokens.get(str(user_id)) == token:
+                return
+            self._tokens[str(user_id)] = token
+            self.save()
+
+    def tokens(self) -> Dict[str, str]:
+        """各账号（userId）最新保存的 token。"""
+        with self._lock:
+            return dict(self._tokens)
+
+    def list_tasks(self, user_id: str) -> List[Dict[str, Any]]:
+        with self._lock:
+            out = []
+            for task in sorted(self._tasks.values(), key=lambda t: t.id):
+                if task.user_id != str(user_id):
+                    continue
+                item = task.to_json()
+                runner = self._runners.get(task.id)
+                item["status"] = runner.status() if runner else None
+                out.append(item)
+            return out
+
+    def account_rate(self, user_id: str) -> Dict[str, float]:
+        """账号的限速设置与最近 10 秒实际查列表速率（次/秒）。"""
+        bucket = self.limiter.bucket(user_id)
+        return {"limit": bucket.rate, "effective": round(bucket.observed_rate(), 3)}
+
+    def _get(self, task_id: int, user_id: str) -> ScheduledTask:
+        task = self._tasks.get(int(task_id))
+        if task is None or task.user_id != str(user_id):
+            raise KeyError("任务不存在")
+        return task
+
+    def create(self, user_id: str, body: Dict[str, Any]) -> ScheduledTask:
+        with self._lock:
+            task_id = max(int(time.time() * 1000), self._last_id + 1)
+            task = ScheduledTask.from_body(task_id, user_id, body)
+            self._last_id = task_id
+            self._tasks[task_id] = task
+            self.save()
+            return task
+
+    def update(self, task_id: int, user_id: str, body: Dict[str, Any]) -> ScheduledTask:
+        """修改任务定义；执行中的任务下一轮按新定义执行。body 不带 quoteRules 时保留原有报价规则。"""
+        with self._lock:
+            old = self._get(task_id, user_id)
+            if "quoteRules" not in body and old.quote_rules:
+                body = dict(body, quoteRules=old.quote_rules)
+            task = ScheduledTask.from_body(old.id, old.user_id, body)
+            task.running = old.running
+            self._tasks[old.id] = task
+            self.save()
+            return task
+
+    def delete(self, task_id: int, user_id: str) -> None:
+        with self._lock:
+            task = self._get(task_id, user_id)
+            self._stop_thread(task.id)
+            del self._tasks[task.id]
+            self.save()
+
+    def start(self, task_id: int, user_id: str) -> ScheduledTask:
+        with self._lock:
+            task = self._get(task_id, user_id)
+            if not self._tokens.get(task.user_id):
+                raise RuntimeError("请先登录")
+            task.running = True
+            self._start_thread(task)
+            self.save()
+            return task
+
+    def stop(self, task_id: int, user_id: str) -> ScheduledTask:
+        with self._lock:
+            task = self._get(task_id, user_id)
+            task.running = False
+            self._stop_thread(task.id)
+            self.save()
+            return task
+
+    def start_all(self, user_id: str) -> int:
+        with self._lock:
+            ids = [t.id for t in self._tasks.values() if t.user_id == str(user_id) and not t.running]
+            for task_id in ids:
+                self.start(task_id, user_id)
+            return len(ids)
+
+    def stop_all(self, user_id: str) -> int:
+        with self._lock:
+            ids = [t.id for t in self._tasks.values() if t.user_id == str(user_id) and t.running]
+            for task_id in ids:
+                self.stop(task_id, user_id)
+            return len(ids)
+
+    # ------------------------- 工作线程 -------------------------
+
+    def _start_thread(self, task: ScheduledTask) -> None:
+        runner = self._runners.get(task.id)
+        if self.shared_feed:
+            if runner is None or runner.stop_event.is_set():
+                self._runners[task.id] = _TaskRunner(task.id, task.frequency)
+            self._ensure_feed(task.user_id)
+            return
+        if runner is not None and runner.thread is not None and runner.thread.is_alive():
+            if not runner.stop_event.is_set():
+                return
+        runner = _TaskRunner(task.id, task.frequency)
+        runner.thread = threading.Thread(
+            target=self._run, args=(runner,), name="haihuishou-task-%s" % task.id, daemon=True
+        )
+        self._runners[task.id] = runner
+        runner.thread.start()
+
+    def _stop_thread(self, task_id: int) -> None:
+        runner = self._runners.get(task_id)
+        if runner is not None:
+            runner.stop_event.set()
+
+    def _ensure_feed(self, user_id: str) -> None:
+        """该账号的共用订单源线程没有运行时启动（调用方需持有 _lock）。"""
+        feed = self._feeds.get(user_id)
+        if feed is not None and not feed.stop_event.is_set():
+            return
+        feed = _AccountFeed(user_id)
+        feed.thread = threading.Thread(
+            target=self._run_feed, args=(feed,), name="haihuishou-feed-%s" % user_id, daemon=True
+        )
+        self._feeds[user_id] = feed
+        feed.thread.start()
+
+    def _run_feed(self, feed: _AccountFeed) -> None:
+        while not feed.stop_event.is_set():
+            with self._lock:
+                active = []
+                for task in sorted(self._tasks.values(), key=lambda t: t.id):
+                    runner = self._runners.get(task.id)
+                    if task.user_id == feed.user_id and runner is not None and not runner.stop_event.is_set():
+                        runner.pacer = feed.pacer  # 任务状态里显示共用线程的实际间隔
+                        active.append((task, runner))
+                token = self._tokens.get(feed.user_id)
+                if not active:
+                    # 在锁内退出，_ensure_feed 不会看到一个即将结束的线程
+                    if self._feeds.get(feed.user_id) is feed:
+                        del self._feeds[feed.user_id]
+                    return
+            feed.pacer.set_base(min(task.frequency for task, _ in active))
+            if not self.limiter.bucket(feed.user_id).acquire(feed.stop_event):
+                return
+            started = time.monotonic()
+            combined = self._feed_tick(feed, active, token)
+            elapsed = time.monotonic() - started
+            interval = feed.pacer.on_result(combined, elapsed, error=combined is None)
+            if feed.stop_event.wait(max(0.0, interval - elapsed)):
+                return
+
+    def _feed_tick(self, feed: _AccountFeed, active: List[Any], token: Optional[str]) -> Optional[Dict[str, Any]]:
+        """共用订单源执行一轮，各任务分别记录结果；返回合并的 {"records"}（供自适应间隔），整轮失败返回 None。"""
+        now = time.time()
+        for _, runner in active:
+            runner.runs += 1
+            runner.last_run_at = now
+        try:
+            if not token:
+                raise RuntimeError("请先登录（缺少 token）")
+            tool = self._tool_factory(token, feed.user_id)
+            tool.warm_up()
+            tasks = [
+                FeedTask(task.id, task.condition(), task.pricer, remark=task.name, drain=task.drain, max_grabs=task.max_grabs)
+                for task, _ in active
+            ]
+            results = feed.feed.execute(tool, tasks, user_id=feed.user_id, deadline=self.task_deadline)
+        except Exception as e:
+            for task, runner in active:
+                self._record_failure(task, runner, e)
+            return None
+        records: List[Any] = []
+        for task, runner in active:
+            records.extend(self._record_result(task, runner, results[task.id]))
+        return {"records": records}
+
+    def _record_result(self, task: ScheduledTask, runner: _TaskRunner, summary: Dict[str, Any]) -> List[Any]:
+        """记录一轮结果，返回本轮列表里出现的 recordId（不放进任务状态）。"""
+        records = summary.pop("records", None) or []
+        METRICS.record_task(task.id, summary)
+        if self.history is not None:
+            self.history.record_run(task.id, task.user_id, summary=summary)
+        runner.grabbed += summary["grabbed"]
+        runner.quoted += summary["quoted"]
+        summary["errors"] = summary["errors"][:20]
+        runner.last_result = summary
+        runner.last_error = None
+        return records
+
+    def _record_failure(self, task: ScheduledTask, runner: _TaskRunner, error: Exception) -> None:
+        METRICS.record_task_failure(task.id)
+        if self.history is not None:
+            self.history.record_run(task.id, task.user_id, error=str(error))
+        runner.last_error = str(error)
+
+    def _run(self, runner: _TaskRunner) -> None:
+        while not runner.stop_event.is_set():
+            with self._lock:
+                task = self._tasks.get(runner.task_id)
+                token = self._tokens.get(task.user_id) if task else None
+            if task is None:
+                return
+            runner.pacer.set_base(task.frequency)
+            # 同一账号所有任务共用令牌桶，超出账号速率时在这里排队
+            if not self.limiter.bucket(task.user_id).acquire(runner.stop_event):
+                return
+            started = time.monotonic()
+            records = self._tick(task, token, runner)
+            elapsed = time.monotonic() - started
+            summary = None if records is None else {"records": records}
+            interval = runner.pacer.on_result(summary, elapsed, error=records is None)
+            if runner.stop_event.wait(max(0.0, interval - elapsed)):
+                return
+
+    def _tick(self, task: ScheduledTask, token: Optional[str], runner: _TaskRunner) -> Optional[List[Any]]:
+        """执行一轮，返回本轮列表里出现的 recordId（供自适应间隔），失败返回 None。"""
+        runner.runs += 1
+        runner.last_run_at = time.time()
+        try:
+            if not token:
+                raise RuntimeError("请先登录（缺少 token）")
+            tool = self._tool_factory(token, task.user_id)
+            tool.warm_up()
+            summary = tool.execute_task(
+                task.condition(),
+                task.quote_amount,
+                remark=task.name,
+                user_id=task.user_id,
+                drain=task.drain,
+                max_grabs=task.max_grabs,
+                task=task.id,
+                pricer=task.pricer,
+                deadline=self.task_deadline,
+            )
+        except Exception as e:
+            self._record_failure(task, runner, e)
+            return None
+        return self._record_result(task, runner, summary)
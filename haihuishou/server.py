@@ -0,0 +1,186 @@
+# -*- coding: utf-8 -*-
+"""
+Web UI 的生产模式服务：单进程 + 固定大小线程池的 WSGI 服务（基于 werkzeug，无需额外依赖），不开调试器与自动重载。
+所有请求线程共用同一个进程里的客户端登记表、令牌桶与定时任务，不会像多进程 worker 那样重复执行定时任务。
+
+- 线程数（HAIHUISHOU_UI_THREADS，默认 32）即同时处理的请求数，其余连接在队列里等待；
+- 实时推送（SSE）连接另有 HAIHUISHOU_UI_STREAMS 个线程（默认 16，app_ui 按同一上限拒绝多出的推送连接），
+  推送连接再多也不会占满处理普通请求的线程；
+- 在队列里等待超过 queue_timeout 秒的请求直接返回 503，避免页面轮询在上游变慢时越积越多；
+- 读取请求的套接字超时为 request_timeout 秒，慢客户端不会一直占着线程；
+- 收到 SIGINT / SIGTERM 后停止接受新连接，执行 before_drain（停止定时任务、结束推送连接），
+  等待进行中的请求（含抢单）最多 drain_timeout 秒，再执行 after_drain（写完历史记录等）。
+"""
+
+import os
+import signal
+import socket
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Optional, Tuple
+
+from werkzeug.serving import BaseWSGIServer, WSGIRequestHandler
+
+DEFAULT_THREADS = 32
+DEFAULT_STREAMS = 16
+REQUEST_TIMEOUT = 30.0
+QUEUE_TIMEOUT = 10.0
+DRAIN_TIMEOUT = 30.0
+
+_BUSY_RESPONSE = (
+    b"HTTP/1.0 503 Service Unavailable\r\n"
+    b"Content-Type: application/json; charset=utf-8\r\n"
+    b"Retry-After: 1\r\n"
+    b"Connection: close\r\n\r\n"
+    + '{"success": false, "message": "服务繁忙，请稍后再试"}'.encode("utf-8")
+)
+
+
+def _env_number(name: str, default: float) -> float:
+    try:
+        return float(os.environ.get(name, "") or default)
+    except ValueError:
+        return default
+
+
+def stream_limit() -> int:
+    """同时保持的实时推送连接数上限（HAIHUISHOU_UI_STREAMS，默认 16）。"""
+    return max(1, int(_env_number("HAIHUISHOU_UI_STREAMS", DEFAULT_STREAMS)))
+
+
+class _RequestHandler(WSGIRequestHandler):
+    # 每个响应后关闭连接：keep-alive 的空闲连接会一直占着线程池里的线程
+    protocol_version = "HTTP/1.0"
+
+
+class PooledWSGIServer(BaseWSGIServer):
+    """
+    固定线程池的 WSGI 服务。in_flight 为正在处理的请求数，drain() 等待其归零。
+    线程池大小为 threads + streams：推送连接最多 streams 个（由应用限制），其余 threads 个线程总能处理普通请求。
+    """
+
+    multithread = True
+    request_queue_size = 128
+
+    def __init__(
+        self,
+        host: str,
+        port: int,
+        app: Any,
+        threads: int = DEFAULT_THREADS,
+        request_timeout: float = REQUEST_TIMEOUT,
+        queue_timeout: float = QUEUE_TIMEOUT,
+        streams: int = DEFAULT_STREAMS,
+    ):
+        handler = type("_TimedRequestHandler", (_RequestHandler,), {"timeout": request_timeout})
+        super().__init__(host, port, app, handler=handler)
+        self.threads = max(1, threads)
+        self.streams = max(0, streams)
+        self.queue_timeout = queue_timeout
+        self.in_flight = 0
+        self.rejected = 0
+        self._idle = threading.Condition()
+        self._pool = ThreadPoolExecutor(max_workers=self.threads + self.streams, thread_name_prefix="haihuishou-http")
+
+    def process_request(self, request: socket.socket, client_address: Tuple[str, int]) -> None:
+        accepted = time.monotonic()
+        with self._idle:
+            self.in_flight += 1
+        self._pool.submit(self._work, request, client_address, accepted)
+
+    def _work(self, request: socket.socket, client_address: Tuple[str, int], accepted: float) -> None:
+        try:
+            if self.queue_timeout > 0 and time.monotonic() - accepted > self.queue_timeout:
+                self.rejected += 1
+                try:
+                    request.sendall(_BUSY_RESPONSE)
+                except OSError:
+                    pass
+            else:
+                self.finish_request(request, client_address)
+        except Exception:
+            self.handle_error(request, client_address)
+        finally:
+            self.shutdown_request(request)
+            with self._idle:
+                self.in_flight -= 1
+                if self.in_flight <= 0:
+                    self._idle.notify_all()
+
+    def drain(self, timeout: float) -> bool:
+        """等待进行中的请求结束，返回是否在 timeout 秒内全部结束。"""
+        deadline = time.monotonic() + timeout
+        with self._idle:
+            while self.in_flight > 0:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return False
+                self._idle.wait(remaining)
+        return True
+
+    def close_pool(self) -> None:
+        self._pool.shutdown(wait=False)
+
+
+def serve(
+    app: Any,
+    host: str = "127.0.0.1",
+    port: int = 5050,
+    threads: Optional[int] = None,
+    streams: Optional[int] = None,
+    request_timeout: Optional[float] = None,
+    queue_timeout: Optional[float] = None,
+    drain_timeout: Optional[float] = None,
+    before_drain: Optional[Callable[[], None]] = None,
+    after_drain: Optional[Callable[[], None]] = None,
+    on_ready: Optional[Callable[[PooledWSGIServer], None]] = None,
+) -> None:
+    """
+    以生产模式运行 app，直到收到 SIGINT / SIGTERM（或 on_ready 拿到的 server 被 shutdown()）。
+    未传入的参数取环境变量 HAIHUISHOU_UI_THREADS、HAIHUISHOU_UI_STREAMS、HAIHUISHOU_UI_REQUEST_TIMEOUT、
+    HAIHUISHOU_UI_QUEUE_TIMEOUT、HAIHUISHOU_UI_DRAIN_TIMEOUT（秒）。
+    """
+    server = PooledWSGIServer(
+        host,
+        port,
+        app,
+        threads=int(threads if threads is not None else _env_number("HAIHUISHOU_UI_THREADS", DEFAULT_THREADS)),
+        request_timeout=request_timeout
+        if request_timeout is not None
+        else _env_number("HAIHUISHOU_UI_REQUEST_TIMEOUT", REQUEST_TIMEOUT),
+        queue_timeout=queue_timeout if queue_timeout is not None else _env_number("HAIHUISHOU_UI_QUEUE_TIMEOUT", QUEUE_TIMEOUT),
+        streams=streams if streams is not None else stream_limit(),
+    )
+    drain_timeout = drain_timeout if drain_timeout is not None else _env_number("HAIHUISHOU_UI_DRAIN_TIMEOUT", DRAIN_TIMEOUT)
+
+    def _stop(signum: int, frame: Any) -> None:
+        # shutdown() 会等 serve_forever 退出，不能在 serve_forever 所在的主线程里直接调用
+        threading.Thread(target=server.shutdown, daemon=True).start()
+
+    previous = {}
+    if threading.current_thread() is threading.main_thread():
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            previous[sig] = signal.signal(sig, _stop)
+    print(
+        " * 嗨回收抢单工具（生产模式）: http://%s:%d  线程 %d（另有推送连接 %d），排队超时 %gs，退出时最多等待 %gs"
+        % (host, server.port, server.threads, server.streams, server.queue_timeout, drain_timeout),
+        flush=True,
+    )
+    if on_ready is not None:
+        on_ready(server)
+    try:
+        server.serve_forever()  # 退出时关闭监听套接字，不再接受新连接
+    finally:
+        for sig, handler in previous.items():
+            signal.signal(sig, handler)
+        print(" * 正在停止：等待进行中的请求结束…", flush=True)
+        try:
+            if before_drain is not None:
+                before_drain()
+            if not server.drain(drain_timeout):
+                print(" * 仍有 %d 个请求未结束，强制退出" % server.in_flight, flush=True)
+        finally:
+            server.close_pool()
+            if after_drain is not None:
+                after_drain()
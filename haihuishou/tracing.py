@@ -0,0 +1,230 @@
+# -*- coding: utf-8 -*-
+"""
+请求分阶段追踪：给 HaihuishouAPI 传入 tracer 后，每次接口调用记录各阶段耗时——
+dns（域名解析）、connect（TCP 建连）、tls（TLS 握手）、wait（发出请求到收到响应头，约等于服务端处理时间）、
+read（读取响应体）、decode（JSON 解析），连同接口名与 recordId 交给 tracer.on_trace。
+复用已有连接时没有 dns / connect / tls 阶段。未设置 tracer 时只多一次属性判断。
+
+    api = HaihuishouAPI(tracer=JsonLinesTraceSink("trace.jsonl", slow_ms=200))
+"""
+
+import json
+import os
+import socket
+import threading
+import time
+from typing import Any, Dict, Optional
+
+from urllib3.connection import HTTPConnection, HTTPSConnection
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+
+# 各阶段名称（输出顺序）
+PHASES = ("dns", "connect", "tls", "wait", "read", "decode")
+
+_local = threading.local()
+
+
+class CallTrace:
+    """一次接口调用的追踪记录，phases 为 {阶段: 毫秒}。"""
+
+    __slots__ = ("endpoint", "record_id", "started", "phases", "status", "error", "total_ms", "_t0")
+
+    def __init__(self, endpoint: str, record_id: Any = None):
+        self.endpoint = endpoint
+        self.record_id = record_id
+        self.started = time.time()
+        self.phases: Dict[str, float] = {}
+        self.status: Any = None
+        self.error: Optional[str] = None
+        self.total_ms: Optional[float] = None
+        self._t0 = time.perf_counter()
+
+    def add(self, phase: str, seconds: float) -> None:
+        self.phases[phase] = self.phases.get(phase, 0.0) + seconds * 1000
+
+    def finish(self, status: Any = None, error: Optional[BaseException] = None) -> None:
+        self.total_ms = (time.perf_counter() - self._t0) * 1000
+        if status is not None:
+            self.status = status
+        if error is not None:
+            self.error = "%s: %s" % (type(error).__name__, error)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "ts": round(self.started, 3),
+            "endpoint": self.endpoint,
+            "recordId": self.record_id,
+            "status": self.status,
+            "totalMs": round(self.total_ms or 0.0, 3),
+            "phases": {p: round(self.phases[p], 3) for p in PHASES if p in self.phases},
+            "error": self.error,
+        }
+
+
+class Tracer:
+    """追踪钩子：每次接口调用结束后调用 on_trace（在发请求的线程里，需自行保证线程安全、尽量快）。"""
+
+    def on_trace(self, trace: CallTrace) -> None:
+        raise NotImplementedError
+
+    def close(self) -> None:
+        pass
+
+
+class JsonLinesTraceSink(Tracer):
+    """
+    把调用记录逐行写成 JSON（追加写入）。slow_ms 为慢请求阈值：只记录总耗时不低于该值的调用，
+    默认 0 即全部记录。path 默认 ~/.haihuishou/trace.jsonl。
+    """
+
+    def __init__(self, path: Optional[str] = None, slow_ms: float = 0.0):
+        if path is None:
+            from .api import data_dir
+
+            path = os.path.join(data_dir(), "trace.jsonl")
+        self.path = path
+        self.slow_ms = slow_ms
+        self._lock = threading.Lock()
+        self._file = open(path, "a", encoding="utf-8")
+
+    def on_trace(self, trace: CallTrace) -> None:
+        if (trace.total_ms or 0.0) < self.slow_ms:
+            return
+        line = json.dumps(trace.to_dict(), ensure_ascii=False)
+        with self._lock:
+            self._file.write(line + "\n")
+            self._file.flush()
+
+    def close(self) -> None:
+        with self._lock:
+            self._file.close()
+
+
+def trace_sink_from_env() -> Optional[JsonLinesTraceSink]:
+    """
+    按环境变量创建追踪输出：HAIHUISHOU_TRACE 为文件路径（设为 1 时用默认路径），
+    HAIHUISHOU_TRACE_SLOW_MS 为慢请求阈值（毫秒）。未设置 HAIHUISHOU_TRACE 时返回 None（不追踪）。
+    """
+    path = os.environ.get("HAIHUISHOU_TRACE", "").strip()
+    if not path or path.lower() in ("0", "false", "no"):
+        return None
+    try:
+        slow_ms = float(os.environ.get("HAIHUISHOU_TRACE_SLOW_MS", "0") or 0)
+    except ValueError:
+        slow_ms = 0.0
+    return JsonLinesTraceSink(None if path.lower() in ("1", "true", "yes") else path, slow_ms=slow_ms)
+
+
+# ------------------------- 当前线程的调用记录 -------------------------
+
+
+def current() -> Optional[CallTrace]:
+    return getattr(_local, "trace", None)
+
+
+def activate(trace: Optional[CallTrace]) -> Optional[CallTrace]:
+    """把 trace 设为当前线程正在追踪的调用，返回之前的（调用结束后用它恢复，支持嵌套的重新登录）。"""
+    prev = getattr(_local, "trace", None)
+    _local.trace = trace
+    return prev
+
+
+def connection_ms(trace: CallTrace) -> float:
+    """到目前为止建连（dns + connect + tls）累计的毫秒数。"""
+    phases = trace.phases
+    return phases.get("dns", 0.0) + phases.get("connect", 0.0) + phases.get("tls", 0.0)
+
+
+def record_response(trace: CallTrace, response: Any, started: float, conn_before: float, read_body: bool) -> None:
+    """
+    收到响应头后调用：发出到收到响应头的时间扣除本次建连耗时记为 wait；read_body 时读完响应体并记为 read。
+    started 为发出前的 perf_counter()，conn_before 为发出前的 connection_ms(trace)。
+    """
+    now = time.perf_counter()
+    trace.add("wait", now - started - (connection_ms(trace) - conn_before) / 1000)
+    trace.status = response.status_code
+    if read_body:
+        response.content
+        trace.add("read", time.perf_counter() - now)
+
+
+def emit(tracer: Tracer, trace: CallTrace) -> None:
+    """交给 tracer；追踪出错不影响接口调用。"""
+    try:
+        tracer.on_trace(trace)
+    except Exception:
+        pass
+
+
+# ------------------------- 连接阶段计时 -------------------------
+
+
+class _TracedConnectionMixin:
+    """
+    新建连接时记录 dns / connect / tls：当前线程没有在追踪时直接走 urllib3 原逻辑。
+    追踪时先单独解析域名并连接第一个地址，连不上再按原逻辑逐个地址尝试。
+    """
+
+    _traced_tcp_done: Optional[float] = None
+
+    def _new_conn(self) -> socket.socket:
+        trace = current()
+        if trace is None:
+            return super()._new_conn()  # type: ignore[misc]
+        host = self._dns_host  # type: ignore[attr-defined]
+        t0 = time.perf_counter()
+        try:
+            infos = socket.getaddrinfo(host, self.port, 0, socket.SOCK_STREAM)  # type: ignore[attr-defined]
+        except OSError:
+            infos = []
+        t1 = time.perf_counter()
+        trace.add("dns", t1 - t0)
+        resolved = infos[0][4][0] if infos else None
+        try:
+            if resolved:
+                self._dns_host = resolved
+            try:
+                sock = super()._new_conn()  # type: ignore[misc]
+            except Exception:
+                if not resolved:
+                    raise
+                self._dns_host = host
+                sock = super()._new_conn()  # type: ignore[misc]
+        finally:
+            self._dns_host = host
+        self._traced_tcp_done = time.perf_counter()
+        trace.add("connect", self._traced_tcp_done - t1)
+        return sock
+
+    def connect(self) -> None:
+        trace = current()
+        if trace is None or not isinstance(self, HTTPSConnection):
+            return super().connect()  # type: ignore[misc]
+        self._traced_tcp_done = None
+        t0 = time.perf_counter()
+        super().connect()  # type: ignore[misc]
+        trace.add("tls", time.perf_counter() - (self._traced_tcp_done or t0))
+
+
+class _TracedHTTPConnection(_TracedConnectionMixin, HTTPConnection):
+    pass
+
+
+class _TracedHTTPSConnection(_TracedConnectionMixin, HTTPSConnection):
+    pass
+
+
+class _TracedHTTPConnectionPool(HTTPConnectionPool):
+    ConnectionCls = _TracedHTTPConnection
+
+
+class _TracedHTTPSConnectionPool(HTTPSConnectionPool):
+    ConnectionCls = _TracedHTTPSConnection
+
+
+def install(adapter: Any) -> None:
+    """让 requests 的 HTTPAdapter 新建连接时可按阶段计时（未追踪时行为与原来一致）。"""
+    adapter.poolmanager.pool_classes_by_scheme = {
+        "http": _TracedHTTPConnectionPool,
+        "https": _TracedHTTPSConnectionPool,
+    }
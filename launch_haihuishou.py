@@ -3,8 +3,10 @@
 嗨回收抢单工具 - 快捷启动。
 用法: python launch_haihuishou.py [选项]
   -p 端口  默认 5050
-  -h 地址  默认 127.0.0.1（对外用 0.0.0.0）
-  -d       调试模式（不自动打开浏览器）
+  -H 地址  默认 127.0.0.1（对外用 0.0.0.0）
+  -t 线程数 默认 32（同时处理的请求数）
+  -d       调试模式（Flask 开发服务 + 自动重载，不自动打开浏览器）
+默认以生产模式运行（线程池 WSGI 服务），Ctrl+C 时等进行中的抢单结束后再退出。
 打包: pyinstaller haihuishou.spec
 """
 
@@ -19,13 +21,14 @@ else:
 if _root not in sys.path:
     sys.path.insert(0, _root)
 
-from haihuishou.app_ui import app
+from haihuishou.app_ui import app, run_production, start_background_services
 
 
 def main():
     parser = argparse.ArgumentParser(description="嗨回收抢单工具")
     parser.add_argument("-p", "--port", type=int, default=5050, help="端口 (默认 5050)")
     parser.add_argument("-H", "--host", default="127.0.0.1", metavar="HOST", help="监听地址 (默认 127.0.0.1)")
+    parser.add_argument("-t", "--threads", type=int, default=None, help="处理请求的线程数 (默认 32，或 HAIHUISHOU_UI_THREADS)")
     parser.add_argument("-d", "--debug", action="store_true", help="调试模式")
     args = parser.parse_args()
 
@@ -34,20 +37,15 @@ def main():
     if args.debug:
         os.environ["HAIHUISHOU_DEBUG"] = "1"
 
-    # 非调试模式自动打开浏览器
+    # 非调试模式：生产模式服务，自动打开浏览器
     if not args.debug:
-        import threading
-        import webbrowser
+        run_production(args.host, args.port, threads=args.threads, open_browser=True)
+        return
 
-        def _open():
-            import time
-            time.sleep(1.2)
-            url_host = "127.0.0.1" if args.host == "0.0.0.0" else args.host
-            webbrowser.open("http://{}:{}".format(url_host, args.port))
-
-        threading.Thread(target=_open, daemon=True).start()
-
-    app.run(host=args.host, port=args.port, debug=args.debug)
+    # 调试模式下 reloader 的父进程只负责监视文件，任务线程只在实际服务的子进程里启动
+    if os.environ.get("WERKZEUG_RUN_MAIN") == "true":
+        start_background_services()
+    app.run(host=args.host, port=args.port, debug=True)
 
 
 if __name__ == "__main__":